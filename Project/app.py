@@ -9,7 +9,6 @@ import argparse
 import subprocess
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
-from rag_load import RAGLoad
 from db import DocumentDatabase
 from lib.logger import setup_logging
 
@@ -39,12 +38,14 @@ def run_streamlit() -> int:
         logger.error(f"Error running Streamlit: {e}")
         return 1
 
-def seed_database() -> int:
+def seed_database(workers: int = 3) -> int:
     """Seed the database."""
     try:
         logger.info("Seeding database")
+        # Imported here, so the other commands don't load the document loaders
+        from rag_load import RAGLoad
         # Database seeding logic here
-        rag_load = RAGLoad()
+        rag_load = RAGLoad(max_workers=workers)
         rag_load.load_documents()
 
         return 1
@@ -72,6 +73,16 @@ def get_database_size() -> int:
         logger.error(f"Error getting database size: {e}")
         return 0
 
+def positive_int(value: str) -> int:
+    """Parse a positive integer command line argument."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value!r} is not an integer")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a positive integer")
+    return number
+
 def parse_arguments(args: List[str]) -> Dict[str, Any]:
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description="Application description here")
@@ -80,6 +91,7 @@ def parse_arguments(args: List[str]) -> Dict[str, Any]:
     parser.add_argument("--seed", "-s", action="store_true", help="Seed the database")
     parser.add_argument("--reset", action="store_true", help="Reset the database")
     parser.add_argument("--size", action="store_true", help="Get the size of the database")
+    parser.add_argument("--workers", type=positive_int, default=3, help="Number of sources loaded in parallel when seeding")
     # parser.add_argument("--output", "-o", type=str, default="output", help="Output directory")
     
     # Parse arguments
@@ -90,7 +102,7 @@ def main() -> int:
     args = parse_arguments(sys.argv[1:])
     
     if args.get('seed'):
-        return seed_database()
+        return seed_database(args.get('workers'))
     elif args.get('reset'):
         return reset_database()
     elif args.get('size'):
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Per-turn latency benchmark for RAGPredict.respond, fast path and standard mode against the
+original serial turn (better query, then multi-queries, then the answer), the time to
+the first token of a streamed fast-path turn, repeated questions answered from the answer cache
+or, after a restart, with memoized query rewrites,
+and concurrent conversations on the async API.
+Runs offline: the LLM is a fake chat model with a configurable latency per call and the
+database holds synthetic chunks embedded by the fake embedding model of the ingest benchmark.
+
+Usage: python benchmarks/chat_turn.py [--turns 10] [--llm-latency 0.8] [--chunks 2000]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import random
+import argparse
+import tempfile
+import threading
+from typing import Any, Iterator, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain.schema import Document
+from db import DocumentDatabase
+from rag_predict import RAGPredict
+from ingest import FakeEmbeddings, _WORDS, _sentences
+
+class FakeChatModel(BaseChatModel):
+    """
+    Stand-in for ChatOpenAI, sleeping latency seconds per call and counting the calls.
+    Streamed answers have words words, the first one arriving after a fifth of the latency.
+    """
+    latency: float = 0.8
+    words: int = 40
+    calls: int = 0
+    lock: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _answer(self, messages: list[BaseMessage], **kwargs: Any) -> ChatResult:
+        """Count the call and answer it like gpt-4o-mini would be asked to."""
+        with self.lock:
+            self.calls += 1
+
+        system_prompt, query = messages[0].content, messages[-1].content
+        if kwargs.get("response_format"):
+            content = json.dumps({"query": query, "alternatives": [f"{query} ({i})" for i in range(3)]})
+        elif "alternative phrasings" in system_prompt:
+            content = "\n".join(f"{query} ({i})" for i in range(3))
+        elif "query improvement" in system_prompt:
+            content = query.removeprefix("Improve this query: ")
+        else:
+            content = " ".join([f"An answer about {query}."] * (self.words // 5))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        return self._answer(messages, **kwargs)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._answer(messages, **kwargs)
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        with self.lock:
+            self.calls += 1
+        words = " ".join([f"An answer about {messages[-1].content}."] * (self.words // 5)).split(" ")
+        time.sleep(self.latency / 5)
+        for word in words:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            time.sleep(self.latency * 4 / 5 / len(words))
+
+def main() -> int:
+    """Seed a synthetic database and time chat turns in both modes."""
+    parser = argparse.ArgumentParser(description="Chat turn latency benchmark")
+    parser.add_argument("--turns", type=int, default=10, help="Turns per mode")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Seconds per fake LLM call")
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="Seconds per fake embedding request")
+    parser.add_argument("--chunks", type=int, default=2000, help="Synthetic chunks in the database")
+    parser.add_argument("--concurrent", type=int, default=200, help="Conversations served at once by the async API")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the chunks and questions")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(prefix="chat-benchmark-") as workdir:
+        embeddings = FakeEmbeddings(dimensions=256, latency=args.embedding_latency)
+        db = DocumentDatabase(db_path=os.path.join(workdir, "chroma_db"), embeddings=embeddings)
+        documents = [Document(page_content=" ".join(_sentences(rng, 5)), metadata={"document_type": "cv"})
+                     for _ in range(args.chunks)]
+        db.add_documents(documents)
+
+        llm = FakeChatModel(latency=args.llm_latency, lock=threading.Lock())
+        result = {"config": vars(args)}
+
+        # Baseline: the original turn, three LLM calls one after the other
+        rag_predict = RAGPredict(db=db, llm=llm)
+        rag_predict.similarity_threshold = 2.0
+        llm.calls = 0
+        start = time.perf_counter()
+        for _ in range(args.turns):
+            question = f"What about {' '.join(rng.sample(_WORDS, 3))}?"
+            rag_predict.generate_response(rag_predict.generate_better_query(question), [])
+        result["serial"] = {
+            "turns": args.turns,
+            "mean_seconds": round((time.perf_counter() - start) / args.turns, 3),
+            "llm_calls_per_turn": llm.calls / args.turns,
+        }
+
+        for mode, fast_path in (("standard", False), ("fast", True)):
+            rag_predict = RAGPredict(fast_path=fast_path, db=db, llm=llm)
+            # Fake vectors are random, so any context must count as relevant to time the full turn
+            rag_predict.similarity_threshold = 2.0
+            llm.calls = 0
+            questions = [f"What about {' '.join(rng.sample(_WORDS, 3))}?" for _ in range(args.turns)]
+            for question in questions:
+                rag_predict.respond(question, [])
+            result[mode] = {
+                **rag_predict.get_latency_stats()[mode],
+                "llm_calls_per_turn": llm.calls / args.turns,
+                "context_tokens": rag_predict.get_context_stats(),
+            }
+
+        # Asking the same questions again: answered from the semantic answer cache
+        llm.calls = 0
+        for question in questions:
+            rag_predict.respond(question, [])
+        result["cached"] = {
+            **rag_predict.get_latency_stats()["cached"],
+            "llm_calls_per_turn": llm.calls / args.turns,
+        }
+
+        # And again after a restart: the answer cache is gone, the query rewrites persisted
+        rag_predict = RAGPredict(fast_path=True, db=db, llm=llm)
+        rag_predict.similarity_threshold = 2.0
+        llm.calls = 0
+        for question in questions:
+            rag_predict.respond(question, [])
+        result["memoized_rewrite"] = {
+            **rag_predict.get_latency_stats()["fast"],
+            "llm_calls_per_turn": llm.calls / args.turns,
+            "query_cache": rag_predict.get_cache_stats()["query_rewrites"],
+        }
+
+        # Fast path, streamed: the answer starts showing at the first token
+        rag_predict = RAGPredict(fast_path=True, db=db, llm=llm)
+        rag_predict.similarity_threshold = 2.0
+        llm.calls = 0
+        for _ in range(args.turns):
+            question = f"What about {' '.join(rng.sample(_WORDS, 3))}?"
+            "".join(rag_predict.stream_response(question, []))
+        result["fast_streamed"] = {
+            **rag_predict.get_latency_stats()["fast"],
+            "llm_calls_per_turn": llm.calls / args.turns,
+        }
+
+        # Async fast path: many conversations on one event loop
+        rag_predict = RAGPredict(fast_path=True, db=db, llm=llm)
+        rag_predict.similarity_threshold = 2.0
+        questions = [f"What about {' '.join(rng.sample(_WORDS, 3))}?" for _ in range(args.concurrent)]
+
+        async def converse() -> float:
+            start = time.perf_counter()
+            await asyncio.gather(*(rag_predict.arespond(question, []) for question in questions))
+            return time.perf_counter() - start
+
+        llm.calls = 0
+        seconds = asyncio.run(converse())
+        result["fast_async"] = {
+            "conversations": args.concurrent,
+            "seconds": round(seconds, 3),
+            "turns_per_second": round(args.concurrent / seconds, 1),
+            "threads": threading.active_count(),
+            "llm_calls_per_turn": llm.calls / args.concurrent,
+        }
+
+    result["speedup"] = {
+        mode: round(result["serial"]["mean_seconds"] / result[mode]["mean_seconds"], 2)
+        for mode in ("standard", "fast")
+    }
+    result["speedup"]["fast_streamed_first_token"] = round(
+        result["serial"]["mean_seconds"] / result["fast_streamed"]["mean_first_token_seconds"], 2
+    )
+    print(json.dumps(result, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the website text cleaner.
+Checks that _clean_website_content matches the original regex-per-pass implementation
+byte for byte on a synthetic HTML-derived corpus, chunk by chunk and on whole pages (exiting
+with status 1 on any mismatch), then compares their throughput, and compares cleaning every split chunk (what the website loader
+does) with cleaning whole pages before splitting.
+
+Usage: python benchmarks/clean_text.py [--chunks 20000] [--seed 0]
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from lib.rag_load_helper import _clean_website_content
+
+def _reference_clean_website_content(text: str) -> str:
+    """The original cleaner, kept as the golden reference."""
+    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
+    text = re.sub(r'[ \t]+', ' ', text)
+
+    patterns_to_remove = [
+        r'© \d{4}.*?rights reserved.*?(?:\n|$)',
+        r'Terms of Service.*?Privacy Policy.*?(?:\n|$)',
+        r'We use cookies.*?Privacy Policy.*?(?:\n|$)',
+        r'Accept\s*$',
+        r'Submit\s*$',
+        r'click for next image.*?(?:\n|$)',
+        r'Next\s*Cancel\s*(?:\n|$)',
+        r'Download count:.*?(?:\n|$)',
+        r'\(Click on any tool to see more information\)',
+        r'briefcase Created with Sketch.*?(?:\n|$)',
+        r'github \[#\d+\] Created with Sketch.*?(?:\n|$)',
+        r'Contact Form\s*(?:\n|$)',
+        r'Terms of Service\s*(?:\n|$)',
+        r'Privacy Policy\s*(?:\n|$)',
+        r'We use cookies.*?Privacy Policy\.',
+        r'Contact:\s*\[email.*?protected\]\s*(?:\n|$)',
+        r'Download CV\s*(?:\n|$)',
+        r'CV\s*(?:\n|$)',
+        r'Based In\s*(?:\n|$)',
+    ]
+
+    for pattern in patterns_to_remove:
+        text = re.sub(pattern, '', text, flags=re.IGNORECASE | re.MULTILINE)
+
+    text = re.sub(r'(First name|Last name|Email address|Phone Number|Message)\s*(?:\n|$)', '', text)
+    text = re.sub(r'^\d+\+?\s*Years?\s*$', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^\d{4}\s*-\s*\d{4}\s*$', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^\s*[•\-\+]\s*$', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^\s*[^\w\s]\s*$', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
+    return text.strip()
+
+_WORDS = (
+    "laravel python django react docker kubernetes api integration backend developer "
+    "experience project team product customer platform design data pipeline cloud "
+    "built shipped maintained improved performance architecture testing deployment"
+).split()
+
+_NOISE = [
+    "© 2024 Joao Estima. All rights reserved.",
+    "Terms of Service | Privacy Policy",
+    "We use cookies to improve your experience. See our Privacy Policy.",
+    "Accept", "Submit", "Next\nCancel", "click for next image",
+    "Download count: 42", "(Click on any tool to see more information)",
+    "briefcase Created with Sketch.", "github [#1234] Created with Sketch.",
+    "Contact Form", "Contact: [email protected]", "Download CV", "CV", "Based In",
+    "First name", "Last name", "Email address", "Phone Number", "Message",
+    "4+ Years", "2021 - 2024", "•", "-", "+", "→", "|",
+]
+
+def build_corpus(chunks: int, seed: int) -> list[str]:
+    """Build chunks that look like text extracted from HTML pages."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(chunks):
+        lines = []
+        for _ in range(rng.randint(8, 20)):
+            roll = rng.random()
+            if roll < 0.25:
+                lines.append(rng.choice(_NOISE))
+            elif roll < 0.35:
+                lines.append("\t  " * rng.randint(1, 3))
+            else:
+                words = rng.choices(_WORDS, k=rng.randint(3, 14))
+                lines.append(" ".join(words).capitalize() + ".")
+            lines.append("\n" * rng.randint(1, 4))
+        corpus.append("".join(lines))
+    return corpus
+
+def measure(clean, corpus: list[str]) -> tuple[list[str], float]:
+    """Clean the whole corpus, returning the outputs and the elapsed seconds."""
+    start = time.perf_counter()
+    outputs = [clean(text) for text in corpus]
+    return outputs, time.perf_counter() - start
+
+def _pages(corpus: list[str], chunks_per_page: int = 10) -> list[str]:
+    """Join the chunks into pages."""
+    return ["".join(corpus[i:i + chunks_per_page]) for i in range(0, len(corpus), chunks_per_page)]
+
+def golden_check(texts: list[str], label: str) -> int:
+    """
+    Clean the texts with the reference and the compiled cleaner, printing the first mismatch to
+    stderr. Returns the number of mismatching texts.
+    """
+    mismatches = [
+        (text, expected, actual)
+        for text, expected, actual in zip(
+            texts,
+            (_reference_clean_website_content(text) for text in texts),
+            (_clean_website_content(text) for text in texts),
+        )
+        if expected != actual
+    ]
+    print(f"Golden check ({label}): {'OK' if not mismatches else f'{len(mismatches)} mismatching {label}'}")
+    if mismatches:
+        text, expected, actual = mismatches[0]
+        print(f"First mismatch:\n  input:    {text!r}\n  expected: {expected!r}\n  actual:   {actual!r}", file=sys.stderr)
+    return len(mismatches)
+
+def measure_pages(corpus: list[str]) -> dict:
+    """
+    Time cleaning every split chunk against cleaning whole pages before splitting, with the
+    reference and the compiled cleaner.
+    """
+    splitter = RecursiveCharacterTextSplitter(
+        separators=["\n\n", "\n", ".", " "],
+        chunk_size=1000,
+        chunk_overlap=100,
+    )
+    pages = _pages(corpus)
+    page_chunks = [splitter.split_text(page) for page in pages]
+
+    results = {}
+    for name, clean in (("reference", _reference_clean_website_content), ("compiled", _clean_website_content)):
+        start = time.perf_counter()
+        for chunks in page_chunks:
+            [clean(chunk) for chunk in chunks]
+        results[f"chunks_{name}"] = time.perf_counter() - start
+        _, results[f"pages_{name}"] = measure(clean, pages)
+    return results
+
+def main() -> int:
+    """Run the golden check, then the benchmark. Exits with 1 if the cleaners don't match."""
+    parser = argparse.ArgumentParser(description="Website cleaner micro-benchmark")
+    parser.add_argument("--chunks", type=int, default=20000, help="Number of synthetic chunks")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the corpus")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.chunks, args.seed)
+    megabytes = sum(len(text.encode("utf-8")) for text in corpus) / 1_000_000
+    print(f"Corpus: {len(corpus)} chunks, {megabytes:.1f} MB")
+
+    # A compiled cleaner that changes the output is a bug, not a speedup, so don't time it
+    mismatches = golden_check(corpus, "chunks") + golden_check(_pages(corpus), "pages")
+    if mismatches:
+        return 1
+
+    _, reference_seconds = measure(_reference_clean_website_content, corpus)
+    _, seconds = measure(_clean_website_content, corpus)
+    print(f"Reference: {reference_seconds:.3f}s ({megabytes / reference_seconds:.1f} MB/s)")
+    print(f"Compiled:  {seconds:.3f}s ({megabytes / seconds:.1f} MB/s)")
+    print(f"Speedup:   {reference_seconds / seconds:.2f}x")
+
+    pages = measure_pages(corpus)
+    print(f"Cleaning split chunks (reference): {pages['chunks_reference']:.3f}s")
+    print(f"Cleaning whole pages (reference):  {pages['pages_reference']:.3f}s")
+    print(f"Cleaning split chunks (compiled):  {pages['chunks_compiled']:.3f}s")
+    print(f"Cleaning whole pages (compiled):   {pages['pages_compiled']:.3f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
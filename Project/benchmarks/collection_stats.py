@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Collection statistics benchmark: DocumentDatabase.get_collection_info (the counters kept on
+write) against counting from a full read of the chunk metadata, as it used to, at several
+collection sizes, and a cold `python app.py --size` (a new process opening the database to
+print its info) against each collection, with the embedding cache filled up to its size.
+The chunks are synthetic, tagged with document types and seed sources like the seeded ones,
+and written through DocumentDatabase.add_documents with precomputed vectors.
+Runs offline: no embedding model is involved.
+
+Usage: python benchmarks/collection_stats.py [--sizes 10000 100000 1000000] [--backends numpy chroma] [--no-cold]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+from collections import Counter
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.schema import Document
+from db import DocumentDatabase
+from ingest import FakeEmbeddings
+from vector_search import normalize
+
+DOCUMENT_TYPES = ["cv", "website", "notion"]
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+def timed(function, repeat: int) -> float:
+    """Get the median milliseconds of a call."""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start)
+    return round(1000 * statistics.median(latencies), 3)
+
+def full_count(db: DocumentDatabase) -> dict:
+    """Count the chunks per document type and source from all their metadata."""
+    metadatas = db.store.get_metadatas().values()
+    return {
+        "count": len(metadatas),
+        "document_types": Counter(metadata.get("document_type") for metadata in metadatas),
+        "sources": Counter(metadata.get("seed_source") for metadata in metadatas),
+    }
+
+def cold_info(workdir: str, backend: str) -> dict:
+    """Open the database and get its info, timed (in a new process, after the imports)."""
+    start = time.perf_counter()
+    db = DocumentDatabase(db_path=os.path.join(workdir, "chroma_db"), backend=backend)
+    opened = time.perf_counter()
+    info = db.get_collection_info()
+    return {
+        "open_ms": round(1000 * (opened - start), 2),
+        "info_ms": round(1000 * (time.perf_counter() - opened), 2),
+        "document_count": info.get("document_count"),
+    }
+
+def cold_size(workdir: str, backend: str) -> dict:
+    """Time python app.py --size in a new process, then the database part of it on its own."""
+    env = {**os.environ, "RAG_VECTOR_BACKEND": backend, "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "sk-benchmark")}
+    start = time.perf_counter()
+    # app.py --size exits with the info as its status, so the exit code isn't checked
+    subprocess.run([sys.executable, APP, "--size"], cwd=workdir, env=env, capture_output=True)
+    seconds = time.perf_counter() - start
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--cold-info", workdir, backend],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return {"app_size_seconds": round(seconds, 2), **json.loads(output.strip().splitlines()[-1])}
+
+def main() -> int:
+    """Run the benchmark and print the results as JSON."""
+    parser = argparse.ArgumentParser(description="Collection statistics benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="Collection sizes")
+    parser.add_argument("--backends", nargs="+", default=["numpy", "chroma"], help="Vector backends")
+    parser.add_argument("--chroma-max-size", type=int, default=100_000, help="Skip Chroma above this size (slow to fill)")
+    parser.add_argument("--dimensions", type=int, default=64, help="Embedding dimensions")
+    parser.add_argument("--sources", type=int, default=500, help="Seed sources the chunks come from")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Chunks per write")
+    parser.add_argument("--repeat", type=int, default=5, help="Calls timed per method")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the vectors")
+    parser.add_argument("--no-cold", action="store_true", help="Skip the cold app.py --size runs")
+    parser.add_argument("--cold-info", nargs=2, metavar=("WORKDIR", "BACKEND"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold_info:
+        print(json.dumps(cold_info(*args.cold_info)))
+        return 0
+
+    rng = np.random.default_rng(args.seed)
+    results = []
+    for size in args.sizes:
+        result = {"size": size}
+        for backend in args.backends:
+            if backend == "chroma" and size > args.chroma_max_size:
+                continue
+            with tempfile.TemporaryDirectory(prefix="collection_stats_") as workdir:
+                db = DocumentDatabase(
+                    db_path=os.path.join(workdir, "chroma_db"),
+                    embeddings=FakeEmbeddings(dimensions=args.dimensions, latency=0.0),
+                    backend=backend,
+                )
+
+                start = time.perf_counter()
+                for offset in range(0, size, args.batch_size):
+                    count = min(args.batch_size, size - offset)
+                    documents = [
+                        Document(
+                            page_content=f"chunk {i}",
+                            metadata={"document_type": DOCUMENT_TYPES[i % 3], "seed_source": f"source-{i % args.sources}"},
+                        )
+                        for i in range(offset, offset + count)
+                    ]
+                    vectors = normalize(rng.standard_normal((count, args.dimensions), dtype=np.float32)).tolist()
+                    db.add_documents(documents, ids=[f"chunk#{i}" for i in range(offset, offset + count)], vectors=vectors)
+                fill_seconds = time.perf_counter() - start
+
+                stats = db.get_collection_stats()
+                counted = full_count(db)
+                result[backend] = {
+                    "fill_seconds": round(fill_seconds, 2),
+                    "collection_info_ms": timed(db.get_collection_info, args.repeat),
+                    "collection_stats_ms": timed(db.get_collection_stats, args.repeat),
+                    "full_count_ms": timed(lambda: full_count(db), min(args.repeat, 2)),
+                    "counts_match": (
+                        stats["count"] == counted["count"]
+                        and stats["document_types"] == dict(counted["document_types"])
+                        and stats["sources"] == dict(counted["sources"])
+                    ),
+                }
+                if not args.no_cold:
+                    # The cached embeddings of a seed, up to the size of the cache
+                    cached = min(size, db.embedding_cache_size)
+                    for offset in range(0, cached, args.batch_size):
+                        count = min(args.batch_size, cached - offset)
+                        vectors = rng.standard_normal((count, args.dimensions), dtype=np.float32).tolist()
+                        db.embeddings._store([f"chunk {i}" for i in range(offset, offset + count)], vectors)
+                    result[backend]["cold"] = cold_size(workdir, backend)
+        results.append(result)
+        print(json.dumps(result), file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
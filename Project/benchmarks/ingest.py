@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark for seeding (RAGLoad → DocumentDatabase).
+Runs offline: the CV, Notion and website sources are synthetic PDF, markdown and HTML
+corpora generated in a temporary directory (the pages are served by a local HTTP server),
+and OpenAI is replaced by a deterministic fake embedding model with a configurable latency.
+Reports the seed summary with per-stage timings, chunks/sec and peak memory as JSON.
+
+Usage: python benchmarks/ingest.py [--pdf-pages 20] [--notion-sections 500] [--html-pages 50]
+                                   [--latency 0.05] [--reseed] [--output result.json]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+import functools
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from db import DocumentDatabase
+from rag_load import RAGLoad
+from lib.embedding_writer import TokenRateLimiter
+
+_WORDS = (
+    "laravel python django react docker kubernetes api integration backend developer "
+    "experience project team product customer platform design data pipeline cloud "
+    "built shipped maintained improved performance architecture testing deployment "
+    "payment checkout invoice order account session endpoint sync review scope"
+).split()
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic stand-in for OpenAIEmbeddings, sleeping latency seconds per request."""
+
+    def __init__(self, dimensions: int = 1536, latency: float = 0.05) -> None:
+        self.model = "fake-embedding"
+        self.dimensions = dimensions
+        self.latency = latency
+        self.calls = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, text: str) -> list[float]:
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        with self._lock:
+            self.calls += 1
+            self.texts += len(texts)
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        with self._lock:
+            self.calls += 1
+            self.texts += len(texts)
+        await asyncio.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+def _sentences(rng: random.Random, count: int) -> list[str]:
+    """Generate sentences of random vocabulary words."""
+    return [" ".join(rng.choices(_WORDS, k=rng.randint(6, 16))).capitalize() + "." for _ in range(count)]
+
+def write_pdf(path: str, pages: int, rng: random.Random) -> None:
+    """Write a text PDF with the given number of pages."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for _ in range(pages):
+        lines = "\n".join(f"({line}) Tj T*" for line in _sentences(rng, 40))
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td\n{lines}\nET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {pages} >>"
+
+    content = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(content))
+        content += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(content)
+    content += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    content += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    content += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(content)
+
+def write_markdown(path: str, sections: int, rng: random.Random) -> None:
+    """Write a Notion-like markdown export with headings, notes and to-dos."""
+    lines = []
+    for section in range(sections):
+        lines.append(f"## Meeting notes {section}\n")
+        lines.append(" ".join(_sentences(rng, rng.randint(2, 5))) + "\n")
+        lines.extend(f"- [{rng.choice('x ')}] {sentence}" for sentence in _sentences(rng, rng.randint(1, 4)))
+        lines.append("")
+    with open(path, "w") as f:
+        f.write("\n".join(lines))
+
+def write_site(root: str, pages: int, rng: random.Random) -> None:
+    """Write linked HTML pages with the usual footer noise, and their sitemap."""
+    for page in range(pages):
+        links = " ".join(f'<a href="/page{link}.html">Page {link}</a>' for link in rng.sample(range(pages), min(5, pages)))
+        paragraphs = "".join(f"<p>{' '.join(_sentences(rng, rng.randint(3, 8)))}</p>" for _ in range(rng.randint(4, 12)))
+        with open(os.path.join(root, f"page{page}.html"), "w") as f:
+            f.write(
+                f'<html lang="en"><head><title>Page {page}</title></head><body>'
+                f"<nav>{links}</nav><h1>Page {page}</h1>{paragraphs}"
+                f"<footer>© 2024 Joao Estima. All rights reserved.\nContact Form\nDownload CV</footer>"
+                f"</body></html>"
+            )
+    with open(os.path.join(root, "index.html"), "w") as f:
+        f.write('<html><head><title>Home</title></head><body><a href="/page0.html">Start</a></body></html>')
+    with open(os.path.join(root, "sitemap.xml"), "w") as f:
+        urls = "".join(f"<url><loc>SITE/page{page}.html</loc></url>" for page in range(pages))
+        f.write(f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>')
+
+def serve(root: str) -> tuple[ThreadingHTTPServer, str]:
+    """Serve a directory on an ephemeral local port."""
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=root))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    # The sitemap needs absolute URLs
+    sitemap = os.path.join(root, "sitemap.xml")
+    with open(sitemap) as f:
+        content = f.read().replace("SITE", url)
+    with open(sitemap, "w") as f:
+        f.write(content)
+    return server, url
+
+def seed(args: argparse.Namespace, workdir: str, website_url: str, notion_files: list[str]) -> dict:
+    """Seed the database at workdir once, returning the summary and the embedding calls."""
+    embeddings = FakeEmbeddings(dimensions=args.dimensions, latency=args.latency)
+    db = DocumentDatabase(db_path=os.path.join(workdir, "chroma_db"), embeddings=embeddings)
+    db.writer.rate_limiter = TokenRateLimiter(args.tokens_per_minute)
+
+    rag_load = RAGLoad(
+        max_workers=args.workers,
+        batch_size=args.batch_size,
+        dedup_threshold=args.dedup_threshold,
+        db=db,
+        cv_path=os.path.join(workdir, "cv.pdf"),
+        notion_files=notion_files,
+        website_url=website_url,
+    )
+    summary = rag_load.load_documents()
+    summary["embedding_calls"] = embeddings.calls
+    summary["embedded_texts"] = embeddings.texts
+    return summary
+
+def main() -> int:
+    """Generate the corpora and run the benchmark."""
+    parser = argparse.ArgumentParser(description="Offline seeding benchmark")
+    parser.add_argument("--pdf-pages", type=int, default=20, help="Pages in the synthetic CV")
+    parser.add_argument("--notion-files", type=int, default=2, help="Number of synthetic Notion files")
+    parser.add_argument("--notion-sections", type=int, default=500, help="Sections per Notion file")
+    parser.add_argument("--html-pages", type=int, default=50, help="Pages on the synthetic website")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per fake embedding request")
+    parser.add_argument("--dimensions", type=int, default=1536, help="Fake embedding dimensions")
+    parser.add_argument("--tokens-per-minute", type=int, default=10**9, help="Client-side rate limit")
+    parser.add_argument("--workers", type=int, default=3, help="Sources loaded concurrently")
+    parser.add_argument("--batch-size", type=int, default=128, help="Chunks per pipeline batch")
+    parser.add_argument("--dedup-threshold", type=float, default=0.8, help="Near-duplicate threshold")
+    parser.add_argument("--reseed", action="store_true", help="Seed a second time to measure an unchanged reseed")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the corpora")
+    parser.add_argument("--output", help="Also write the JSON result to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(prefix="ingest-benchmark-") as workdir:
+        write_pdf(os.path.join(workdir, "cv.pdf"), args.pdf_pages, rng)
+        notion_files = [os.path.join(workdir, f"notion_{i}.md") for i in range(args.notion_files)]
+        for path in notion_files:
+            write_markdown(path, args.notion_sections, rng)
+        site = os.path.join(workdir, "site")
+        os.makedirs(site)
+        write_site(site, args.html_pages, rng)
+        server, website_url = serve(site)
+
+        try:
+            result = {
+                "config": {key: value for key, value in vars(args).items() if key != "output"},
+                "seed": seed(args, workdir, website_url, notion_files),
+            }
+            if args.reseed:
+                result["reseed"] = seed(args, workdir, website_url, notion_files)
+        finally:
+            server.shutdown()
+
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    return 1 if any(
+        source["status"] == "failed" for run in ("seed", "reseed") if run in result
+        for source in result[run]["sources"].values()
+    ) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
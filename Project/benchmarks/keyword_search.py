@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Keyword search benchmark: the BM25 full-text index written along with the vectors (and opened
+cold by a new process), the keyword-heavy query route (no embedding call) and the hybrid search fusing both.
+A synthetic collection of chunks (vocabulary of the ingest benchmark) is seeded with rare
+domain terms, like invoice numbers and product acronyms, planted in a few chunks each; the
+queries are those terms. Recall@k is the share of the chunks holding the term that are found.
+Runs offline: the embedding model is the fake one of the ingest benchmark, whose vectors carry
+no meaning, so only the keyword side of the hybrid recall is meaningful.
+
+Usage: python benchmarks/keyword_search.py [--chunks 20000] [--terms 200] [--backend numpy]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.schema import Document
+from db import DocumentDatabase
+from lib.bm25_index import BM25Index
+from ingest import FakeEmbeddings, _sentences
+
+def percentiles(latencies: list[float]) -> dict:
+    """Get the median and 95th percentile of latencies in microseconds."""
+    return {
+        "us_p50": round(1e6 * statistics.median(latencies), 1),
+        "us_p95": round(1e6 * float(np.percentile(latencies, 95)), 1),
+    }
+
+def recall(found: list[list[str]], planted: list[set[str]], k: int) -> float:
+    """Get the share of the planted chunks found, up to k per query."""
+    hits = sum(len(set(ids) & chunks) for ids, chunks in zip(found, planted))
+    return round(hits / sum(min(len(chunks), k) for chunks in planted), 4)
+
+def main() -> int:
+    """Run the benchmark and print the results as JSON."""
+    parser = argparse.ArgumentParser(description="Keyword and hybrid search benchmark")
+    parser.add_argument("--chunks", type=int, default=20_000, help="Synthetic chunks in the collection")
+    parser.add_argument("--terms", type=int, default=200, help="Rare domain terms planted (one query each)")
+    parser.add_argument("--per-term", type=int, default=3, help="Chunks each term is planted in")
+    parser.add_argument("--k", type=int, default=4, help="Results per query")
+    parser.add_argument("--backend", default="numpy", help="Vector backend (chroma, numpy or faiss)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the chunks and terms")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = [" ".join(_sentences(rng, 5)) for _ in range(args.chunks)]
+    terms = [f"INV-{2020 + i % 6}-{i:05d}" if i % 2 else f"ddms{i}" for i in range(args.terms)]
+    planted = []
+    for term in terms:
+        chunks = rng.sample(range(args.chunks), args.per_term)
+        for chunk in chunks:
+            texts[chunk] += f" Ticket {term} resolved."
+        planted.append({f"chunk#{chunk}" for chunk in chunks})
+
+    with tempfile.TemporaryDirectory(prefix="keyword-benchmark-") as workdir:
+        embeddings = FakeEmbeddings(dimensions=256, latency=0.0)
+        db = DocumentDatabase(db_path=os.path.join(workdir, "chroma_db"), embeddings=embeddings, backend=args.backend)
+        documents = [Document(page_content=text, metadata={"document_type": "cv"}) for text in texts]
+        ids = [f"chunk#{i}" for i in range(args.chunks)]
+        vectors = embeddings.embed_documents(texts)
+
+        start = time.perf_counter()
+        db.store.upsert(ids, vectors, documents)
+        vector_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        db.keyword_index.add(ids, texts)
+        index_seconds = time.perf_counter() - start
+
+        result = {
+            "config": vars(args),
+            "write_seconds": {"vectors": round(vector_seconds, 2), "keyword_index": round(index_seconds, 2)},
+            "keyword_index_mb": round(os.path.getsize(db.keyword_index.index_path) / 2**20, 1),
+        }
+
+        # What a new process pays before its first keyword search
+        start = time.perf_counter()
+        BM25Index(db.keyword_index.index_path).search(terms[0], args.k)
+        result["cold_open_and_search_ms"] = round(1000 * (time.perf_counter() - start), 2)
+
+        routed = sum(db.is_keyword_query(term) for term in terms)
+        result["keyword_queries_routed"] = f"{routed}/{len(terms)}"
+
+        # Keyword route: index lookup, then the chunk texts from the backend, no embedding
+        index_latencies, route_latencies, found, best_scores = [], [], [], []
+        calls = embeddings.calls
+        for term in terms:
+            start = time.perf_counter()
+            db.keyword_index.search(term, args.k)
+            index_latencies.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            hits = db.get_keyword_search_with_score(term, args.k, match_all=True) if db.is_keyword_query(term) else []
+            route_latencies.append(time.perf_counter() - start)
+            found.append([doc.id for doc, _ in hits])
+            if hits:
+                best_scores.append(hits[0][1])
+        result["keyword"] = {
+            "index_search": percentiles(index_latencies),
+            "route_with_documents": percentiles(route_latencies),
+            "embedding_calls": embeddings.calls - calls,
+            f"recall_at_{args.k}": recall(found, planted, args.k),
+            # RAGPredict answers from the index when the best score reaches keyword_min_score
+            "lowest_best_bm25_score": round(min(best_scores), 2) if best_scores else None,
+        }
+
+        # Hybrid: one embedding request and vector query, fused with the keyword hits
+        latencies, found = [], []
+        calls = embeddings.calls
+        for term in terms:
+            start = time.perf_counter()
+            results = db.get_hybrid_search_with_score_batch([term], args.k)
+            latencies.append(time.perf_counter() - start)
+            found.append([doc.id for doc, _ in results[0]])
+        result["hybrid"] = {
+            **percentiles(latencies),
+            "embedding_calls": embeddings.calls - calls,
+            f"recall_at_{args.k}": recall(found, planted, args.k),
+        }
+
+    print(json.dumps(result, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Filtered search benchmark: query latency over the whole collection against searches restricted
+to the chunks of one document type, per backend.
+The synthetic clustered unit vectors of vector_search.py are split into document types of
+different shares of the collection (a small CV, a larger website and Notion export). Filtered
+results are checked against the exact top-k of the partition.
+Runs offline: no embedding model is involved.
+
+Usage: python benchmarks/partition_search.py [--size 100000] [--dimensions 1536] [--backends numpy faiss chroma]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.schema import Document
+from lib.chroma_backend import ChromaBackend
+from lib.numpy_backend import NumpyBackend
+from lib.faiss_backend import FaissBackend
+from vector_search import normalize, random_vectors, recall
+
+SHARES = {"cv": 0.02, "website": 0.28, "notion": 0.7}
+
+def open_backend(name: str, path: str, quantization: str):
+    """Create an empty backend."""
+    if name == "chroma":
+        return ChromaBackend(path, "bench", None)
+    if name == "faiss":
+        return FaissBackend(path, "bench", quantization=quantization)
+    return NumpyBackend(path, "bench", quantization=quantization)
+
+def main() -> int:
+    """Run the benchmark and print the results as JSON."""
+    parser = argparse.ArgumentParser(description="Filtered search latency benchmark")
+    parser.add_argument("--size", type=int, default=100_000, help="Chunks in the collection")
+    parser.add_argument("--dimensions", type=int, default=1536, help="Embedding dimensions")
+    parser.add_argument("--clusters", type=int, default=1000, help="Topic centroids the vectors are drawn around")
+    parser.add_argument("--spread", type=float, default=0.7, help="Noise around the centroids (relative to their length)")
+    parser.add_argument("--queries", type=int, default=50, help="Queries per partition")
+    parser.add_argument("--k", type=int, default=4, help="Results per query")
+    parser.add_argument("--backends", nargs="+", default=["numpy", "faiss", "chroma"], help="Backends to compare")
+    parser.add_argument("--quantization", default=None, help="Quantization of the numpy and faiss backends")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Chunks per write")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the vectors")
+    args = parser.parse_args()
+
+    centroids = normalize(np.random.default_rng(args.seed).standard_normal((args.clusters, args.dimensions), dtype=np.float32))
+    vectors = random_vectors(np.random.default_rng(args.seed + 2), args.size, centroids, args.spread)
+    queries = random_vectors(np.random.default_rng(args.seed + 1), args.queries, centroids, args.spread)
+    bounds = np.cumsum([0] + [int(share * args.size) for share in SHARES.values()])
+    bounds[-1] = args.size
+    types = np.empty(args.size, dtype=object)
+    for (document_type, _), start, end in zip(SHARES.items(), bounds[:-1], bounds[1:]):
+        types[start:end] = document_type
+    types = types[np.random.default_rng(args.seed + 3).permutation(args.size)]
+
+    partitions = {None: np.ones(args.size, dtype=bool), **{name: types == name for name in SHARES}}
+    exact = {}
+    for name, selected in partitions.items():
+        scores = queries @ vectors[selected].T
+        ids = np.flatnonzero(selected)
+        exact[name] = [[f"chunk#{ids[j]}" for j in np.argsort(-row)[:args.k]] for row in scores]
+
+    result = {"size": args.size, "dimensions": args.dimensions, "shares": SHARES}
+    for backend_name in args.backends:
+        with tempfile.TemporaryDirectory(prefix="partition_search_") as workdir:
+            backend = open_backend(backend_name, os.path.join(workdir, backend_name), args.quantization)
+            for offset in range(0, args.size, args.batch_size):
+                end = min(offset + args.batch_size, args.size)
+                backend.upsert(
+                    [f"chunk#{i}" for i in range(offset, end)],
+                    vectors[offset:end].tolist(),
+                    [Document(page_content=f"chunk {i}", metadata={"document_type": types[i]}) for i in range(offset, end)],
+                )
+
+            result[backend_name] = {}
+            for name in partitions:
+                where = {"document_type": name} if name else None
+                backend.query([queries[0].tolist()], args.k, where)  # Warm up (partition rows, caches)
+                latencies, hits = [], []
+                for vector in queries:
+                    start = time.perf_counter()
+                    results = backend.query([vector.tolist()], args.k, where)
+                    latencies.append(time.perf_counter() - start)
+                    hits.append([doc.id for doc, _ in results[0]])
+                result[backend_name][name or "all"] = {
+                    "chunks": int(partitions[name].sum()),
+                    "query_ms_p50": round(1000 * statistics.median(latencies), 3),
+                    f"recall_at_{args.k}": recall(hits, exact[name]),
+                }
+        print(json.dumps({backend_name: result[backend_name]}), file=sys.stderr)
+
+    print(json.dumps(result, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
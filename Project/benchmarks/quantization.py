@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Memory and recall benchmark for quantized vector storage in the NumPy backend (or the FAISS
+backend, whose index then holds the codes): full-precision search against int8 and binary codes
+with exact rescoring.
+One collection of synthetic clustered unit vectors (see vector_search.py) is written once, then
+searched by a fresh process per mode, so the resident memory each mode needs to serve queries
+(codes plus the full-precision rows it touches) is measured on its own.
+Recall@k is measured against the full-precision results.
+
+Usage: python benchmarks/quantization.py [--size 100000] [--dimensions 1536] [--queries 100] [--backend numpy|faiss]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.numpy_backend import NumpyBackend
+from lib.faiss_backend import FaissBackend
+from vector_search import normalize, random_vectors, fill, recall
+
+MODES = ["none", "int8", "binary"]
+
+def rss_mb() -> float:
+    """Get the resident memory of the process, including the mapped file pages it touched (Linux)."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def open_backend(workdir: str, backend: str, mode: str):
+    """Open the collection with a backend, in one mode."""
+    if backend == "faiss":
+        return FaissBackend(os.path.join(workdir, "db"), "bench", quantization=mode)
+    return NumpyBackend(os.path.join(workdir, "db"), "bench", quantization=mode)
+
+def serve(workdir: str, backend_name: str, mode: str, k: int) -> dict:
+    """Open the collection in one mode and run the queries (in a fresh process)."""
+    queries = np.load(os.path.join(workdir, "queries.npy"))
+    baseline = rss_mb()
+    backend = open_backend(workdir, backend_name, mode)
+
+    latencies, hits = [], []
+    for vector in queries:
+        start = time.perf_counter()
+        results = backend.query([vector.tolist()], k)
+        latencies.append(time.perf_counter() - start)
+        hits.append([doc.id for doc, _ in results[0]])
+
+    return {
+        "resident_mb": round(rss_mb() - baseline, 1),
+        "query_ms_p50": round(1000 * statistics.median(latencies), 3),
+        "query_ms_p95": round(1000 * float(np.percentile(latencies, 95)), 3),
+        "hits": hits,
+    }
+
+def main() -> int:
+    """Run the benchmark and print the results as JSON."""
+    parser = argparse.ArgumentParser(description="Quantized storage memory and recall benchmark")
+    parser.add_argument("--size", type=int, default=100_000, help="Chunks in the collection")
+    parser.add_argument("--dimensions", type=int, default=1536, help="Embedding dimensions")
+    parser.add_argument("--clusters", type=int, default=1000, help="Topic centroids the vectors are drawn around")
+    parser.add_argument("--spread", type=float, default=0.7, help="Noise around the centroids (relative to their length)")
+    parser.add_argument("--queries", type=int, default=100, help="Queries per mode")
+    parser.add_argument("--k", type=int, default=4, help="Results per query")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the vectors")
+    parser.add_argument("--backend", choices=["numpy", "faiss"], default="numpy", help="Vector backend")
+    parser.add_argument("--serve", nargs=3, metavar=("WORKDIR", "BACKEND", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        print(json.dumps(serve(*args.serve, args.k)))
+        return 0
+
+    with tempfile.TemporaryDirectory(prefix="quantization_") as workdir:
+        centroids = normalize(np.random.default_rng(args.seed).standard_normal((args.clusters, args.dimensions), dtype=np.float32))
+        np.save(os.path.join(workdir, "queries.npy"), random_vectors(np.random.default_rng(args.seed + 1), args.queries, centroids, args.spread))
+        backend = NumpyBackend(os.path.join(workdir, "db"), "bench")
+        fill(backend, np.random.default_rng(args.seed + 2), args.size, centroids, args.spread, 5000)
+
+        result = {"size": args.size, "dimensions": args.dimensions, "backend": args.backend}
+        exact = None
+        for mode in MODES:
+            # Build the codes (and index) from the stored vectors once, outside the measured process
+            start = time.perf_counter()
+            quantized = open_backend(workdir, args.backend, mode)
+            encode_seconds = time.perf_counter() - start
+            path = quantized.codes_path or quantized.vectors_path
+            scanned = quantized._codes if quantized._codes is not None else quantized._vectors
+            index_path = getattr(quantized, "index_path", None)
+            del quantized
+
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--serve", workdir, args.backend, mode, "--k", str(args.k)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            served = json.loads(output.strip().splitlines()[-1])
+            hits = served.pop("hits")
+            exact = exact or hits
+            result[mode] = {
+                "bytes_scanned_per_chunk": scanned.shape[1] * scanned.itemsize,
+                "file_mb": round(os.path.getsize(path) / 2**20, 1),
+                **({"index_mb": round(os.path.getsize(index_path) / 2**20, 1)} if index_path and os.path.exists(index_path) else {}),
+                "encode_seconds": round(encode_seconds, 2) if mode != "none" else None,
+                **served,
+                f"recall_at_{args.k}": recall(hits, exact),
+            }
+
+    for mode in MODES[1:]:
+        result[mode]["resident_reduction"] = round(result["none"]["resident_mb"] / max(result[mode]["resident_mb"], 0.1), 1)
+    print(json.dumps(result, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Shared clients benchmark: DocumentDatabase and RAGPredict built again and again, as app.py and
+the services do, with the process-wide clients of lib.resources against fresh ones per object
+(the registry cleared before every construction, as it used to be). Every database opens its
+vector store, a prefilled collection: the numpy and faiss backends map the vectors (and load
+the FAISS index) once when shared.
+Every database then embeds one new text through the OpenAI client, and one through the async
+client (in one event loop, as a server runs the async API), against a local stand-in of the
+embeddings endpoint that counts the connections it accepts: shared clients keep using one
+pooled connection each, fresh ones open a connection (a TLS handshake, against the real API)
+per object.
+Runs offline: the stand-in answers with random vectors.
+
+Usage: python benchmarks/shared_clients.py [--objects 20] [--dimensions 1536] [--backend chroma] [--size 10000]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import statistics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.schema import Document
+from db import DocumentDatabase
+from rag_predict import RAGPredict
+from lib.resources import clear_resources
+from ingest import FakeEmbeddings
+from vector_search import normalize
+
+class EmbeddingsServer(ThreadingHTTPServer):
+    """Local stand-in of the OpenAI embeddings endpoint, counting the connections."""
+    daemon_threads = True
+
+    def __init__(self, dimensions: int) -> None:
+        """Listen on a free local port."""
+        super().__init__(("127.0.0.1", 0), EmbeddingsHandler)
+        self.dimensions = dimensions
+        self.connections = 0
+
+    def process_request(self, request, client_address) -> None:
+        """Count a new connection."""
+        self.connections += 1
+        super().process_request(request, client_address)
+
+class EmbeddingsHandler(BaseHTTPRequestHandler):
+    """Answers embedding requests with random vectors, keeping connections alive."""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self) -> None:
+        """Embed the inputs of the request."""
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        inputs = request["input"] if isinstance(request["input"], list) else [request["input"]]
+        body = json.dumps({
+            "object": "list",
+            "data": [
+                {"object": "embedding", "index": i, "embedding": np.random.standard_normal(self.server.dimensions).tolist()}
+                for i in range(len(inputs))
+            ],
+            "model": request["model"],
+            "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        """Keep the benchmark output clean."""
+
+def fill(db_path: str, backend: str, size: int, dimensions: int) -> None:
+    """Write size chunks with random vectors, offline."""
+    db = DocumentDatabase(db_path=db_path, embeddings=FakeEmbeddings(dimensions=dimensions, latency=0.0), backend=backend)
+    rng = np.random.default_rng(0)
+    for offset in range(0, size, 5000):
+        count = min(5000, size - offset)
+        db.add_documents(
+            [Document(page_content=f"chunk {i}", metadata={"document_type": "cv"}) for i in range(offset, offset + count)],
+            ids=[f"chunk#{i}" for i in range(offset, offset + count)],
+            vectors=normalize(rng.standard_normal((count, dimensions), dtype=np.float32)).tolist(),
+        )
+
+async def embed_async(databases: list, shared: bool) -> list[float]:
+    """Embed a text with the async client of each database, timing the requests."""
+    request_ms = []
+    for i, db in enumerate(databases):
+        start = time.perf_counter()
+        embeddings = db.embeddings.embeddings
+        await embeddings.async_client.create(input=[f"{'shared' if shared else 'fresh'} async query {i}"], model=embeddings.model)
+        request_ms.append(time.perf_counter() - start)
+    return request_ms
+
+def run(server: EmbeddingsServer, db_path: str, backend: str, objects: int, shared: bool) -> dict:
+    """Build the objects and embed a text with each database, with shared or fresh clients."""
+    clear_resources()
+    connections = server.connections
+    db_ms, predict_ms, request_ms, databases = [], [], [], []
+    for i in range(objects):
+        if not shared:
+            clear_resources()
+        start = time.perf_counter()
+        db = DocumentDatabase(db_path=db_path, backend=backend)
+        db.store.count()
+        db_ms.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        RAGPredict(db=db)
+        predict_ms.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        # The OpenAI client under the LangChain model, skipping its tokenizer (offline)
+        embeddings = db.embeddings.embeddings
+        embeddings.client.create(input=[f"{'shared' if shared else 'fresh'} query {i}"], model=embeddings.model)
+        request_ms.append(time.perf_counter() - start)
+        databases.append(db)
+    sync_connections = server.connections - connections
+
+    async_request_ms = asyncio.run(embed_async(databases, shared))
+    return {
+        "database_ms_p50": round(1000 * statistics.median(db_ms), 2),
+        "rag_predict_ms_p50": round(1000 * statistics.median(predict_ms), 2),
+        "first_request_ms_p50": round(1000 * statistics.median(request_ms), 2),
+        "first_async_request_ms_p50": round(1000 * statistics.median(async_request_ms), 2),
+        "connections": sync_connections,
+        "async_connections": server.connections - connections - sync_connections,
+    }
+
+def main() -> int:
+    """Run the benchmark and print the results as JSON."""
+    parser = argparse.ArgumentParser(description="Shared clients benchmark")
+    parser.add_argument("--objects", type=int, default=20, help="Databases and services built per mode")
+    parser.add_argument("--dimensions", type=int, default=1536, help="Embedding dimensions")
+    parser.add_argument("--backend", default="chroma", help="Vector backend (chroma, numpy or faiss)")
+    parser.add_argument("--size", type=int, default=10_000, help="Chunks in the collection")
+    args = parser.parse_args()
+
+    server = EmbeddingsServer(args.dimensions)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ["OPENAI_API_KEY"] = "sk-benchmark"
+
+    with tempfile.TemporaryDirectory(prefix="shared_clients_") as workdir:
+        db_path = os.path.join(workdir, "chroma_db")
+        # Also warms the imports and the store files up, so both modes only pay for their clients
+        fill(db_path, args.backend, args.size, args.dimensions)
+
+        results = {
+            "objects": args.objects,
+            "backend": args.backend,
+            "size": args.size,
+            "fresh": run(server, db_path, args.backend, args.objects, shared=False),
+            "shared": run(server, db_path, args.backend, args.objects, shared=True),
+        }
+    server.shutdown()
+    print(json.dumps(results, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Vector search latency benchmark for the database backends: Chroma (HNSW), the in-process NumPy
+index and the FAISS indexes (flat, IVF, HNSW), at several collection sizes.
+Each backend is filled with the same synthetic unit vectors, drawn around random topic
+centroids like real embeddings (unstructured random vectors would make every approximate
+index look bad), then queried one vector at a time
+and in batches (as the multi-query retrieval does). Recall@k is measured against the exact
+NumPy results; the FAISS search parameters (HNSW efSearch, IVF nprobe) are swept on the built
+index, to pick them from data.
+Runs offline: no embedding model is involved.
+
+Usage: python benchmarks/vector_search.py [--sizes 10000 100000 1000000] [--dimensions 1536]
+       [--faiss flat ivf hnsw] [--ef-search 16 64 256] [--nprobe 1 8 32]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.schema import Document
+from lib.chroma_backend import ChromaBackend
+from lib.numpy_backend import NumpyBackend
+from lib.faiss_backend import FaissBackend
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length."""
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def random_vectors(rng: np.random.Generator, count: int, centroids: np.ndarray, spread: float) -> np.ndarray:
+    """Get unit vectors scattered around random centroids."""
+    noise = rng.standard_normal((count, centroids.shape[1]), dtype=np.float32) / np.sqrt(centroids.shape[1])
+    return normalize(centroids[rng.integers(len(centroids), size=count)] + spread * noise)
+
+def fill(backend, rng: np.random.Generator, size: int, centroids: np.ndarray, spread: float, batch_size: int) -> float:
+    """Write size synthetic chunks to a backend, returning the seconds it took."""
+    start = time.perf_counter()
+    for offset in range(0, size, batch_size):
+        count = min(batch_size, size - offset)
+        ids = [f"chunk#{i}" for i in range(offset, offset + count)]
+        documents = [Document(page_content=f"chunk {i}", metadata={"document_type": "cv"}) for i in range(offset, offset + count)]
+        backend.upsert(ids, random_vectors(rng, count, centroids, spread).tolist(), documents)
+    return time.perf_counter() - start
+
+def measure(backend, queries: np.ndarray, k: int, batch: int) -> tuple[dict, list[list[str]]]:
+    """Query a backend one vector at a time and in batches, returning latencies and the hit IDs."""
+    single, hits = [], []
+    for vector in queries:
+        start = time.perf_counter()
+        results = backend.query([vector.tolist()], k)
+        single.append(time.perf_counter() - start)
+        hits.append([doc.id for doc, _ in results[0]])
+
+    batched = []
+    for offset in range(0, len(queries) - batch + 1, batch):
+        start = time.perf_counter()
+        backend.query(queries[offset:offset + batch].tolist(), k)
+        batched.append(time.perf_counter() - start)
+
+    latencies = {
+        "query_ms_p50": round(1000 * statistics.median(single), 3),
+        "query_ms_p95": round(1000 * float(np.percentile(single, 95)), 3),
+        f"batch_of_{batch}_ms_p50": round(1000 * statistics.median(batched), 3) if batched else None,
+    }
+    return latencies, hits
+
+def recall(hits: list[list[str]], exact: list[list[str]]) -> float:
+    """Get the share of the exact top-k found."""
+    found = sum(len(set(approx) & set(truth)) for approx, truth in zip(hits, exact))
+    return round(found / sum(len(truth) for truth in exact), 4)
+
+def sweep(backend: FaissBackend, queries: np.ndarray, exact: list[list[str]], args: argparse.Namespace) -> list[dict]:
+    """Measure a FAISS index at every value of its search parameter."""
+    parameter, values = {"hnsw": ("ef_search", args.ef_search), "ivf": ("nprobe", args.nprobe)}.get(backend.index_type, (None, [None]))
+    results = []
+    for value in values:
+        if parameter:
+            setattr(backend, parameter, value)
+        latencies, hits = measure(backend, queries, args.k, args.batch)
+        results.append({**({parameter: value} if parameter else {}), **latencies, f"recall_at_{args.k}": recall(hits, exact)})
+    return results
+
+def main() -> int:
+    """Run the benchmark and print the results as JSON."""
+    parser = argparse.ArgumentParser(description="Vector search latency benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="Collection sizes")
+    parser.add_argument("--dimensions", type=int, default=1536, help="Embedding dimensions")
+    parser.add_argument("--clusters", type=int, default=1000, help="Topic centroids the vectors are drawn around")
+    parser.add_argument("--spread", type=float, default=0.7, help="Noise around the centroids (relative to their length)")
+    parser.add_argument("--queries", type=int, default=100, help="Queries per size")
+    parser.add_argument("--k", type=int, default=4, help="Results per query")
+    parser.add_argument("--batch", type=int, default=4, help="Queries per batched search")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Chunks per write")
+    parser.add_argument("--chroma-max-size", type=int, default=100_000, help="Skip Chroma above this size (slow to fill)")
+    parser.add_argument("--faiss", nargs="*", default=["flat", "ivf", "hnsw"], help="FAISS index types")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 256], help="HNSW efSearch values")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 8, 32], help="IVF nprobe values")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the vectors")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory(prefix="vector_search_") as workdir:
+            centroids = normalize(np.random.default_rng(args.seed).standard_normal((args.clusters, args.dimensions), dtype=np.float32))
+            queries = random_vectors(np.random.default_rng(args.seed + 1), args.queries, centroids, args.spread)
+            backends = {"numpy": NumpyBackend(os.path.join(workdir, "numpy"), "bench")}
+            if size <= args.chroma_max_size:
+                backends["chroma"] = ChromaBackend(os.path.join(workdir, "chroma"), "bench", None)
+            for index_type in args.faiss:
+                backends[f"faiss_{index_type}"] = FaissBackend(os.path.join(workdir, index_type), "bench", index_type=index_type)
+
+            result = {"size": size, "dimensions": args.dimensions, "clusters": args.clusters}
+            exact = None
+            for name, backend in backends.items():
+                fill_seconds = fill(backend, np.random.default_rng(args.seed + 2), size, centroids, args.spread, args.batch_size)
+                result[name] = {"fill_seconds": round(fill_seconds, 2)}
+                if isinstance(backend, FaissBackend):
+                    start = time.perf_counter()
+                    backend.save()
+                    reloaded = FaissBackend(backend.db_path, "bench", index_type=backend.index_type)
+                    result[name]["load_seconds"] = round(time.perf_counter() - start, 3)
+                    result[name]["sweep"] = sweep(reloaded, queries, exact, args)
+                    continue
+
+                latencies, hits = measure(backend, queries, args.k, args.batch)
+                result[name].update(latencies)
+                if name == "numpy":
+                    exact = hits
+                else:
+                    result[name][f"recall_at_{args.k}"] = recall(hits, exact)
+
+        if "chroma" in result:
+            result["numpy_speedup"] = round(result["chroma"]["query_ms_p50"] / result["numpy"]["query_ms_p50"], 2)
+        results.append(result)
+        print(json.dumps(result), file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,71 +4,546 @@ Database management for RAG application.
 Handles document storage, embeddings, and similarity search.
 """
 import os
+import json
+import asyncio
+import uuid
+import time
+import hashlib
 import logging
-from typing import Dict, Any
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
+import threading
+from typing import Dict, Any, Optional
 from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from lib.embedding_cache import CachedEmbeddings
+from lib.embedding_writer import BatchEmbeddingWriter
+from lib.numpy_backend import NumpyBackend
+from lib.bm25_index import BM25Index
+from lib.dedup import ChunkDeduplicator
+from lib.collection_stats import CollectionStats
+from lib.rank_fusion import reciprocal_rank_fusion
+from lib.resources import get_resource, get_embeddings, get_chroma_client
 
 logger = logging.getLogger(__name__)
 
 class DocumentDatabase:
     """Handles document storage and retrieval for RAG."""
+    embedding_model = "text-embedding-3-small"
+    embedding_batch_tokens = 50_000
+    embedding_workers = 4
+    embedding_tokens_per_minute = 1_000_000
+    faiss_index_type = "hnsw"
+    vector_quantization = None
     
     def __init__(
         self,
         db_path: str = "./chroma_db",
-        collection_name: str = "project_documents_collection"
+        collection_name: str = "project_documents_collection",
+        embedding_cache_size: int = 100_000,
+        embeddings: Optional[Embeddings] = None,
+        backend: Optional[str] = None
     ) -> None:
-        """Initialize the database connection."""
+        """
+        Initialize the database connection.
+        An embedding model can be passed in (e.g. an offline stand-in); it defaults to OpenAI.
+        The vector backend ("chroma", "numpy" or "faiss") defaults to the RAG_VECTOR_BACKEND
+        environment variable, then to "chroma". The FAISS index type ("flat", "ivf" or "hnsw")
+        defaults to RAG_FAISS_INDEX, then to faiss_index_type. The numpy and faiss backends can
+        search quantized codes of the vectors ("int8" or "binary", from RAG_VECTOR_QUANTIZATION,
+        then vector_quantization), rescoring the candidates on the full-precision ones.
+        """
         self.db_path = db_path
         self.collection_name = collection_name
-        self.embeddings = self._setup_embeddings()
-        self.vector_store = self._connect()
-
-    def _setup_embeddings(self):
-        """Setup embedding function."""
-        openai_key = os.getenv("OPENAI_API_KEY")
-        if not openai_key:
-            raise ValueError(
-                "OPENAI_API_KEY not found in environment variables. "
-                "Please add it to your .env file: OPENAI_API_KEY=your_key_here"
+        self.embedding_cache_size = embedding_cache_size
+        self.backend = backend or os.getenv("RAG_VECTOR_BACKEND", "chroma")
+        self.quantization = os.getenv("RAG_VECTOR_QUANTIZATION", self.vector_quantization)
+        self.version_path = os.path.join(os.path.dirname(self.db_path) or ".", "collection_version")
+        self.keyword_index_path = os.path.abspath(os.path.join(os.path.dirname(self.db_path) or ".", "keyword_index.sqlite3"))
+        self.stats = CollectionStats(os.path.join(os.path.dirname(self.db_path) or ".", "collection_stats.json"))
+        # The embedding model, writer and vector store are set up on first use, so reading the
+        # statistics (app.py --size) doesn't create an OpenAI client or load the vectors
+        self._lock = threading.Lock()
+        self._embeddings = self._setup_embeddings(embeddings) if embeddings is not None else None
+        self._writer = None
+        self._store = None
+
+    @property
+    def keyword_index(self) -> BM25Index:
+        """The keyword index next to the database, opened on first use and shared by the process."""
+        return get_resource(("keyword_index", self.keyword_index_path), lambda: BM25Index(self.keyword_index_path))
+
+    @property
+    def embeddings(self) -> CachedEmbeddings:
+        """The cached embedding model, the default one created on first use."""
+        if self._embeddings is None:
+            self._embeddings = self._setup_embeddings()
+        return self._embeddings
+
+    @property
+    def writer(self) -> BatchEmbeddingWriter:
+        """The batch embedding writer, created on first use."""
+        with self._lock:
+            if self._writer is None:
+                self._writer = BatchEmbeddingWriter(
+                    self.embeddings,
+                    max_batch_tokens=self.embedding_batch_tokens,
+                    max_workers=self.embedding_workers,
+                    tokens_per_minute=self.embedding_tokens_per_minute,
+                )
+            return self._writer
+
+    @property
+    def store(self):
+        """The vector backend, connected on first use."""
+        with self._lock:
+            if self._store is None:
+                self._store = self._connect()
+            return self._store
+
+    def _setup_embeddings(self, embeddings: Optional[Embeddings] = None) -> CachedEmbeddings:
+        """
+        Setup embedding function, backed by a persistent cache stored next to the database.
+        The default OpenAI model and its cache are shared by the databases of the process.
+        """
+        cache_path = os.path.abspath(os.path.join(os.path.dirname(self.db_path) or ".", "embedding_cache.sqlite3"))
+
+        if embeddings is None:
+            openai_key = os.getenv("OPENAI_API_KEY")
+            if not openai_key:
+                raise ValueError(
+                    "OPENAI_API_KEY not found in environment variables. "
+                    "Please add it to your .env file: OPENAI_API_KEY=your_key_here"
+                )
+
+            return get_resource(
+                ("cached_embeddings", cache_path, self.embedding_model, self.embedding_cache_size),
+                lambda: self._cache_embeddings(get_embeddings(self.embedding_model), cache_path),
             )
-        
-        return OpenAIEmbeddings(model="text-embedding-3-small")
 
-    def _connect(self):
-        """Connect to ChromaDB using LangChain wrapper."""
-        # Docs: https://python.langchain.com/docs/integrations/vectorstores/chroma/#setup
-        # API Ref: https://python.langchain.com/api_reference/chroma/vectorstores/langchain_chroma.vectorstores.Chroma.html#langchain_chroma.vectorstores.Chroma
-        vector_store = Chroma(
-            collection_name=self.collection_name,
-            embedding_function=self.embeddings,
-            persist_directory=self.db_path,
+        return self._cache_embeddings(embeddings, cache_path)
+
+    def _cache_embeddings(self, embeddings: Embeddings, cache_path: str) -> CachedEmbeddings:
+        """Wrap an embedding model in the persistent cache."""
+        return CachedEmbeddings(
+            embeddings,
+            cache_path=cache_path,
+            model=getattr(embeddings, "model", self.embedding_model),
+            dimensions=getattr(embeddings, "dimensions", None),
+            max_entries=self.embedding_cache_size,
         )
 
-        return vector_store
+    def _connect(self):
+        """
+        Connect to the configured vector backend. The numpy and faiss backends (vectors mapped
+        in memory, FAISS index loaded) are shared by the databases of the process that open the
+        same collection with the same settings; Chroma shares its client instead.
+        """
+        if self.backend == "chroma":
+            from lib.chroma_backend import ChromaBackend
+            if self.quantization:
+                raise ValueError("Quantized storage needs the numpy or faiss vector backend")
+            return ChromaBackend(
+                self.db_path,
+                self.collection_name,
+                self.embeddings,
+                client=get_chroma_client(self.db_path),
+            )
+        if self.backend == "numpy":
+            return get_resource(
+                ("numpy", os.path.abspath(self.db_path), self.collection_name, None, self.quantization),
+                lambda: NumpyBackend(self.db_path, self.collection_name, quantization=self.quantization),
+            )
+        if self.backend == "faiss":
+            from lib.faiss_backend import FaissBackend
+            index_type = os.getenv("RAG_FAISS_INDEX", self.faiss_index_type)
+            return get_resource(
+                ("faiss", os.path.abspath(self.db_path), self.collection_name, index_type, self.quantization),
+                lambda: FaissBackend(
+                    self.db_path,
+                    self.collection_name,
+                    index_type=index_type,
+                    quantization=self.quantization,
+                ),
+            )
+        raise ValueError(f"Unknown vector backend: {self.backend} (expected chroma, numpy or faiss)")
     
     def get_collection_info(self) -> Dict[str, Any]:
         """Get information about the current collection."""
         try:
-            vectors = self.vector_store.get()
+            stats = self.get_collection_stats()
             return {
-                "document_count": len(vectors['ids']),
-                "collection_name": self.collection_name
+                "document_count": stats["count"],
+                "collection_name": self.collection_name,
+                "backend": self.backend,
+                "document_types": stats["document_types"],
+                "sources": len(stats["sources"]),
+                "dimensions": stats["dimensions"],
+                "disk_bytes": stats["disk_bytes"],
+                "last_seed_at": stats["last_seed_at"],
+                # The counters of this process, if it embedded anything, without counting the cache
+                "embedding_cache": self._embeddings.stats(count=False) if self._embeddings is not None else None
             }
         except Exception as e:
             logger.error(f"Error getting collection info: {e}")
             return {}
 
-    def add_documents(self, documents: list[Document]) -> list[str]:
-        """Add documents to the vector store."""
-        return self.vector_store.add_documents(documents)
+    def get_collection_stats(self) -> Dict[str, Any]:
+        """
+        Get the statistics of the collection: the chunk count, the counts per document type and
+        per seed source, the embedding dimensions, the bytes of the vector store on disk and the
+        last seed time. They are kept up to date by every write, so this doesn't read the chunks
+        (except to build them, the first time, for a collection seeded before they existed).
+        """
+        if not self.stats.exists():
+            self.sync_collection_stats()
+        return {**self.stats.get(), "disk_bytes": self._disk_bytes()}
+
+    def sync_collection_stats(self) -> bool:
+        """
+        Count the stored chunks again if the statistics are missing or don't match the chunk
+        count. Returns whether they were rebuilt.
+        """
+        if self.stats.exists() and self.stats.get()["count"] == self.store.count():
+            return False
+
+        metadatas = self.store.get_metadatas()
+        self.stats.rebuild(metadatas.values(), self.store.dimensions)
+        logger.info(f"Rebuilt the collection stats of {len(metadatas)} chunks")
+        return True
+
+    def _disk_bytes(self) -> int:
+        """Get the size of the files of the vector store."""
+        total = 0
+        for directory, _, files in os.walk(self.db_path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(directory, name))
+                except OSError:
+                    continue
+        return total
+
+    def add_documents(
+        self,
+        documents: list[Document],
+        ids: list[str] = None,
+        vectors: list[list[float]] = None
+    ) -> list[str]:
+        """
+        Add (or overwrite) documents in the vector store.
+        Unless precomputed vectors are given, embeddings are computed in concurrent,
+        token-sized batches within the rate limit.
+        """
+        if not documents:
+            return []
+
+        ids = ids or [str(uuid.uuid4()) for _ in documents]
+        if vectors is None:
+            vectors = self.writer.embed([doc.page_content for doc in documents])
+
+        # The chunks overwritten leave the statistics, the written ones enter them
+        previous = self.store.get_metadatas(ids=ids)
+        self.store.upsert(ids, vectors, documents)
+        self.keyword_index.add(ids, [doc.page_content for doc in documents])
+        self.stats.update(previous.values(), [doc.metadata or {} for doc in documents], len(vectors[0]))
+        self._bump_collection_version()
+        return ids
+
+    def delete_documents(self, ids: list[str]) -> None:
+        """Delete documents from the vector store."""
+        if ids:
+            previous = self.store.get_metadatas(ids=ids)
+            self.store.delete(ids)
+            self.keyword_index.delete(ids)
+            self.stats.update(previous.values(), [])
+            self._bump_collection_version()
+
+    def record_seed(self) -> None:
+        """Record the end of a seed in the collection statistics."""
+        self.stats.record_seed()
+
+    def sync_keyword_index(self) -> bool:
+        """
+        Rebuild the keyword index from the stored chunks if it doesn't cover them all, e.g. for a
+        collection seeded before the index existed. Returns whether it was rebuilt.
+        """
+        count = self.store.count()
+        if self.keyword_index.count() == count:
+            return False
+
+        documents = self.store.get_documents()
+        self.keyword_index.reset()
+        self.keyword_index.add(list(documents), [doc.page_content for doc in documents.values()])
+        logger.info(f"Rebuilt the keyword index of {len(documents)} chunks")
+        return True
+
+    def get_collection_version(self) -> str:
+        """
+        Get the version of the collection, which changes on every write, delete and reset
+        (also from other processes, e.g. app.py --seed), so caches can tell stale entries.
+        """
+        try:
+            with open(self.version_path) as f:
+                return f.read()
+        except OSError:
+            return ""
+
+    def _bump_collection_version(self) -> None:
+        """Change the collection version."""
+        with open(self.version_path, "w") as f:
+            f.write(f"{time.time_ns()}-{uuid.uuid4().hex[:8]}")
+
+    @staticmethod
+    def _content_hash(document: Document) -> str:
+        """Hash the content and metadata of a chunk."""
+        metadata = {
+            key: value for key, value in document.metadata.items()
+            if key not in ("seed_source", "content_hash", ChunkDeduplicator.fingerprint_key)
+        }
+        payload = json.dumps([document.page_content, metadata], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_content_hashes(self, seed_source: str) -> Dict[str, str]:
+        """Get the stored content hash of every chunk of a seed source."""
+        metadatas = self.store.get_metadatas({"seed_source": seed_source})
+        return {chunk_id: metadata.get("content_hash") for chunk_id, metadata in metadatas.items()}
+
+    def get_seed_sources(self, document_type: Optional[str] = None) -> set[str]:
+        """Get the seed sources of the stored chunks (of a document type)."""
+        metadatas = self.store.get_metadatas(self.partition(document_type=document_type))
+        return {metadata["seed_source"] for metadata in metadatas.values() if metadata.get("seed_source")}
+
+    def get_unsourced_ids(self, document_type: Optional[str] = None) -> list[str]:
+        """
+        Get the IDs of the stored chunks (of a document type) without a seed source, i.e. seeded
+        before seed sources were tracked, which no reseed would otherwise diff or remove.
+        """
+        metadatas = self.store.get_metadatas(self.partition(document_type=document_type))
+        return [chunk_id for chunk_id, metadata in metadatas.items() if not metadata.get("seed_source")]
+
+    def get_stored_metadatas(self, document_type: Optional[str] = None) -> Dict[str, dict]:
+        """Get the metadata of the stored chunks (of a document type), by ID."""
+        return self.store.get_metadatas(self.partition(document_type=document_type))
+
+    def update_metadatas(self, metadatas: Dict[str, dict]) -> None:
+        """
+        Overwrite the metadata of stored chunks, by ID, without re-embedding them. Only for
+        fields the content hash, the filters and the statistics don't cover (e.g. fingerprints).
+        """
+        if metadatas:
+            self.store.update_metadatas(metadatas)
+
+    def get_stored_documents(self, ids: list[str]) -> Dict[str, Document]:
+        """Get the stored chunks with the given IDs, by ID."""
+        return self.store.get_documents(ids) if ids else {}
+
+    def prepare_documents(self, seed_source: str, documents: list[Document], start: int = 0) -> list[str]:
+        """
+        Tag the chunks of a seed source with their content hash and return their IDs.
+        IDs are derived from the source and the chunk position, starting at start.
+        """
+        ids = []
+        for position, doc in enumerate(documents, start):
+            doc.metadata["seed_source"] = seed_source
+            doc.metadata["content_hash"] = self._content_hash(doc)
+            ids.append(f"{seed_source}#{position}")
+        return ids
+
+    @staticmethod
+    def diff_documents(
+        ids: list[str],
+        documents: list[Document],
+        existing_hashes: Dict[str, str]
+    ) -> tuple[list[str], list[Document], Dict[str, int]]:
+        """Select the prepared chunks that are new or changed, counting added/updated/skipped."""
+        write_ids, write_docs = [], []
+        counts = {"added": 0, "updated": 0, "skipped": 0}
+        for chunk_id, doc in zip(ids, documents):
+            if chunk_id not in existing_hashes:
+                counts["added"] += 1
+            elif existing_hashes[chunk_id] != doc.metadata["content_hash"]:
+                counts["updated"] += 1
+            else:
+                counts["skipped"] += 1
+                continue
+            write_ids.append(chunk_id)
+            write_docs.append(doc)
+        return write_ids, write_docs, counts
+
+    def sync_documents(self, seed_source: str, documents: list[Document]) -> Dict[str, int]:
+        """
+        Sync the chunks of a seed source with the vector store.
+        Unchanged chunks are skipped, changed ones updated and vanished ones removed.
+        Only added and updated chunks are embedded.
+        """
+        existing_hashes = self.get_content_hashes(seed_source)
+        ids = self.prepare_documents(seed_source, documents)
+        write_ids, write_docs, counts = self.diff_documents(ids, documents, existing_hashes)
+
+        seen_ids = set(ids)
+        removed_ids = [chunk_id for chunk_id in existing_hashes if chunk_id not in seen_ids]
+
+        self.add_documents(write_docs, ids=write_ids)
+        self.delete_documents(removed_ids)
+
+        summary = {**counts, "removed": len(removed_ids)}
+        logger.info(f"Synced {seed_source}: {summary}")
+        return summary
     
     def reset_collection(self) -> None:
         """Reset the collection."""
-        self.vector_store.reset_collection()
+        self.store.reset()
+        self.keyword_index.reset()
+        self.stats.reset()
+        self._bump_collection_version()
+
+    @staticmethod
+    def partition(document_type: Optional[str] = None, source: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get the filter of a partition of the collection: the chunks of a document type
+        ("cv", "website" or "notion") and/or of a source (the file path or page URL they were
+        seeded from). None is the whole collection.
+        """
+        where = {}
+        if document_type:
+            where["document_type"] = document_type
+        if source:
+            where["seed_source"] = source
+        return where or None
+
+    def get_similarity_search_with_score(
+        self,
+        user_query: str,
+        document_type: Optional[str] = None,
+        source: Optional[str] = None
+    ) -> list[tuple[Document, float]]:
+        """
+        Get the similarity search with score, in the whole collection or in the chunks of a
+        document type and/or source.
+        """
+        where = self.partition(document_type, source)
+        return self._query_vectors([self.embeddings.embed_query(user_query)], 4, where)[0]
+
+    def get_similarity_search_with_score_batch(
+        self,
+        queries: list[str],
+        k: int = 4,
+        where: Optional[Dict[str, Any]] = None
+    ) -> list[list[tuple[Document, float]]]:
+        """
+        Get the similarity search with score for several queries at once.
+        All queries are embedded in one request and searched in one collection query,
+        restricted to a partition (see partition) if given.
+        """
+        if not queries:
+            return []
+
+        vectors = self.embeddings.embed_documents(queries)
+        return self._query_vectors(vectors, k, where)
+
+    async def aget_similarity_search_with_score_batch(
+        self,
+        queries: list[str],
+        k: int = 4,
+        where: Optional[Dict[str, Any]] = None
+    ) -> list[list[tuple[Document, float]]]:
+        """
+        Async counterpart of get_similarity_search_with_score_batch.
+        The embedding request is awaited and the vector search runs in a worker thread.
+        """
+        if not queries:
+            return []
 
-    def get_similarity_search_with_score(self, user_query: str) -> list[tuple[Document, float]]:
-        """Get the similarity search with score."""
-        return self.vector_store.similarity_search_with_score(user_query)
\ No newline at end of file
+        vectors = await self.embeddings.aembed_documents(queries)
+        return await asyncio.to_thread(self._query_vectors, vectors, k, where)
+
+    def _query_vectors(
+        self,
+        vectors: list[list[float]],
+        k: int,
+        where: Optional[Dict[str, Any]] = None
+    ) -> list[list[tuple[Document, float]]]:
+        """
+        Search the k nearest chunks of each query vector in one backend query. The backend
+        only searches the chunks matching the filter, rather than filtering the results.
+        """
+        return self.store.query(vectors, k, where)
+
+    def is_keyword_query(self, user_query: str) -> bool:
+        """Check if a query is a few exact terms that the keyword index resolves on its own."""
+        return self.keyword_index.is_keyword_query(user_query)
+
+    def get_keyword_search_with_score(
+        self,
+        user_query: str,
+        k: int = 4,
+        match_all: bool = False
+    ) -> list[tuple[Document, float]]:
+        """
+        Get the k best chunks of the keyword index (containing any, or all, of the query terms),
+        with their BM25 score (higher is better). No embedding is involved.
+        """
+        hits = self.keyword_index.search(user_query, k, match_all)
+        documents = self.store.get_documents([chunk_id for chunk_id, _ in hits])
+        return [(documents[chunk_id], score) for chunk_id, score in hits if chunk_id in documents]
+
+    def get_hybrid_search_with_score_batch(
+        self,
+        queries: list[str],
+        k: int = 4,
+        rrf_k: int = 60,
+        where: Optional[Dict[str, Any]] = None
+    ) -> list[list[tuple[Document, float]]]:
+        """
+        Get the k best chunks of each query from the vector and the keyword search, fused by
+        reciprocal rank fusion. Every chunk comes with its vector distance, also the ones only
+        the keyword index found, so the same score thresholds apply as for the vector search.
+        With a partition filter, keyword hits outside the partition are dropped.
+        """
+        if not queries:
+            return []
+
+        vectors = self.embeddings.embed_documents(queries)
+        return self._hybrid_query(queries, vectors, k, rrf_k, where)
+
+    async def aget_hybrid_search_with_score_batch(
+        self,
+        queries: list[str],
+        k: int = 4,
+        rrf_k: int = 60,
+        where: Optional[Dict[str, Any]] = None
+    ) -> list[list[tuple[Document, float]]]:
+        """Async counterpart of get_hybrid_search_with_score_batch."""
+        if not queries:
+            return []
+
+        vectors = await self.embeddings.aembed_documents(queries)
+        return await asyncio.to_thread(self._hybrid_query, queries, vectors, k, rrf_k, where)
+
+    def _hybrid_query(
+        self,
+        queries: list[str],
+        vectors: list[list[float]],
+        k: int,
+        rrf_k: int,
+        where: Optional[Dict[str, Any]] = None
+    ) -> list[list[tuple[Document, float]]]:
+        """Fuse the vector and keyword results of each query."""
+        dense = self._query_vectors(vectors, k, where)
+        lexical = [[chunk_id for chunk_id, _ in self.keyword_index.search(query, k)] for query in queries]
+
+        # The distances of the keyword hits, in one backend query restricted to them
+        distances = [{doc.id: (doc, distance) for doc, distance in results} for results in dense]
+        missing = list(dict.fromkeys(
+            chunk_id for hits, known in zip(lexical, distances) for chunk_id in hits if chunk_id not in known
+        ))
+        if missing:
+            for i, results in enumerate(self.store.query(vectors, len(missing), where, ids=missing)):
+                distances[i].update((doc.id, (doc, distance)) for doc, distance in results)
+
+        return [
+            reciprocal_rank_fusion(
+                [results, [distances[i][chunk_id] for chunk_id in lexical[i] if chunk_id in distances[i]]],
+                k=rrf_k,
+                top_k=k,
+            )
+            for i, results in enumerate(dense)
+        ]
@@ -0,0 +1,126 @@
+"""
+Semantic answer cache for the RAG chat.
+"""
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class SemanticAnswerCache:
+    """
+    In-memory cache of answers keyed on query embeddings.
+    A query whose embedding has a cosine similarity of at least similarity_threshold with a
+    cached query gets that query's answer, if it was asked in the same conversation context:
+    answers to follow-ups ("and the second one?") depend on the conversation, so entries are
+    scoped by a hash of the chat history. Only answers given without history are shared by
+    every conversation. Entries expire after ttl_seconds, the least recently
+    used ones are evicted beyond max_entries, and everything is dropped when the collection
+    version changes (the database was seeded or reset).
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = 0.95,
+        ttl_seconds: float = 3600.0,
+        max_entries: int = 1000,
+    ) -> None:
+        """Configure the similarity threshold, expiry and size cap."""
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._answers: list[str] = []
+        self._contexts: list[Optional[str]] = []
+        self._created_at: list[float] = []
+        self._last_used: list[float] = []
+
+    def _clear(self) -> None:
+        """Drop every entry."""
+        self._vectors = None
+        self._answers, self._contexts, self._created_at, self._last_used = [], [], [], []
+
+    def _drop(self, indexes: list[int]) -> None:
+        """Drop the entries at the given indexes."""
+        dropped = set(indexes)
+        keep = [i for i in range(len(self._answers)) if i not in dropped]
+        if not keep:
+            self._clear()
+            return
+        self._vectors = self._vectors[keep]
+        self._answers = [self._answers[i] for i in keep]
+        self._contexts = [self._contexts[i] for i in keep]
+        self._created_at = [self._created_at[i] for i in keep]
+        self._last_used = [self._last_used[i] for i in keep]
+
+    def _sync(self, version: str, now: float) -> None:
+        """Drop everything on a new collection version, and the expired entries."""
+        if version != self.version:
+            if self._answers:
+                logger.info(f"Collection changed, dropping {len(self._answers)} cached answers")
+            self._clear()
+            self.version = version
+
+        expired = [i for i, created_at in enumerate(self._created_at) if now - created_at > self.ttl_seconds]
+        if expired:
+            self._drop(expired)
+
+    @staticmethod
+    def _normalize(vector: list[float]) -> np.ndarray:
+        """Get a unit-length float32 copy of a vector."""
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, vector: list[float], version: str, context: Optional[str] = None) -> Optional[str]:
+        """
+        Get the answer of the most similar cached query asked in the same context (None for no
+        chat history), if it is similar enough.
+        """
+        now = time.time()
+        with self._lock:
+            self._sync(version, now)
+            if self._vectors is not None:
+                similarities = self._vectors @ self._normalize(vector)
+                similarities[[c != context for c in self._contexts]] = -np.inf
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    self.hits += 1
+                    self._last_used[best] = now
+                    return self._answers[best]
+
+            self.misses += 1
+            return None
+
+    def put(self, vector: list[float], answer: str, version: str, context: Optional[str] = None) -> None:
+        """Cache the answer of a query in a context, evicting the least recently used entry when full."""
+        now = time.time()
+        with self._lock:
+            self._sync(version, now)
+            if len(self._answers) >= self.max_entries:
+                self._drop([int(np.argmin(self._last_used))])
+
+            row = self._normalize(vector)[np.newaxis, :]
+            self._vectors = row if self._vectors is None else np.vstack([self._vectors, row])
+            self._answers.append(answer)
+            self._contexts.append(context)
+            self._created_at.append(now)
+            self._last_used.append(now)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the cache hit/miss counters and size."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "size": len(self._answers),
+            "max_entries": self.max_entries,
+        }
@@ -0,0 +1,171 @@
+"""
+BM25 inverted index of the chunk texts, for keyword search next to the vector search.
+"""
+import re
+import sqlite3
+import logging
+import threading
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"\w+")
+
+STOPWORDS = frozenset("""
+    a about above after again all am an and any are as at be been before being below between both
+    but by can could did do does doing down during each few for from had has have having he her here
+    hers him his how i if in into is it its just me more most my no nor not now of off on once only
+    or other our ours out over own same she should so some such than that the their theirs them then
+    there these they this those through to too under until up very was we were what when where which
+    while who whom why will with would you your yours
+""".split())
+
+def tokenize(text: str) -> list[str]:
+    """Split a text into lowercase word tokens, without stopwords."""
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+class BM25Index:
+    """
+    Full-text index of the chunks, scored with Okapi BM25. Exact domain terms (product names,
+    acronyms, invoice numbers) that embeddings rank poorly are found by their postings.
+    The tokens of every chunk are stored in an SQLite FTS5 table, whose postings and bm25()
+    ranking stay on disk: opening the index loads nothing, writes only touch their chunks and
+    writes from other processes (e.g. app.py --seed) are seen by the next search.
+    FTS5 scores with k1 = 1.2 and b = 0.75.
+    A query is keyword-heavy when it has at most keyword_max_terms terms, all of them indexed
+    and rare (each in at most keyword_max_ratio of the chunks): its best chunks are then the
+    ones containing all the terms, with no need for an embedding.
+    """
+    keyword_max_terms = 3
+    keyword_max_ratio = 0.05
+    schema_version = 1
+
+    def __init__(self, index_path: str) -> None:
+        """Open (or create) the index file."""
+        self.index_path = index_path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(index_path, check_same_thread=False)
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < self.schema_version:
+            self._migrate()
+        # Chunks are stored as their tokens, so FTS5 indexes the terms queries are tokenized to
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunk_ids (row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE);
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunk_terms USING fts5(
+                terms, tokenize = "unicode61 remove_diacritics 0 tokenchars '_'"
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunk_vocabulary USING fts5vocab(chunk_terms, row);
+            """
+        )
+        self._conn.commit()
+        self._data_version = None
+        self._count = 0
+
+    def _migrate(self) -> None:
+        """
+        Upgrade an index file of an older schema (user_version below schema_version) once.
+        Version 0 kept the tokens of every chunk as JSON in a chunks table, loaded at startup;
+        it is dropped, and the next seed rebuilds the index (see DocumentDatabase.sync_keyword_index).
+        """
+        with self._conn:
+            self._conn.execute("DROP TABLE IF EXISTS chunks")
+            self._conn.execute(f"PRAGMA user_version = {self.schema_version}")
+
+    def _rows(self, ids: list[str]) -> list[int]:
+        """Get the rows of the stored chunks among ids."""
+        rows = []
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows.extend(row for (row,) in self._conn.execute(
+                f"SELECT row FROM chunk_ids WHERE id IN ({placeholders})", batch
+            ))
+        return rows
+
+    def _delete_rows(self, rows: list[int]) -> None:
+        """Remove the chunks of rows, without committing."""
+        for start in range(0, len(rows), 500):
+            batch = rows[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            self._conn.execute(f"DELETE FROM chunk_terms WHERE rowid IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM chunk_ids WHERE row IN ({placeholders})", batch)
+
+    def add(self, ids: list[str], texts: Iterable[str]) -> None:
+        """Index (or reindex) chunks by ID."""
+        rows = [(chunk_id, " ".join(tokenize(text))) for chunk_id, text in zip(ids, texts)]
+        if not rows:
+            return
+
+        with self._lock:
+            self._delete_rows(self._rows(ids))
+            for chunk_id, terms in rows:
+                row = self._conn.execute("INSERT INTO chunk_ids (id) VALUES (?)", (chunk_id,)).lastrowid
+                self._conn.execute("INSERT INTO chunk_terms (rowid, terms) VALUES (?, ?)", (row, terms))
+            self._conn.commit()
+            self._data_version = None
+
+    def delete(self, ids: list[str]) -> None:
+        """Remove chunks by ID."""
+        if not ids:
+            return
+
+        with self._lock:
+            self._delete_rows(self._rows(ids))
+            self._conn.commit()
+            self._data_version = None
+
+    def reset(self) -> None:
+        """Remove every chunk."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunk_ids")
+            self._conn.execute("DELETE FROM chunk_terms")
+            self._conn.commit()
+            self._data_version = None
+
+    def count(self) -> int:
+        """Count the indexed chunks, counted again only after writes."""
+        with self._lock:
+            # data_version changes with the commits of other connections; ours reset it
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self._data_version:
+                self._count = self._conn.execute("SELECT COUNT(*) FROM chunk_ids").fetchone()[0]
+                self._data_version = data_version
+            return self._count
+
+    @staticmethod
+    def _match(terms: list[str], match_all: bool = False) -> Optional[str]:
+        """Get the FTS5 query matching any (or all) of the terms."""
+        return f" {'AND' if match_all else 'OR'} ".join(f'"{term}"' for term in terms) or None
+
+    def search(self, query: str, k: int = 4, match_all: bool = False) -> list[tuple[str, float]]:
+        """Get the IDs and BM25 scores of the k best chunks matching any (or all) terms, best first."""
+        match = self._match(list(dict.fromkeys(tokenize(query))), match_all)
+        if match is None:
+            return []
+
+        with self._lock:
+            # bm25() is lower for better matches
+            return self._conn.execute(
+                """
+                SELECT chunk_ids.id, -bm25(chunk_terms) FROM chunk_terms
+                JOIN chunk_ids ON chunk_ids.row = chunk_terms.rowid
+                WHERE chunk_terms MATCH ? ORDER BY bm25(chunk_terms) LIMIT ?
+                """,
+                (match, k),
+            ).fetchall()
+
+    def is_keyword_query(self, query: str) -> bool:
+        """Check if a query is keyword-heavy: a few indexed terms, all of them rare."""
+        terms = set(tokenize(query))
+        if not terms or len(terms) > self.keyword_max_terms:
+            return False
+
+        with self._lock:
+            placeholders = ",".join("?" * len(terms))
+            frequencies = dict(self._conn.execute(
+                f"SELECT term, doc FROM chunk_vocabulary WHERE term IN ({placeholders})", list(terms)
+            ).fetchall())
+            if len(frequencies) < len(terms):
+                return False
+            rare = max(1.0, self.keyword_max_ratio * self.count())
+            return all(frequency <= rare for frequency in frequencies.values())
@@ -0,0 +1,154 @@
+"""
+Rolling chat history compaction for long conversations.
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+import contextlib
+from typing import Optional
+from collections import OrderedDict
+from langchain.schema import HumanMessage, SystemMessage, AIMessage
+from lib.tokens import truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+class ChatHistoryManager:
+    """
+    Keeps the last max_turns turns of a conversation verbatim and folds the older ones into
+    a summary capped at summary_max_tokens, so the history in the prompt stays bounded however
+    long the conversation gets. The summary is updated incrementally, fold_turns turns at a
+    time, so it costs one LLM call every fold_turns turns rather than every turn.
+    Summaries are keyed by a hash of the messages they cover, so one manager can serve any
+    number of conversations; the last max_summaries are kept.
+    """
+
+    def __init__(
+        self,
+        llm,
+        max_turns: int = 6,
+        fold_turns: int = 4,
+        summary_max_tokens: int = 500,
+        max_summaries: int = 1000,
+        encoding_name: str = "o200k_base",
+        request_semaphore: Optional[asyncio.Semaphore] = None,
+    ) -> None:
+        """
+        Configure the verbatim window, the folding batch and the summary cap.
+        The async summary calls hold request_semaphore, if given, like the other LLM requests.
+        """
+        self.llm = llm
+        self.max_turns = max_turns
+        self.fold_turns = fold_turns
+        self.summary_max_tokens = summary_max_tokens
+        self.max_summaries = max_summaries
+        self.encoding_name = encoding_name
+        self.request_semaphore = request_semaphore
+        self._summaries: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _to_messages(chat_history: list[dict]) -> list:
+        """Convert chat messages to LangChain messages."""
+        # Convert each message to appropriate LangChain message type
+        formatted_history = []
+        for msg in chat_history:
+            if msg["role"] == "user":
+                formatted_history.append(HumanMessage(content=msg["content"]))
+            elif msg["role"] == "assistant":
+                formatted_history.append(AIMessage(content=msg["content"]))
+        return formatted_history
+
+    @staticmethod
+    def _prefix_hashes(chat_history: list[dict]) -> list[str]:
+        """Hash every prefix of the conversation (the i-th hash covers the first i messages)."""
+        hashes = [""]
+        for msg in chat_history:
+            digest = hashlib.sha1(f"{hashes[-1]}\0{msg['role']}\0{msg['content']}".encode("utf-8"))
+            hashes.append(digest.hexdigest())
+        return hashes
+
+    def key(self, chat_history: list[dict]) -> Optional[str]:
+        """Hash a conversation, e.g. to scope cached answers to it (None when it is empty)."""
+        return self._prefix_hashes(chat_history)[-1] or None
+
+    def _plan(self, chat_history: list[dict]) -> tuple[str, int, list[dict], str]:
+        """
+        Find the latest summary of the conversation and the messages to fold into it now
+        (none until fold_turns turns have left the verbatim window).
+        Returns the summary, the number of messages it covers, the messages to fold and
+        the key of the summary that will cover them.
+        """
+        hashes = self._prefix_hashes(chat_history)
+        window_start = max(len(chat_history) - 2 * self.max_turns, 0)
+
+        summary, summarized = "", 0
+        with self._lock:
+            for i in range(window_start, 0, -1):
+                if hashes[i] in self._summaries:
+                    self._summaries.move_to_end(hashes[i])
+                    summary, summarized = self._summaries[hashes[i]], i
+                    break
+
+        pending = chat_history[summarized:window_start]
+        if len(pending) < 2 * self.fold_turns:
+            pending = []
+        return summary, summarized, pending, hashes[window_start]
+
+    def _summary_messages(self, summary: str, pending: list[dict]) -> list:
+        """Build the prompt asking to fold messages into the summary."""
+        words = int(self.summary_max_tokens * 0.75)
+        transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in pending)
+        system_prompt = (
+            "You maintain the summary of a conversation between a user and an assistant. "
+            "Update the summary with the new messages, keeping the facts, names, questions and answers "
+            f"that later messages may refer to. Return only the updated summary, in at most {words} words."
+        )
+        return [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=f"Summary so far:\n{summary or '(empty)'}\n\nNew messages:\n{transcript}"),
+        ]
+
+    def _fold(self, key: str, content: str, summarized: int) -> str:
+        """Store the updated summary, within the token cap."""
+        summary = truncate_tokens(content.strip(), self.summary_max_tokens, self.encoding_name)
+        with self._lock:
+            self._summaries[key] = summary
+            while len(self._summaries) > self.max_summaries:
+                self._summaries.popitem(last=False)
+        logger.info(f"Folded the chat history into a summary ({summarized} messages summarized)")
+        return summary
+
+    def _format(self, chat_history: list[dict], summary: str, summarized: int) -> list:
+        """Build the history messages: the summary, then the messages after it."""
+        messages = []
+        if summary:
+            messages.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+        messages.extend(self._to_messages(chat_history[summarized:]))
+        return messages
+
+    def format(self, chat_history: list[dict]) -> list:
+        """Get the history messages for the prompt, folding older messages into the summary."""
+        summary, summarized, pending, key = self._plan(chat_history)
+        if pending:
+            try:
+                response = self.llm.invoke(self._summary_messages(summary, pending))
+                summarized += len(pending)
+                summary = self._fold(key, response.content, summarized)
+            except Exception as e:
+                # Keep the messages verbatim and try again on the next turn
+                logger.warning(f"Could not update the chat summary: {e}")
+        return self._format(chat_history, summary, summarized)
+
+    async def aformat(self, chat_history: list[dict]) -> list:
+        """Async counterpart of format."""
+        summary, summarized, pending, key = self._plan(chat_history)
+        if pending:
+            try:
+                async with self.request_semaphore or contextlib.nullcontext():
+                    response = await self.llm.ainvoke(self._summary_messages(summary, pending))
+                summarized += len(pending)
+                summary = self._fold(key, response.content, summarized)
+            except Exception as e:
+                logger.warning(f"Could not update the chat summary: {e}")
+        return self._format(chat_history, summary, summarized)
@@ -0,0 +1,175 @@
+"""
+Chroma vector store backend for the RAG database.
+"""
+import logging
+from typing import Any, Dict, Optional
+from chromadb.api import ClientAPI
+from langchain_chroma import Chroma
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+class ChromaBackend:
+    """
+    Stores the chunks in a persistent Chroma collection (the default backend).
+    Backends share this interface: upsert, delete, update_metadatas, get_metadatas,
+    get_documents, query, count and reset. Filters (where) are equality constraints on
+    metadata keys, e.g. {"seed_source": path}; queries can also be restricted to some chunk IDs.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        collection_name: str,
+        embeddings: Embeddings,
+        client: Optional[ClientAPI] = None
+    ) -> None:
+        """
+        Connect to ChromaDB using LangChain wrapper.
+        A client of db_path can be passed in to share it; one is created otherwise.
+        """
+        # Docs: https://python.langchain.com/docs/integrations/vectorstores/chroma/#setup
+        # API Ref: https://python.langchain.com/api_reference/chroma/vectorstores/langchain_chroma.vectorstores.Chroma.html#langchain_chroma.vectorstores.Chroma
+        self.vector_store = Chroma(
+            collection_name=collection_name,
+            embedding_function=embeddings,
+            persist_directory=None if client else db_path,
+            client=client,
+        )
+
+    @staticmethod
+    def _where(where: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Convert equality constraints to a Chroma filter."""
+        if not where:
+            return None
+        if len(where) == 1:
+            return dict(where)
+        return {"$and": [{key: value} for key, value in where.items()]}
+
+    def _get(
+        self,
+        include: list[str],
+        ids: Optional[list[str]] = None,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, list]:
+        """
+        Get records of the collection in pages of the largest batch size, as Chroma fails on
+        reads of too many records at once.
+        """
+        collection = self.vector_store._collection
+        page = self.vector_store._client.get_max_batch_size()
+        records = {"ids": [], **{key: [] for key in include}}
+
+        def extend(batch) -> int:
+            for key in records:
+                records[key].extend(batch[key])
+            return len(batch["ids"])
+
+        if ids is not None:
+            for start in range(0, len(ids), page):
+                extend(collection.get(ids=ids[start:start + page], where=self._where(where), include=include))
+            return records
+
+        offset = 0
+        while extend(collection.get(where=self._where(where), include=include, limit=page, offset=offset)) == page:
+            offset += page
+        return records
+
+    def upsert(self, ids: list[str], vectors: list[list[float]], documents: list[Document]) -> None:
+        """Add or overwrite chunks with their embeddings."""
+        collection = self.vector_store._collection
+        batch_size = self.vector_store._client.get_max_batch_size()
+        for start in range(0, len(documents), batch_size):
+            end = start + batch_size
+            collection.upsert(
+                ids=ids[start:end],
+                embeddings=vectors[start:end],
+                documents=[doc.page_content for doc in documents[start:end]],
+                metadatas=[doc.metadata or None for doc in documents[start:end]],
+            )
+
+    def delete(self, ids: list[str]) -> None:
+        """Delete chunks by ID."""
+        self.vector_store.delete(ids=ids)
+
+    def update_metadatas(self, metadatas: Dict[str, dict]) -> None:
+        """Overwrite the metadata of stored chunks, by ID, keeping their text and embedding."""
+        ids = list(metadatas)
+        batch_size = self.vector_store._client.get_max_batch_size()
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            self.vector_store._collection.update(ids=batch, metadatas=[metadatas[chunk_id] for chunk_id in batch])
+
+    def get_metadatas(
+        self,
+        where: Optional[Dict[str, Any]] = None,
+        ids: Optional[list[str]] = None
+    ) -> Dict[str, dict]:
+        """Get the metadata of every chunk matching the filter (and among ids, if given), by ID."""
+        records = self._get(["metadatas"], ids=ids, where=where)
+        return {
+            chunk_id: metadata or {}
+            for chunk_id, metadata in zip(records["ids"], records["metadatas"])
+        }
+
+    def get_documents(self, ids: Optional[list[str]] = None) -> Dict[str, Document]:
+        """Get the chunks with the given IDs (or every chunk), by ID."""
+        records = self._get(["documents", "metadatas"], ids=ids)
+        return {
+            chunk_id: Document(page_content=content, metadata=metadata or {}, id=chunk_id)
+            for chunk_id, content, metadata in zip(records["ids"], records["documents"], records["metadatas"])
+        }
+
+    def query(
+        self,
+        vectors: list[list[float]],
+        k: int,
+        where: Optional[Dict[str, Any]] = None,
+        ids: Optional[list[str]] = None
+    ) -> list[list[tuple[Document, float]]]:
+        """
+        Search the k nearest chunks of each query vector (matching the filter and among ids, if
+        given) in one collection query.
+        """
+        collection = self.vector_store._collection
+        if ids is not None:
+            # Chroma fails on IDs the collection doesn't hold
+            ids = collection.get(ids=ids, include=[])["ids"]
+            if not ids:
+                return [[] for _ in vectors]
+
+        results = collection.query(
+            query_embeddings=vectors,
+            ids=ids,
+            n_results=k,
+            where=self._where(where),
+            include=["documents", "metadatas", "distances"],
+        )
+
+        return [
+            [
+                (Document(page_content=content, metadata=metadata or {}, id=chunk_id), distance)
+                for content, metadata, chunk_id, distance in zip(
+                    results["documents"][i],
+                    results["metadatas"][i],
+                    results["ids"][i],
+                    results["distances"][i],
+                )
+            ]
+            for i in range(len(vectors))
+        ]
+
+    @property
+    def dimensions(self) -> Optional[int]:
+        """Get the embedding dimensions, or None before the first write."""
+        records = self.vector_store._collection.get(limit=1, include=["embeddings"])
+        return len(records["embeddings"][0]) if len(records["ids"]) else None
+
+    def count(self) -> int:
+        """Count the stored chunks."""
+        return self.vector_store._collection.count()
+
+    def reset(self) -> None:
+        """Delete every chunk."""
+        self.vector_store.reset_collection()
@@ -0,0 +1,116 @@
+"""
+Collection statistics kept up to date on every write.
+"""
+import os
+import json
+import time
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+class CollectionStats:
+    """
+    Counters of the stored chunks (total, per document type and per seed source), the
+    embedding dimensions and the last seed time, in a small JSON file.
+    Writes adjust the counters by the chunks they add and remove, so reading them costs the
+    same whatever the size of the collection, also from another process (e.g. app.py --size).
+    Updates read, change and replace the file under an exclusive lock on a sidecar .lock file,
+    so concurrent writers (threads or processes, e.g. app.py --seed next to the app) don't lose
+    each other's counts; readers see either the old or the new file.
+    """
+
+    def __init__(self, stats_path: str) -> None:
+        """Configure the stats file."""
+        self.stats_path = stats_path
+        self.lock_path = f"{stats_path}.lock"
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Hold the stats lock, across threads and processes."""
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _empty() -> Dict[str, Any]:
+        """Get the stats of an empty collection."""
+        return {"count": 0, "document_types": {}, "sources": {}, "dimensions": None, "last_seed_at": None}
+
+    def _read(self) -> Optional[Dict[str, Any]]:
+        """Read the stats file, or None if it is missing or unreadable."""
+        if not os.path.exists(self.stats_path):
+            return None
+        try:
+            with open(self.stats_path) as f:
+                return {**self._empty(), **json.load(f)}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable collection stats {self.stats_path}: {e}")
+            return None
+
+    def _write(self, stats: Dict[str, Any]) -> None:
+        """Replace the stats file."""
+        tmp_path = f"{self.stats_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(stats, f)
+        os.replace(tmp_path, self.stats_path)
+
+    def exists(self) -> bool:
+        """Check if the stats file exists (it is built from the collection otherwise)."""
+        return self._read() is not None
+
+    def get(self) -> Dict[str, Any]:
+        """Get the stats."""
+        return self._read() or self._empty()
+
+    @staticmethod
+    def _count(stats: Dict[str, Any], metadatas: Iterable[dict], sign: int) -> None:
+        """Add (sign 1) or remove (sign -1) chunks from the counters."""
+        for metadata in metadatas:
+            stats["count"] += sign
+            for field, key in (("document_types", "document_type"), ("sources", "seed_source")):
+                value = metadata.get(key)
+                if value is None:
+                    continue
+                counts = stats[field]
+                counts[value] = counts.get(value, 0) + sign
+                if counts[value] <= 0:
+                    del counts[value]
+
+    def update(self, removed: Iterable[dict], added: Iterable[dict], dimensions: Optional[int] = None) -> None:
+        """Count a write: the metadata of the chunks it removed (or overwrote) and added."""
+        with self._locked():
+            stats = self.get()
+            self._count(stats, removed, -1)
+            self._count(stats, added, 1)
+            if dimensions:
+                stats["dimensions"] = dimensions
+            if not stats["count"]:
+                stats["dimensions"] = None
+            self._write(stats)
+
+    def rebuild(self, metadatas: Iterable[dict], dimensions: Optional[int]) -> None:
+        """Count every stored chunk again, keeping the last seed time."""
+        with self._locked():
+            stats = {**self._empty(), "dimensions": dimensions, "last_seed_at": self.get()["last_seed_at"]}
+            self._count(stats, metadatas, 1)
+            self._write(stats)
+
+    def record_seed(self) -> None:
+        """Record the end of a seed."""
+        with self._locked():
+            stats = self.get()
+            stats["last_seed_at"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+            self._write(stats)
+
+    def reset(self) -> None:
+        """Count an empty collection."""
+        with self._locked():
+            self._write(self._empty())
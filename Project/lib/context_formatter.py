@@ -0,0 +1,67 @@
+"""
+Compact, token-budgeted context for the RAG prompt.
+"""
+import os
+import logging
+from urllib.parse import urlparse
+from langchain.schema import Document
+from lib.tokens import count_tokens, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+class ContextFormatter:
+    """
+    Formats retrieved chunks for the prompt: each chunk's text under a short source tag,
+    without scores or metadata dicts. Chunks come best first and are added until max_tokens
+    is reached, so the lowest ranked are truncated or dropped first.
+    """
+
+    def __init__(self, max_tokens: int = 2000, min_chunk_tokens: int = 50, encoding_name: str = "o200k_base") -> None:
+        """
+        Configure the token budget.
+        A chunk that doesn't fit is truncated to the remaining budget, unless fewer than
+        min_chunk_tokens remain, in which case it is dropped.
+        """
+        self.max_tokens = max_tokens
+        self.min_chunk_tokens = min_chunk_tokens
+        self.encoding_name = encoding_name
+
+    @staticmethod
+    def source_tag(index: int, document: Document) -> str:
+        """Get a short tag telling where a chunk comes from, e.g. [2 website /about]."""
+        metadata = document.metadata or {}
+        document_type = metadata.get("document_type", "document")
+
+        if document_type == "website" and metadata.get("source"):
+            detail = urlparse(metadata["source"]).path or "/"
+        elif metadata.get("source_file"):
+            detail = os.path.basename(metadata["source_file"])
+        elif "page" in metadata:
+            detail = f"p.{int(metadata['page']) + 1}"
+        else:
+            detail = ""
+
+        return f"[{index} {document_type} {detail}]" if detail else f"[{index} {document_type}]"
+
+    def format(self, context: list[tuple[Document, float]]) -> tuple[str, int]:
+        """Format the context, returning the text and its token count."""
+        blocks = []
+        used = 0
+        for index, (document, _) in enumerate(context, start=1):
+            tag = self.source_tag(index, document)
+            text = document.page_content.strip()
+            tag_tokens = count_tokens(tag, self.encoding_name) + 1
+            text_tokens = count_tokens(text, self.encoding_name)
+
+            remaining = self.max_tokens - used - tag_tokens
+            if text_tokens > remaining:
+                if remaining < self.min_chunk_tokens:
+                    logger.debug(f"Context budget reached, dropping {len(context) - index + 1} chunks")
+                    break
+                text = truncate_tokens(text, remaining, self.encoding_name)
+                text_tokens = count_tokens(text, self.encoding_name)
+
+            blocks.append(f"{tag}\n{text}")
+            used += tag_tokens + text_tokens
+
+        return "\n\n".join(blocks), used
@@ -0,0 +1,180 @@
+"""
+Exact and near-duplicate chunk detection for seeding.
+"""
+import re
+import base64
+import hashlib
+import logging
+from collections import defaultdict
+from typing import Optional
+import numpy as np
+from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+class ChunkDeduplicator:
+    """
+    Drops chunks that repeat an already kept chunk, exactly (normalized text hash) or
+    nearly (MinHash over word shingles with LSH banding, above a Jaccard threshold).
+    Stored chunks can be added too, so a reseed keeps dropping the duplicates of chunks that
+    are not sent again (e.g. unchanged website pages). A chunk is never a duplicate of a
+    stored chunk of its own seed source, nor of the stored chunks of a released seed source
+    (one that was sent again, so its kept chunks are in the index already).
+    Kept chunks are tagged with their fingerprint (text hash and signature) in the
+    fingerprint_key metadata field, so stored chunks can be added back without their text.
+    """
+
+    fingerprint_key = "minhash"
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 3,
+        seed: int = 1,
+    ) -> None:
+        """Configure the similarity threshold and the MinHash signature."""
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        # Fingerprints made with other parameters don't compare, so they are tagged with them
+        self._fingerprint_prefix = f"{num_perm}-{shingle_size}-{seed}"
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+        self._exact = defaultdict(set)  # Owners of each text hash: a seed source if stored, else None
+        self._signatures = []
+        self._owners = []
+        self._buckets = defaultdict(list)
+        self._released = set()
+
+    def _shingles(self, words: list[str]) -> set[str]:
+        """Get the word shingles of a text."""
+        if len(words) <= self.shingle_size:
+            return {" ".join(words)}
+        return {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+    def _signature(self, shingles: set[str]) -> np.ndarray:
+        """Compute the MinHash signature of a set of shingles."""
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles],
+            dtype=np.uint64,
+        )
+        # a, b and the hashes are below 2**32, so a * h + b can't overflow 64 bits
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME
+        # Signatures are only compared for equality, for which the low 32 bits are enough
+        return permuted.min(axis=0).astype(np.uint32)
+
+    @staticmethod
+    def _key(text: str) -> tuple[list[str], str]:
+        """Get the normalized words of a chunk and their hash."""
+        words = re.findall(r"\w+", text.lower())
+        return words, hashlib.sha1(" ".join(words).encode("utf-8")).hexdigest()
+
+    def _fingerprint(self, text: str) -> tuple[str, np.ndarray]:
+        """Get the normalized text hash and the MinHash signature of a chunk."""
+        words, key = self._key(text)
+        return key, self._signature(self._shingles(words))
+
+    def _band_keys(self, signature: np.ndarray) -> list[tuple[int, bytes]]:
+        """Get the LSH band keys of a signature."""
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def _encode(self, key: str, signature: np.ndarray) -> str:
+        """Encode a fingerprint for the chunk metadata."""
+        encoded = base64.b64encode(signature.astype("<u4").tobytes()).decode("ascii")
+        return f"{self._fingerprint_prefix}:{key}:{encoded}"
+
+    def _decode(self, fingerprint: str) -> Optional[tuple[str, np.ndarray]]:
+        """Decode a fingerprint, or None if it was made with other parameters."""
+        prefix, key, encoded = fingerprint.split(":")
+        if prefix != self._fingerprint_prefix:
+            return None
+        return key, np.frombuffer(base64.b64decode(encoded), dtype="<u4").astype(np.uint32)
+
+    def _remember(self, key: str, signature: np.ndarray, band_keys: list, owner: Optional[str]) -> None:
+        """Add a chunk to the index."""
+        self._exact[key].add(owner)
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        self._owners.append(owner)
+        for band_key in band_keys:
+            self._buckets[band_key].append(index)
+
+    def _counts(self, owner: Optional[str], seed_source: Optional[str]) -> bool:
+        """Check if a chunk of owner can make a chunk of seed_source a duplicate."""
+        return owner is None or (owner != seed_source and owner not in self._released)
+
+    def add_stored(self, seed_source: str, text: str) -> str:
+        """
+        Add a stored chunk of a seed source, which stays unless the source is released.
+        Returns its fingerprint, to store in its metadata.
+        """
+        key, signature = self._fingerprint(text)
+        self._remember(key, signature, self._band_keys(signature), owner=seed_source)
+        return self._encode(key, signature)
+
+    def add_stored_fingerprint(self, seed_source: str, fingerprint: Optional[str]) -> bool:
+        """
+        Add a stored chunk of a seed source by the fingerprint in its metadata. Returns False
+        if it has no usable fingerprint, so it has to be added by its text instead.
+        """
+        decoded = self._decode(fingerprint) if fingerprint else None
+        if decoded is None:
+            return False
+        key, signature = decoded
+        self._remember(key, signature, self._band_keys(signature), owner=seed_source)
+        return True
+
+    def release(self, seed_source: str) -> None:
+        """Stop matching the stored chunks of a seed source, once it was sent again."""
+        self._released.add(seed_source)
+
+    def is_duplicate(self, text: str, seed_source: Optional[str] = None) -> bool:
+        """Check a chunk (of a seed source) against the kept ones, remembering it if it is new."""
+        return self._is_duplicate(*self._fingerprint(text), seed_source)
+
+    def _is_duplicate(self, key: str, signature: np.ndarray, seed_source: Optional[str]) -> bool:
+        """Check a fingerprint (of a seed source) against the kept ones, remembering it if it is new."""
+        if any(self._counts(owner, seed_source) for owner in self._exact.get(key, ())):
+            return True
+
+        band_keys = self._band_keys(signature)
+        candidates = {index for band_key in band_keys for index in self._buckets.get(band_key, ())}
+        for index in candidates:
+            if not self._counts(self._owners[index], seed_source):
+                continue
+            if np.mean(self._signatures[index] == signature) >= self.threshold:
+                return True
+
+        self._remember(key, signature, band_keys, owner=None)
+        return False
+
+    def filter(self, ids: list[str], documents: list[Document]) -> tuple[list[str], list[Document], list[Document]]:
+        """
+        Split chunks into the kept (ids and documents, tagged with their fingerprint) and the
+        dropped duplicates.
+        """
+        kept_ids, kept_docs, dropped = [], [], []
+        for chunk_id, doc in zip(ids, documents):
+            key, signature = self._fingerprint(doc.page_content)
+            if self._is_duplicate(key, signature, doc.metadata.get("seed_source")):
+                dropped.append(doc)
+            else:
+                doc.metadata[self.fingerprint_key] = self._encode(key, signature)
+                kept_ids.append(chunk_id)
+                kept_docs.append(doc)
+        return kept_ids, kept_docs, dropped
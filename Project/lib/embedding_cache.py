@@ -0,0 +1,190 @@
+"""
+Persistent embedding cache for the RAG database.
+"""
+import os
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+from array import array
+from typing import Any, Dict, Optional
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper backed by an on-disk SQLite cache.
+    Entries are keyed by (model, dimensions, text hash) and evicted least recently used first.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache_path: str,
+        model: str,
+        dimensions: Optional[int] = None,
+        max_entries: int = 100_000,
+    ) -> None:
+        """Open (or create) the cache next to the vector store."""
+        self.embeddings = embeddings
+        self.cache_path = cache_path
+        self.model = model
+        self.dimensions = dimensions or 0
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(cache_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used INTEGER NOT NULL,
+                PRIMARY KEY (model, dimensions, text_hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._clock = self._conn.execute("SELECT COALESCE(MAX(last_used), 0) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        """Hash a text for the cache key."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _tick(self) -> int:
+        """Advance the LRU clock."""
+        self._clock += 1
+        return self._clock
+
+    def get_cached(self, texts: list[str]) -> list[Optional[list[float]]]:
+        """Look up texts in the cache, returning None for every miss. Hits are counted here."""
+        hashes = [self._hash(text) for text in texts]
+        found = {}
+        with self._lock:
+            unique_hashes = list(dict.fromkeys(hashes))
+            # Stay under SQLite's bound variable limit
+            for start in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND dimensions = ? AND text_hash IN ({placeholders})",
+                    [self.model, self.dimensions, *batch],
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                tick = self._tick()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND dimensions = ? AND text_hash = ?",
+                    [(tick, self.model, self.dimensions, text_hash) for text_hash in found],
+                )
+                self._conn.commit()
+
+        vectors = []
+        for text_hash in hashes:
+            blob = found.get(text_hash)
+            vectors.append(array("f", blob).tolist() if blob is not None else None)
+        self.hits += sum(vector is not None for vector in vectors)
+        return vectors
+
+    def _store(self, texts: list[str], vectors: list[list[float]]) -> None:
+        """Store freshly computed embeddings and evict the least recently used ones."""
+        with self._lock:
+            tick = self._tick()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, dimensions, text_hash, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (self.model, self.dimensions, self._hash(text), array("f", vector).tobytes(), tick)
+                    for text, vector in zip(texts, vectors)
+                ],
+            )
+
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+                logger.info(f"Evicted {count - self.max_entries} embeddings from cache")
+            self._conn.commit()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed documents, only calling the model for texts that are not cached."""
+        vectors = self.get_cached(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        missing_texts = list(dict.fromkeys(texts[i] for i in missing))
+        self.misses += len(missing)
+
+        if missing_texts:
+            computed = dict(zip(missing_texts, self.embeddings.embed_documents(missing_texts)))
+            self._store(missing_texts, list(computed.values()))
+            for i in missing:
+                vectors[i] = computed[texts[i]]
+
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embed a query, using the cache when possible."""
+        vector = self.get_cached([text])[0]
+        if vector is not None:
+            return vector
+
+        self.misses += 1
+        vector = self.embeddings.embed_query(text)
+        self._store([text], [vector])
+        return vector
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed documents asynchronously, only calling the model for texts that are not cached."""
+        vectors = await asyncio.to_thread(self.get_cached, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        missing_texts = list(dict.fromkeys(texts[i] for i in missing))
+        self.misses += len(missing)
+
+        if missing_texts:
+            computed = dict(zip(missing_texts, await self.embeddings.aembed_documents(missing_texts)))
+            await asyncio.to_thread(self._store, missing_texts, list(computed.values()))
+            for i in missing:
+                vectors[i] = computed[texts[i]]
+
+        return vectors
+
+    async def aembed_query(self, text: str) -> list[float]:
+        """Embed a query asynchronously, using the cache when possible."""
+        vector = (await asyncio.to_thread(self.get_cached, [text]))[0]
+        if vector is not None:
+            return vector
+
+        self.misses += 1
+        vector = await self.embeddings.aembed_query(text)
+        await asyncio.to_thread(self._store, [text], [vector])
+        return vector
+
+    def stats(self, count: bool = True) -> Dict[str, Any]:
+        """Get the cache hit/miss counters and, if count, its size (which reads the whole index)."""
+        total = self.hits + self.misses
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "max_entries": self.max_entries,
+        }
+        if count:
+            with self._lock:
+                stats["size"] = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return stats
@@ -0,0 +1,151 @@
+"""
+Batched, concurrent and rate limited embedding for bulk writes.
+"""
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional
+from tqdm import tqdm
+from langchain_core.embeddings import Embeddings
+from lib.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+class TokenRateLimiter:
+    """Client-side tokens-per-minute limiter (token bucket)."""
+
+    def __init__(self, tokens_per_minute: int) -> None:
+        """Start with a full bucket."""
+        self.capacity = tokens_per_minute
+        self.available = float(tokens_per_minute)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> None:
+        """Block until the tokens can be spent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.available = min(
+                    self.capacity,
+                    self.available + (now - self.updated_at) * self.capacity / 60,
+                )
+                self.updated_at = now
+
+                # A batch larger than the whole bucket waits for a full bucket and overdraws it
+                needed = min(tokens, self.capacity)
+                if self.available >= needed:
+                    self.available -= tokens
+                    return
+                wait = (needed - self.available) * 60 / self.capacity
+            time.sleep(wait)
+
+class BatchEmbeddingWriter:
+    """
+    Embeds texts in token-sized batches with a bounded number of concurrent requests.
+    Rate limit and server errors are retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_batch_tokens: int = 50_000,
+        max_batch_size: int = 1000,
+        max_workers: int = 4,
+        tokens_per_minute: int = 1_000_000,
+        max_retries: int = 6,
+        encoding_name: str = "cl100k_base",
+    ) -> None:
+        """Configure the batching, concurrency and rate limits."""
+        self.embeddings = embeddings
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.rate_limiter = TokenRateLimiter(tokens_per_minute)
+        self.encoding_name = encoding_name
+
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens of a text."""
+        return count_tokens(text, self.encoding_name)
+
+    def _make_batches(self, texts: list[str], indexes: list[int]) -> list[tuple[list[int], int]]:
+        """Group text indexes into batches that fit the token and size limits."""
+        batches = []
+        batch, batch_tokens = [], 0
+        for index in indexes:
+            tokens = self.count_tokens(texts[index])
+            if batch and (batch_tokens + tokens > self.max_batch_tokens or len(batch) >= self.max_batch_size):
+                batches.append((batch, batch_tokens))
+                batch, batch_tokens = [], 0
+            batch.append(index)
+            batch_tokens += tokens
+
+        if batch:
+            batches.append((batch, batch_tokens))
+        return batches
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """Check if an error is a rate limit, server or connection error."""
+        # Imported on the first error: the OpenAI SDK takes a second to import
+        import openai
+        if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+            return True
+        status_code = getattr(error, "status_code", None)
+        return status_code is not None and (status_code == 429 or status_code >= 500)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """Get the backoff delay, honouring the server's retry-after header."""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return min(60.0, 2 ** attempt) + random.uniform(0, 1)
+
+    def _embed_batch(self, batch_texts: list[str], tokens: int) -> list[list[float]]:
+        """Embed one batch within the rate limit, retrying transient errors."""
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(tokens)
+            try:
+                return self.embeddings.embed_documents(batch_texts)
+            except Exception as e:
+                if attempt == self.max_retries or not self._is_retryable(e):
+                    raise
+                delay = self._retry_delay(e, attempt)
+                logger.warning(f"Embedding batch failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def embed(self, texts: list[str], description: str = "Embedding") -> list[list[float]]:
+        """Embed all texts, keeping their order."""
+        vectors: list[Optional[list[float]]] = [None] * len(texts)
+
+        # Cached embeddings don't cost any tokens, so keep them out of the batches
+        get_cached = getattr(self.embeddings, "get_cached", None)
+        if get_cached and texts:
+            vectors = get_cached(texts)
+        pending = [i for i, vector in enumerate(vectors) if vector is None]
+
+        batches = self._make_batches(texts, pending)
+        if batches:
+            total_tokens = sum(tokens for _, tokens in batches)
+            logger.info(f"Embedding {len(pending)} texts ({total_tokens} tokens) in {len(batches)} batches")
+
+        with tqdm(total=len(pending), desc=description, unit="chunk", disable=not pending) as progress:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {
+                    executor.submit(self._embed_batch, [texts[i] for i in batch], tokens): batch
+                    for batch, tokens in batches
+                }
+                for future in as_completed(futures):
+                    batch = futures[future]
+                    for i, vector in zip(batch, future.result()):
+                        vectors[i] = vector
+                    progress.update(len(batch))
+
+        return vectors
@@ -0,0 +1,286 @@
+"""
+FAISS approximate nearest neighbour index for the RAG database.
+"""
+import os
+import math
+import atexit
+import logging
+from typing import Optional
+import numpy as np
+import faiss
+from langchain.schema import Document
+from lib.numpy_backend import NumpyBackend
+
+logger = logging.getLogger(__name__)
+
+class FaissBackend(NumpyBackend):
+    """
+    NumPy backend whose searches go through a FAISS index (index_type "flat", "ivf" or "hnsw").
+    The memory-mapped vectors and the SQLite records stay the source of truth: the index only
+    proposes candidates (candidate_factor times k), which are rescored exactly on the stored
+    vectors, so distances match the other backends and deleted or overwritten entries still in
+    the index are dropped. Collections (or filtered searches) of at most exact_rows chunks are
+    searched exactly.
+    The index is saved to a .faiss file next to the vectors and loaded at startup; it is rebuilt
+    from the stored vectors when it is missing, out of date or built with other parameters.
+    After another process writes, searches are exact until that process saves its index.
+    With quantization, the index holds the codes instead of float32 vectors: int8 uses FAISS
+    8-bit scalar quantizer indexes and binary its Hamming-distance binary indexes, so the index
+    takes about 4x (int8) or 32x (binary) less memory than the vectors, plus the HNSW links.
+    HNSW can't remove entries, so it is rebuilt once they exceed rebuild_ratio of the collection;
+    IVF is retrained when the collection has grown retrain_growth times since training.
+    """
+    exact_rows = 2048
+    candidate_factor = 4
+    rebuild_ratio = 0.25
+    retrain_growth = 4
+    save_ratio = 0.1
+    watched_state = ("generation", "faiss_generation")
+
+    def __init__(
+        self,
+        db_path: str,
+        collection_name: str,
+        index_type: str = "hnsw",
+        quantization: Optional[str] = None,
+        hnsw_m: int = 32,
+        ef_construction: int = 80,
+        ef_search: int = 64,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+    ) -> None:
+        """
+        Open (or create) the index files in db_path.
+        quantization ("int8" or "binary") applies to the index and to the exact searches.
+        nlist (IVF lists) defaults to 4 * sqrt(rows), within what the rows can train.
+        ef_search and nprobe are read on every search, so they can be tuned on a live index.
+        """
+        if index_type not in ("flat", "ivf", "hnsw"):
+            raise ValueError(f"Unknown FAISS index type: {index_type} (expected flat, ivf or hnsw)")
+
+        self.index_type = index_type
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.index_path = os.path.join(db_path, f"{collection_name}.faiss")
+        super().__init__(db_path, collection_name, quantization=quantization)
+        atexit.register(self.save)
+
+    @property
+    def _signature(self) -> str:
+        """Describe the index parameters, so an index built with others is not reused."""
+        if self.index_type == "hnsw":
+            signature = f"hnsw:{self.hnsw_m}:{self.ef_construction}"
+        elif self.index_type == "ivf":
+            signature = f"ivf:{self.nlist or 'auto'}"
+        else:
+            signature = "flat"
+        return f"{signature}:{self.quantizer.name}" if self.quantizer is not None else signature
+
+    @property
+    def _binary(self) -> bool:
+        """Whether the index is a binary index of the sign bit codes."""
+        return self.quantizer is not None and self.quantizer.name == "binary"
+
+    def _index_input(self, vectors: np.ndarray) -> np.ndarray:
+        """Get what the index takes for float32 rows: the rows, or their binary codes."""
+        if self._binary:
+            return self.quantizer.encode(vectors)
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def _load(self, build: bool = True) -> None:
+        """Map the vectors, then load the saved index if it is current, or rebuild it (if build)."""
+        super()._load()
+        self._index = None
+        self._stale = 0
+        self._trained_rows = 0
+        self._unsaved = 0
+
+        if (
+            os.path.exists(self.index_path)
+            and self._state("faiss_generation") == str(self._generation)
+            and self._state("faiss_signature") == self._signature
+        ):
+            read_index = faiss.read_index_binary if self._binary else faiss.read_index
+            self._index = read_index(self.index_path)
+            self._stale = int(self._state("faiss_stale") or 0)
+            self._trained_rows = int(self._state("faiss_trained_rows") or 0)
+            logger.debug(f"Loaded the {self.index_type} index of {self._index.ntotal} vectors from {self.index_path}")
+        elif build:
+            self._maintain()
+
+    def _refresh(self) -> None:
+        """
+        Reload after another instance wrote. Rebuilding the index on every write of an ongoing
+        ingestion would stall the searches, so it is left to the writer, which saves it.
+        """
+        if self._watch() != self._watched:
+            logger.debug(f"Reloading {self.vectors_path}, written by another instance")
+            self._load(build=False)
+
+    def _new_index(self, dimensions: int, rows: int):
+        """Create an empty index of the configured type."""
+        nlist = self.nlist or int(4 * math.sqrt(rows))
+        nlist = max(1, min(nlist, rows // 39))
+        if self._binary:
+            bits = 8 * self.quantizer.width(dimensions)
+            if self.index_type == "hnsw":
+                index = faiss.IndexBinaryHNSW(bits, self.hnsw_m)
+                index.hnsw.efConstruction = self.ef_construction
+                return faiss.IndexBinaryIDMap(index)
+            if self.index_type == "ivf":
+                return faiss.IndexBinaryIVF(faiss.IndexBinaryFlat(bits), bits, nlist)
+            return faiss.IndexBinaryIDMap(faiss.IndexBinaryFlat(bits))
+        if self.quantizer is not None:
+            int8 = faiss.ScalarQuantizer.QT_8bit
+            if self.index_type == "hnsw":
+                index = faiss.IndexHNSWSQ(dimensions, int8, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+                index.hnsw.efConstruction = self.ef_construction
+                return faiss.IndexIDMap(index)
+            if self.index_type == "ivf":
+                quantizer = faiss.IndexFlatIP(dimensions)
+                return faiss.IndexIVFScalarQuantizer(quantizer, dimensions, nlist, int8, faiss.METRIC_INNER_PRODUCT)
+            return faiss.IndexIDMap(faiss.IndexScalarQuantizer(dimensions, int8, faiss.METRIC_INNER_PRODUCT))
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dimensions, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = self.ef_construction
+            return faiss.IndexIDMap(index)
+        if self.index_type == "ivf":
+            quantizer = faiss.IndexFlatIP(dimensions)
+            return faiss.IndexIVFFlat(quantizer, dimensions, nlist, faiss.METRIC_INNER_PRODUCT)
+        return faiss.IndexIDMap(faiss.IndexFlatIP(dimensions))
+
+    def _build(self) -> None:
+        """Build the index from the stored vectors."""
+        rows = np.flatnonzero(self._alive[:self._size])
+        index = self._new_index(self.dimensions, len(rows))
+        # A separate mapping, so the pages read here leave memory with it
+        vectors = np.load(self.vectors_path, mmap_mode="r")
+        if not index.is_trained:
+            # IVF trains its lists, and the scalar quantizer its ranges, on (a sample of) the collection
+            sample = np.sort(np.random.default_rng(0).permutation(rows)[:100_000])
+            index.train(self._index_input(vectors[sample]))
+        for start in range(0, len(rows), self.block_rows):
+            batch = rows[start:start + self.block_rows]
+            index.add_with_ids(self._index_input(vectors[batch]), batch)
+        del vectors
+
+        self._index = index
+        self._stale = 0
+        self._trained_rows = len(rows)
+        self._unsaved = len(rows)
+        logger.info(f"Built the {self.index_type} index of {len(rows)} vectors")
+
+    def _maintain(self) -> None:
+        """Build or rebuild the index when needed, and save it once enough has changed."""
+        count = self._count()
+        if count <= self.exact_rows:
+            # Small collections are searched exactly
+            self._index = None
+            return
+
+        if (
+            self._index is None
+            or (self.index_type == "hnsw" and self._stale > self.rebuild_ratio * count)
+            or (self.index_type == "ivf" and count > self.retrain_growth * self._trained_rows)
+        ):
+            self._build()
+
+        if self._unsaved > self.save_ratio * count:
+            self.save()
+
+    def save(self) -> None:
+        """Save the index, if it has unsaved changes and the database directory still exists."""
+        with self._lock:
+            if self._index is None or not self._unsaved or not os.path.isdir(self.db_path):
+                return
+            tmp_path = f"{self.index_path}.tmp"
+            write_index = faiss.write_index_binary if self._binary else faiss.write_index
+            write_index(self._index, tmp_path)
+            os.replace(tmp_path, self.index_path)
+            self._set_state(
+                faiss_generation=self._generation,
+                faiss_signature=self._signature,
+                faiss_stale=self._stale,
+                faiss_trained_rows=self._trained_rows,
+            )
+            self._unsaved = 0
+            logger.debug(f"Saved the {self.index_type} index of {self._index.ntotal} vectors")
+
+    def _remove(self, rows: np.ndarray) -> None:
+        """Take rows out of the index, or count them as stale for HNSW."""
+        if self._index is None or not len(rows):
+            return
+        if self.index_type == "hnsw":
+            self._stale += len(rows)
+        else:
+            self._index.remove_ids(rows)
+
+    def upsert(self, ids: list[str], vectors: list[list[float]], documents: list[Document]) -> None:
+        """Add or overwrite chunks with their embeddings."""
+        if not ids:
+            return
+
+        with self._lock:
+            self._refresh()
+            existing = np.array(list(self._rows(ids).values()), dtype=np.int64)
+            super().upsert(ids, vectors, documents)
+            if self._index is not None:
+                self._remove(existing)
+                rows = np.array(sorted(set(self._rows(ids).values())), dtype=np.int64)
+                self._index.add_with_ids(self._index_input(self._vectors[rows]), rows)
+                self._unsaved += len(rows)
+            self._maintain()
+
+    def delete(self, ids: list[str]) -> None:
+        """Delete chunks by ID."""
+        with self._lock:
+            self._refresh()
+            rows = np.array(list(self._rows(ids).values()), dtype=np.int64)
+            super().delete(ids)
+            self._remove(rows)
+            self._unsaved += len(rows)
+            self._maintain()
+
+    def reset(self) -> None:
+        """Delete every chunk, the vectors file and the index file."""
+        with self._lock:
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            super().reset()
+
+    def _search_parameters(self, fetch: int, selector=None):
+        """Get the search parameters of the index type for fetch candidates."""
+        if self.index_type == "hnsw":
+            return faiss.SearchParametersHNSW(efSearch=max(self.ef_search, fetch), sel=selector)
+        if self.index_type == "ivf":
+            return faiss.SearchParametersIVF(nprobe=self.nprobe, sel=selector)
+        return faiss.SearchParameters(sel=selector)
+
+    def _top_k(self, queries: np.ndarray, vectors: np.ndarray, mask: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Get the rows and cosine similarities of the k best matches of each query, best first."""
+        selected = int(mask.sum())
+        with self._lock:
+            index = self._index
+            filtered = selected < self._count()
+        if index is None or selected <= self.exact_rows or (filtered and self._binary and self.index_type == "ivf"):
+            # Binary IVF indexes can't restrict a search to the selected rows
+            return super()._top_k(queries, vectors, mask, k)
+
+        factor = self.candidate_factor
+        read_rows = lambda rows: vectors[rows]
+        if self.quantizer is not None:
+            # Codes rank less precisely, and the rows read for rescoring shouldn't stay in memory
+            factor = max(factor, self.quantizer.rescore_factor)
+            read_rows = self._read_rows
+        with self._lock:
+            # Filtered searches only visit the selected rows
+            selector = faiss.IDSelectorBatch(np.flatnonzero(mask)) if filtered else None
+            fetch = min(factor * k, index.ntotal)
+            _, candidates = index.search(
+                self._index_input(queries), fetch, params=self._search_parameters(fetch, selector)
+            )
+
+        return self._rescore(queries, read_rows, candidates, mask, k)
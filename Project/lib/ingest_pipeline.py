@@ -0,0 +1,301 @@
+"""
+Streaming ingestion pipeline for seeding the RAG database.
+"""
+import time
+import queue
+import logging
+import resource
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional, Union
+from langchain.schema import Document
+from lib.dedup import ChunkDeduplicator
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+class IngestPipeline:
+    """
+    Streams chunks from the sources through load → split → filter → embed → write.
+    Loaders are generators and the stages are connected by bounded queues, so only a
+    few batches are in memory at a time, regardless of corpus size. With a deduplicator,
+    duplicate chunks are dropped before they are embedded.
+    A loader can also yield the name of a seed source instead of a chunk, when the source is
+    gone: its stored chunks are removed.
+    Loaders run concurrently, but their chunks are deduplicated and written in the order of
+    the loaders, which is their priority: of two duplicates, the chunk of the first loader is
+    kept, whichever loads first. Loaders are named after the document type of their chunks, so
+    the stored chunks of a loader's type (e.g. of unchanged website pages) are deduplicated
+    against too, and once a loader succeeds, the stored chunks of its type without a seed
+    source (from a seed before they were tracked) are removed, as its chunks replace them.
+    """
+
+    def __init__(
+        self,
+        db,
+        batch_size: int = 128,
+        queue_size: int = 4,
+        max_workers: int = 3,
+        deduplicator: Optional[ChunkDeduplicator] = None
+    ) -> None:
+        """Configure the batch size, queue bounds, number of concurrent sources and deduplication."""
+        self.db = db
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.max_workers = max_workers
+        self.deduplicator = deduplicator
+        self.stage_seconds: Dict[str, float] = {}
+
+    def _timed(self, stage: str, started: float) -> None:
+        """Add the time since started to a stage. Each stage is only timed by one thread."""
+        self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + time.perf_counter() - started
+
+    def _produce(self, name: str, load: Callable[[], Iterator[Union[Document, str]]], chunk_queue: queue.Queue) -> None:
+        """
+        Run a source generator, putting batches of chunks on the queue.
+        Chunks must carry a seed_source in their metadata and come grouped by it.
+        """
+        seed_source, batch, position = None, [], 0
+        stage = f"load:{name}"  # loading, splitting and filtering, which the generator interleaves
+        try:
+            started = time.perf_counter()
+            for doc in load():
+                self._timed(stage, started)
+                if isinstance(doc, str):
+                    # A removed seed source: end it without chunks
+                    if batch:
+                        chunk_queue.put(("chunks", name, seed_source, position, batch))
+                    if seed_source is not None:
+                        chunk_queue.put(("end", name, seed_source))
+                    chunk_queue.put(("end", name, doc))
+                    seed_source, batch, position = None, [], 0
+                    started = time.perf_counter()
+                    continue
+
+                if doc.metadata["seed_source"] != seed_source:
+                    if batch:
+                        chunk_queue.put(("chunks", name, seed_source, position, batch))
+                    if seed_source is not None:
+                        chunk_queue.put(("end", name, seed_source))
+                    seed_source, batch, position = doc.metadata["seed_source"], [], 0
+
+                batch.append(doc)
+                if len(batch) >= self.batch_size:
+                    chunk_queue.put(("chunks", name, seed_source, position, batch))
+                    position += len(batch)
+                    batch = []
+                started = time.perf_counter()
+
+            self._timed(stage, started)
+            if batch:
+                chunk_queue.put(("chunks", name, seed_source, position, batch))
+            if seed_source is not None:
+                chunk_queue.put(("end", name, seed_source))
+            chunk_queue.put(("done", name, None))
+        except Exception as e:
+            # The seed source that was being read is not ended, so none of its chunks get removed
+            chunk_queue.put(("done", name, e))
+
+    def _seed_deduplicator(self, document_type: str) -> None:
+        """
+        Add the stored chunks of a document type to the deduplicator, by the fingerprints in
+        their metadata. Chunks stored without one (e.g. before they were kept) are read once, and
+        their fingerprint is added to their metadata.
+        """
+        started = time.perf_counter()
+        stored, unfingerprinted = 0, []
+        for chunk_id, metadata in self.db.get_stored_metadatas(document_type).items():
+            seed_source = metadata.get("seed_source")
+            # Chunks without a seed source are removed once the loader succeeds, so they don't count
+            if not seed_source:
+                continue
+            stored += 1
+            if not self.deduplicator.add_stored_fingerprint(seed_source, metadata.get(self.deduplicator.fingerprint_key)):
+                unfingerprinted.append(chunk_id)
+
+        for start in range(0, len(unfingerprinted), self.batch_size):
+            documents = self.db.get_stored_documents(unfingerprinted[start:start + self.batch_size])
+            self.db.update_metadatas({
+                chunk_id: {
+                    **doc.metadata,
+                    self.deduplicator.fingerprint_key: self.deduplicator.add_stored(doc.metadata["seed_source"], doc.page_content),
+                }
+                for chunk_id, doc in documents.items()
+            })
+        self._timed("dedup", started)
+        if stored:
+            logger.debug(
+                f"Deduplicating {document_type} against {stored} stored chunks "
+                f"({len(unfingerprinted)} read without a fingerprint)"
+            )
+
+    def _embed(self, chunk_queues: Dict[str, queue.Queue], write_queue: queue.Queue, failed: set) -> None:
+        """
+        Diff incoming chunks against the stored hashes and embed the new or changed ones, one
+        loader after the other.
+        """
+        existing_hashes: Dict[str, Dict[str, str]] = {}
+        seen_ids: Dict[str, set] = {}
+
+        for name, chunk_queue in chunk_queues.items():
+            if self.deduplicator:
+                try:
+                    self._seed_deduplicator(name)
+                except Exception as e:
+                    failed.add(name)
+                    write_queue.put(("failed", name, e))
+
+            while True:
+                kind, name, *payload = chunk_queue.get()
+                if kind == "done":
+                    if payload[0] is None and name not in failed:
+                        try:
+                            unsourced_ids = self.db.get_unsourced_ids(name)
+                            if unsourced_ids:
+                                logger.info(f"Removing {len(unsourced_ids)} {name} chunks seeded without a seed source")
+                                write_queue.put(("delete", name, unsourced_ids))
+                        except Exception as e:
+                            failed.add(name)
+                            write_queue.put(("failed", name, e))
+                    write_queue.put(("done", name, payload[0]))
+                    break
+                if name in failed:
+                    continue
+
+                try:
+                    if kind == "chunks":
+                        seed_source, start, docs = payload
+                        if seed_source not in existing_hashes:
+                            started = time.perf_counter()
+                            existing_hashes[seed_source] = self.db.get_content_hashes(seed_source)
+                            seen_ids[seed_source] = set()
+                            self._timed("diff", started)
+
+                        started = time.perf_counter()
+                        ids = self.db.prepare_documents(seed_source, docs, start)
+                        self._timed("prepare", started)
+
+                        started = time.perf_counter()
+                        dropped = []
+                        if self.deduplicator:
+                            # Dropped chunks are not seen, so a stored copy of them gets removed
+                            ids, docs, dropped = self.deduplicator.filter(ids, docs)
+                        seen_ids[seed_source].update(ids)
+                        self._timed("dedup", started)
+
+                        started = time.perf_counter()
+                        write_ids, write_docs, counts = self.db.diff_documents(ids, docs, existing_hashes[seed_source])
+                        counts["duplicates"] = len(dropped)
+                        counts["duplicate_tokens"] = sum(self.db.writer.count_tokens(doc.page_content) for doc in dropped)
+                        self._timed("diff", started)
+
+                        started = time.perf_counter()
+                        vectors = self.db.writer.embed([doc.page_content for doc in write_docs], description=name)
+                        self._timed("embed", started)
+                        write_queue.put(("write", name, write_ids, write_docs, vectors, counts))
+
+                    elif kind == "end":
+                        seed_source = payload[0]
+                        if seed_source not in existing_hashes:
+                            # A removed seed source, none of whose chunks came
+                            started = time.perf_counter()
+                            existing_hashes[seed_source] = self.db.get_content_hashes(seed_source)
+                            self._timed("diff", started)
+                        seen = seen_ids.pop(seed_source, set())
+                        removed_ids = [
+                            chunk_id for chunk_id in existing_hashes.pop(seed_source, {})
+                            if chunk_id not in seen
+                        ]
+                        if self.deduplicator:
+                            # Its kept chunks are in the index, the other stored ones are removed
+                            self.deduplicator.release(seed_source)
+                        write_queue.put(("delete", name, removed_ids))
+                except Exception as e:
+                    failed.add(name)
+                    write_queue.put(("failed", name, e))
+
+        write_queue.put(_DONE)
+
+    def run(self, loaders: Dict[str, Callable[[], Iterator[Document]]]) -> Dict[str, Any]:
+        """Ingest every source, returning the seed summary."""
+        start = time.perf_counter()
+        self.stage_seconds = {}
+        chunk_queues = {name: queue.Queue(maxsize=self.queue_size) for name in loaders}
+        write_queue = queue.Queue(maxsize=self.queue_size)
+        failed = set()
+
+        counters = ("added", "updated", "removed", "skipped", "duplicates", "duplicate_tokens")
+        summary = {key: 0 for key in counters}
+        sources = {name: {"status": "ok", **{key: 0 for key in counters}} for name in loaders}
+
+        embedder = threading.Thread(
+            target=self._embed,
+            args=(chunk_queues, write_queue, failed),
+            daemon=True,
+        )
+        embedder.start()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for name, load in loaders.items():
+                executor.submit(self._produce, name, load, chunk_queues[name])
+
+            # Write on the calling thread while the other stages keep streaming
+            while (message := write_queue.get()) is not _DONE:
+                kind, name, *payload = message
+                source = sources[name]
+                if kind == "done":
+                    error = payload[0]
+                    if error is not None and name not in failed:
+                        failed.add(name)
+                        source.update(status="failed", error=str(error))
+                    source["seconds"] = round(time.perf_counter() - start, 2)
+                    continue
+                if kind == "failed":
+                    source.update(status="failed", error=str(payload[0]))
+                    continue
+                if name in failed:
+                    continue
+
+                started = time.perf_counter()
+                try:
+                    if kind == "write":
+                        write_ids, write_docs, vectors, counts = payload
+                        self.db.add_documents(write_docs, ids=write_ids, vectors=vectors)
+                        for key, count in counts.items():
+                            source[key] += count
+                    elif kind == "delete":
+                        self.db.delete_documents(payload[0])
+                        source["removed"] += len(payload[0])
+                except Exception as e:
+                    failed.add(name)
+                    source.update(status="failed", error=str(e))
+                self._timed("write", started)
+
+        embedder.join()
+
+        for name, source in sources.items():
+            if source["status"] == "failed":
+                logger.error(f"Error loading documents from {name}: {source['error']}")
+            if source["duplicates"]:
+                logger.info(
+                    f"Dropped {source['duplicates']} duplicate chunks from {name}, "
+                    f"saving {source['duplicate_tokens']} tokens"
+                )
+            # Chunks written before a source failed are still in the store, so count them
+            for key in counters:
+                summary[key] += source[key]
+        summary["sources"] = sources
+
+        elapsed = time.perf_counter() - start
+        chunks = sum(
+            source["added"] + source["updated"] + source["skipped"] + source["duplicates"]
+            for source in sources.values()
+        )
+        summary["seconds"] = round(elapsed, 2)
+        # Stages overlap, so their times add up to more than the elapsed time
+        summary["stage_seconds"] = {stage: round(seconds, 3) for stage, seconds in self.stage_seconds.items()}
+        summary["chunks_per_second"] = round(chunks / elapsed, 1) if elapsed else 0.0
+        # ru_maxrss is reported in kilobytes on Linux
+        summary["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        return summary
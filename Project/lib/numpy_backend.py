@@ -0,0 +1,538 @@
+"""
+In-process NumPy vector index for the RAG database.
+"""
+import os
+import json
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Optional
+import numpy as np
+from langchain.schema import Document
+from lib.quantization import get_quantizer
+
+logger = logging.getLogger(__name__)
+
+class NumpyBackend:
+    """
+    Brute-force vector index kept in the process: the normalized float32 embeddings are rows
+    of a memory-mapped .npy file and the IDs, texts and metadata sit in a sidecar SQLite file.
+    A query is one matrix product over the rows (in blocks of block_rows) and an argpartition
+    top-k, with no server, index build or serialization in between.
+    Distances are squared L2 between unit vectors (2 - 2 * cosine), the scale of Chroma's
+    default space, so the same score thresholds apply to both backends.
+    Deleted rows are reused by later writes. Every write counts a generation in the records file,
+    and reads check it first, so an index opened by another process reloads after its writes.
+    With quantization ("int8" or "binary"), searches scan compact codes of the vectors (kept in
+    their own memory-mapped file) and rescore the best candidates on the full-precision vectors,
+    so only the codes and a few rows per result need to be in memory.
+    Filtered searches (where) only score the rows of their partition: the rows matching each
+    filter are kept until the next write, and a partition of less than gather_ratio of the
+    rows is gathered instead of scanning every block.
+    """
+    block_rows = 65_536
+    gather_ratio = 0.1
+    watched_state = ("generation",)
+
+    def __init__(
+        self,
+        db_path: str,
+        collection_name: str,
+        initial_capacity: int = 1024,
+        quantization: Optional[str] = None,
+    ) -> None:
+        """Open (or create) the index files in db_path."""
+        self.db_path = db_path
+        self.initial_capacity = initial_capacity
+        self.quantizer = get_quantizer(quantization)
+        self.vectors_path = os.path.join(db_path, f"{collection_name}.vectors.npy")
+        self.records_path = os.path.join(db_path, f"{collection_name}.records.sqlite3")
+        self.codes_path = None
+        if self.quantizer is not None:
+            self.codes_path = os.path.join(db_path, f"{collection_name}.{self.quantizer.name}.npy")
+        if not os.path.exists(db_path):
+            os.makedirs(db_path)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.records_path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS records (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                document TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_records_seed_source "
+            "ON records (json_extract(metadata, '$.seed_source'))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_records_document_type "
+            "ON records (json_extract(metadata, '$.document_type'))"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+        self._load()
+
+    def _state(self, key: str) -> Optional[str]:
+        """Read a value of the state table."""
+        row = self._conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, **values) -> None:
+        """Write values of the state table."""
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+            [(key, str(value)) for key, value in values.items()],
+        )
+        self._conn.commit()
+        # Our own writes don't make the loaded files out of date
+        self._watched.update({key: str(value) for key, value in values.items() if key in self.watched_state})
+
+    def _watch(self) -> Dict[str, str]:
+        """Read the state values written along with the files, in one query."""
+        placeholders = ",".join("?" * len(self.watched_state))
+        return dict(self._conn.execute(
+            f"SELECT key, value FROM state WHERE key IN ({placeholders})", self.watched_state
+        ).fetchall())
+
+    def _refresh(self) -> None:
+        """Reload the files and the row bookkeeping if another instance wrote since they were loaded."""
+        if self._watch() != self._watched:
+            logger.debug(f"Reloading {self.vectors_path}, written by another instance")
+            self._load()
+
+    def _bump_generation(self) -> None:
+        """
+        Count a write, before the records change, so files derived from the vectors
+        (codes, indexes) can tell they are out of date.
+        """
+        self._generation += 1
+        self._set_state(generation=self._generation)
+        self._partitions = {}
+
+    def _load(self) -> None:
+        """Map the vectors file and rebuild the row bookkeeping from the records."""
+        # Read first, so a write made while loading is seen by the next check
+        self._watched = self._watch()
+        self._generation = int(self._state("generation") or 0)
+        self._partitions = {}
+        self._vectors: Optional[np.ndarray] = None
+        self._codes: Optional[np.ndarray] = None
+        if os.path.exists(self.vectors_path):
+            self._vectors = np.load(self.vectors_path, mmap_mode="r+")
+
+        rows = np.array([row for (row,) in self._conn.execute("SELECT row FROM records")], dtype=np.int64)
+        self._size = int(rows.max()) + 1 if len(rows) else 0
+        capacity = len(self._vectors) if self._vectors is not None else 0
+        self._alive = np.zeros(max(capacity, self._size), dtype=bool)
+        self._alive[rows] = True
+        self._free = [int(row) for row in np.flatnonzero(~self._alive[:self._size])]
+        logger.debug(f"Loaded {len(rows)} vectors from {self.vectors_path}")
+
+        if self.quantizer is not None and self._vectors is not None:
+            if os.path.exists(self.codes_path) and self._state(f"{self.quantizer.name}_generation") == str(self._generation):
+                self._codes = np.load(self.codes_path, mmap_mode="r+")
+            else:
+                self._encode_all()
+
+    def _encode_all(self) -> None:
+        """Build the codes file from the stored vectors."""
+        capacity, dimensions = self._vectors.shape
+        self._codes = self._resize(self.codes_path, None, capacity, self.quantizer.width(dimensions), self.quantizer.dtype)
+        # A separate mapping, so the pages read here leave memory with it
+        vectors = np.load(self.vectors_path, mmap_mode="r")
+        for start in range(0, self._size, self.block_rows):
+            end = min(start + self.block_rows, self._size)
+            self._codes[start:end] = self.quantizer.encode(np.asarray(vectors[start:end]))
+        del vectors
+        self._codes.flush()
+        self._set_state(**{f"{self.quantizer.name}_generation": self._generation})
+        logger.info(f"Built the {self.quantizer.name} codes of {self._size} rows")
+
+    @property
+    def dimensions(self) -> Optional[int]:
+        """Get the embedding dimensions, or None before the first write."""
+        return self._vectors.shape[1] if self._vectors is not None else None
+
+    @staticmethod
+    def _resize(path: str, array: Optional[np.ndarray], capacity: int, width: int, dtype) -> np.ndarray:
+        """Write a memory-mapped file of capacity rows holding the rows of array, and map it."""
+        tmp_path = f"{path}.tmp.npy"
+        resized = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=(capacity, width))
+        if array is not None:
+            resized[:len(array)] = array
+        resized.flush()
+        del resized
+        os.replace(tmp_path, path)
+        return np.load(path, mmap_mode="r+")
+
+    def _grow(self, size: int, dimensions: int) -> None:
+        """Make room for size rows, doubling the vectors (and codes) file."""
+        capacity = len(self._vectors) if self._vectors is not None else 0
+        if size <= capacity:
+            return
+
+        capacity = max(self.initial_capacity, 2 * capacity, size)
+        self._vectors = self._resize(self.vectors_path, self._vectors, capacity, dimensions, np.float32)
+        if self.quantizer is not None:
+            self._codes = self._resize(
+                self.codes_path, self._codes, capacity, self.quantizer.width(dimensions), self.quantizer.dtype
+            )
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self._alive)] = self._alive
+        self._alive = alive
+
+    @staticmethod
+    def _normalize(vectors: list[list[float]]) -> np.ndarray:
+        """Get unit-length float32 rows."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _rows(self, ids: list[str]) -> Dict[str, int]:
+        """Get the row of each stored ID."""
+        rows = {}
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows.update(self._conn.execute(
+                f"SELECT id, row FROM records WHERE id IN ({placeholders})", batch
+            ).fetchall())
+        return rows
+
+    @staticmethod
+    def _where_sql(where: Dict[str, Any]) -> tuple[str, list]:
+        """Convert equality constraints on metadata keys to an SQL condition."""
+        conditions, params = [], []
+        for key, value in where.items():
+            if not key.isidentifier():
+                raise ValueError(f"Invalid metadata key: {key}")
+            conditions.append(f"json_extract(metadata, '$.{key}') = ?")
+            params.append(value)
+        return " AND ".join(conditions), params
+
+    def upsert(self, ids: list[str], vectors: list[list[float]], documents: list[Document]) -> None:
+        """Add or overwrite chunks with their embeddings."""
+        if not ids:
+            return
+
+        vectors = self._normalize(vectors)
+        with self._lock:
+            self._refresh()
+            if self.dimensions is not None and vectors.shape[1] != self.dimensions:
+                raise ValueError(f"Expected {self.dimensions}-dimensional vectors, got {vectors.shape[1]}")
+
+            self._bump_generation()
+            rows = self._rows(ids)
+            for chunk_id in ids:
+                if chunk_id not in rows:
+                    if self._free:
+                        rows[chunk_id] = self._free.pop()
+                    else:
+                        rows[chunk_id] = self._size
+                        self._size += 1
+            self._grow(self._size, vectors.shape[1])
+
+            targets = np.array([rows[chunk_id] for chunk_id in ids], dtype=np.int64)
+            self._vectors[targets] = vectors
+            self._vectors.flush()
+            if self.quantizer is not None:
+                self._codes[targets] = self.quantizer.encode(vectors)
+                self._codes.flush()
+            self._alive[targets] = True
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO records (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                [
+                    (rows[chunk_id], chunk_id, doc.page_content, json.dumps(doc.metadata or {}))
+                    for chunk_id, doc in zip(ids, documents)
+                ],
+            )
+            self._conn.commit()
+            if self.quantizer is not None:
+                self._set_state(**{f"{self.quantizer.name}_generation": self._generation})
+
+    def delete(self, ids: list[str]) -> None:
+        """Delete chunks by ID."""
+        with self._lock:
+            self._refresh()
+            self._bump_generation()
+            rows = list(self._rows(ids).values())
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                self._conn.execute(f"DELETE FROM records WHERE id IN ({placeholders})", batch)
+            self._conn.commit()
+            self._alive[rows] = False
+            self._free.extend(rows)
+            if self.quantizer is not None:
+                # Deleted rows keep their codes, which are masked out like their vectors
+                self._set_state(**{f"{self.quantizer.name}_generation": self._generation})
+
+    def update_metadatas(self, metadatas: Dict[str, dict]) -> None:
+        """
+        Overwrite the metadata of stored chunks, by ID, keeping their text and vector. The
+        filtered fields (document type and seed source) must not change, as the partitions
+        are kept.
+        """
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE records SET metadata = ? WHERE id = ?",
+                [(json.dumps(metadata), chunk_id) for chunk_id, metadata in metadatas.items()],
+            )
+            self._conn.commit()
+
+    def get_metadatas(
+        self,
+        where: Optional[Dict[str, Any]] = None,
+        ids: Optional[list[str]] = None
+    ) -> Dict[str, dict]:
+        """Get the metadata of every chunk matching the filter (and among ids, if given), by ID."""
+        condition, params = self._where_sql(where or {})
+        condition = condition or "1"
+        with self._lock:
+            if ids is None:
+                records = self._conn.execute(f"SELECT id, metadata FROM records WHERE {condition}", params).fetchall()
+            else:
+                records = []
+                for start in range(0, len(ids), 500):
+                    batch = ids[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    records.extend(self._conn.execute(
+                        f"SELECT id, metadata FROM records WHERE {condition} AND id IN ({placeholders})",
+                        [*params, *batch],
+                    ))
+        return {chunk_id: json.loads(metadata) for chunk_id, metadata in records}
+
+    def get_documents(self, ids: Optional[list[str]] = None) -> Dict[str, Document]:
+        """Get the chunks with the given IDs (or every chunk), by ID."""
+        with self._lock:
+            if ids is None:
+                records = self._conn.execute("SELECT id, document, metadata FROM records").fetchall()
+            else:
+                records = []
+                for start in range(0, len(ids), 500):
+                    batch = ids[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    records.extend(self._conn.execute(
+                        f"SELECT id, document, metadata FROM records WHERE id IN ({placeholders})", batch
+                    ))
+        return {
+            chunk_id: Document(page_content=content, metadata=json.loads(metadata), id=chunk_id)
+            for chunk_id, content, metadata in records
+        }
+
+    def _partition(self, where: Dict[str, Any]) -> np.ndarray:
+        """Get the rows matching a filter, kept until the next write."""
+        key = tuple(sorted(where.items()))
+        rows = self._partitions.get(key)
+        if rows is None:
+            condition, params = self._where_sql(where)
+            rows = np.array(
+                [row for (row,) in self._conn.execute(f"SELECT row FROM records WHERE {condition}", params)],
+                dtype=np.int64,
+            )
+            self._partitions[key] = rows
+        return rows
+
+    def _mask(self, where: Optional[Dict[str, Any]], ids: Optional[list[str]] = None) -> np.ndarray:
+        """Get the rows a query may return."""
+        if not where and ids is None:
+            return self._alive[:self._size].copy()
+
+        mask = np.zeros(self._size, dtype=bool)
+        if where:
+            mask[self._partition(where)] = True
+        else:
+            mask[:] = self._alive[:self._size]
+        if ids is not None:
+            selected = np.zeros(self._size, dtype=bool)
+            selected[list(self._rows(ids).values())] = True
+            mask &= selected
+        return mask
+
+    @staticmethod
+    def _scan(queries: int, mask: np.ndarray, k: int, block_rows: int, score) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the rows and scores of the k best scored rows of the mask for each of the queries,
+        best first. score(start, end) scores every query (rows) against the stored rows
+        start:end (columns).
+        """
+        best_rows = np.empty((queries, 0), dtype=np.int64)
+        best_scores = np.empty((queries, 0), dtype=np.float32)
+
+        for start in range(0, len(mask), block_rows):
+            end = min(start + block_rows, len(mask))
+            block_mask = mask[start:end]
+            if not block_mask.any():
+                continue
+
+            scores = np.ascontiguousarray(score(start, end), dtype=np.float32)
+            if not block_mask.all():
+                scores[:, ~block_mask] = -np.inf
+            if scores.shape[1] > k:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, top, axis=1)
+            else:
+                top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+
+            rows = np.concatenate([best_rows, top + start], axis=1)
+            scores = np.concatenate([best_scores, scores], axis=1)
+            if rows.shape[1] > k:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                rows = np.take_along_axis(rows, top, axis=1)
+                scores = np.take_along_axis(scores, top, axis=1)
+            best_rows, best_scores = rows, scores
+
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def _scan_rows(
+        self,
+        queries: int,
+        mask: np.ndarray,
+        selected: Optional[np.ndarray],
+        k: int,
+        block_rows: int,
+        score
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Like _scan, but score(rows) scores the stored rows given by a slice or an array, and
+        only the selected rows are scored when given.
+        """
+        if selected is None:
+            return self._scan(queries, mask, k, block_rows, lambda start, end: score(slice(start, end)))
+
+        rows, scores = self._scan(
+            queries, np.ones(len(selected), dtype=bool), k, block_rows, lambda start, end: score(selected[start:end])
+        )
+        return selected[rows], scores
+
+    def _read_rows(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Read full-precision rows from the vectors file. Unlike the memory map, this doesn't keep
+        the pages around the rows in the process memory.
+        """
+        dimensions = self.dimensions
+        row_bytes = dimensions * np.dtype(np.float32).itemsize
+        vectors = np.empty((len(rows), dimensions), dtype=np.float32)
+        with open(self.vectors_path, "rb", buffering=0) as f:
+            for i, row in enumerate(rows):
+                f.seek(self._vectors.offset + int(row) * row_bytes)
+                f.readinto(vectors[i])
+        return vectors
+
+    @staticmethod
+    def _rescore(
+        queries: np.ndarray,
+        read_rows,
+        candidates: np.ndarray,
+        mask: np.ndarray,
+        k: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the rows and cosine similarities of the k best candidates of each query, best first,
+        computed on the full-precision vectors given by read_rows(rows). Candidates outside the
+        mask (or -1) are skipped.
+        """
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for i, query in enumerate(queries):
+            found = np.unique(candidates[i][(candidates[i] >= 0) & (candidates[i] < len(mask))])
+            found = found[mask[found]]
+            if not len(found):
+                continue
+            exact = read_rows(found) @ query
+            best = np.argsort(-exact)[:k]
+            rows[i, :len(best)] = found[best]
+            scores[i, :len(best)] = exact[best]
+        return rows, scores
+
+    def _top_k(self, queries: np.ndarray, vectors: np.ndarray, mask: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Get the rows and cosine similarities of the k best matches of each query, best first."""
+        # A small partition is gathered, rather than masked out of every block
+        selected = None
+        if mask.sum() < self.gather_ratio * len(mask):
+            selected = np.flatnonzero(mask)
+
+        codes = self._codes
+        if codes is None:
+            return self._scan_rows(
+                len(queries), mask, selected, k, self.block_rows, lambda rows: (vectors[rows] @ queries.T).T
+            )
+
+        candidates, scores = self._scan_rows(
+            len(queries),
+            mask,
+            selected,
+            k * self.quantizer.rescore_factor,
+            self.quantizer.block_rows,
+            lambda rows: self.quantizer.scores(codes[rows], queries),
+        )
+        candidates[scores == -np.inf] = -1
+        return self._rescore(queries, self._read_rows, candidates, mask, k)
+
+    def query(
+        self,
+        vectors: list[list[float]],
+        k: int,
+        where: Optional[Dict[str, Any]] = None,
+        ids: Optional[list[str]] = None
+    ) -> list[list[tuple[Document, float]]]:
+        """Search the k nearest chunks of each query vector (among ids, if given) in one matrix product."""
+        queries = self._normalize(vectors)
+        with self._lock:
+            self._refresh()
+            if self._vectors is None:
+                return [[] for _ in vectors]
+            # The matrix product runs outside the lock: writes go to other rows or replace the file
+            stored, mask = self._vectors, self._mask(where, ids)
+
+        rows, scores = self._top_k(queries, stored, mask, k)
+        matches = [
+            [(int(row), float(score)) for row, score in zip(row_list, score_list) if score > -np.inf]
+            for row_list, score_list in zip(rows, scores)
+        ]
+
+        wanted = sorted({row for match in matches for row, _ in match})
+        records = {}
+        with self._lock:
+            for start in range(0, len(wanted), 500):
+                batch = wanted[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for row, chunk_id, content, metadata in self._conn.execute(
+                    f"SELECT row, id, document, metadata FROM records WHERE row IN ({placeholders})", batch
+                ):
+                    records[row] = Document(page_content=content, metadata=json.loads(metadata), id=chunk_id)
+
+        return [
+            [(records[row], 2.0 - 2.0 * score) for row, score in match if row in records]
+            for match in matches
+        ]
+
+    def _count(self) -> int:
+        """Count the loaded rows."""
+        return int(self._alive[:self._size].sum())
+
+    def count(self) -> int:
+        """Count the stored chunks."""
+        with self._lock:
+            self._refresh()
+            return self._count()
+
+    def reset(self) -> None:
+        """Delete every chunk and the vectors (and codes) file."""
+        with self._lock:
+            self._bump_generation()
+            self._conn.execute("DELETE FROM records")
+            self._conn.commit()
+            self._vectors, self._codes = None, None
+            for path in (self.vectors_path, self.codes_path):
+                if path and os.path.exists(path):
+                    os.remove(path)
+            self._load()
@@ -0,0 +1,121 @@
+"""
+Memoization of the LLM query rewriting (better query, multi-queries).
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class QueryCache:
+    """
+    LRU cache of LLM query rewrites keyed on (kind, normalized query text).
+    With a cache_path, entries are also kept in an SQLite file, so they survive restarts
+    and are shared between processes; memory misses fall back to it.
+    """
+
+    def __init__(self, max_entries: int = 1000, cache_path: Optional[str] = None) -> None:
+        """Configure the size cap and the optional persistent store."""
+        self.max_entries = max_entries
+        self.cache_path = cache_path
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[str, str], Any] = OrderedDict()
+        self._conn = None
+        if cache_path:
+            directory = os.path.dirname(cache_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+
+            self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS queries (
+                    kind TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (kind, query)
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_queries_last_used ON queries (last_used)")
+            self._conn.commit()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Normalize a query so that case and whitespace differences share an entry."""
+        return " ".join(query.lower().split())
+
+    def get(self, kind: str, query: str) -> Optional[Any]:
+        """Get the cached value for a query, or None."""
+        key = (kind, self.normalize(query))
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value FROM queries WHERE kind = ? AND query = ?", key
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE queries SET last_used = ? WHERE kind = ? AND query = ?", (time.time(), *key)
+                    )
+                    self._conn.commit()
+                    value = json.loads(row[0])
+                    self._remember(key, value)
+                    self.hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def _remember(self, key: tuple[str, str], value: Any) -> None:
+        """Keep a value in memory, evicting the least recently used one when full."""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def put(self, kind: str, query: str, value: Any) -> None:
+        """Cache the (JSON-serializable) value for a query."""
+        key = (kind, self.normalize(query))
+        with self._lock:
+            self._remember(key, value)
+            if self._conn is None:
+                return
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO queries (kind, query, value, last_used) VALUES (?, ?, ?, ?)",
+                (*key, json.dumps(value), time.time()),
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM queries").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM queries WHERE rowid IN "
+                    "(SELECT rowid FROM queries ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the cache hit/miss counters and size."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "persistent": self._conn is not None,
+        }
@@ -6,56 +6,106 @@ import re
 
 logger = logging.getLogger(__name__)
 
+_WEBSITE_FLAGS = re.IGNORECASE | re.MULTILINE
+
+# Characters that IGNORECASE matching folds onto ASCII letters but str.lower() doesn't
+_CASE_FOLD = str.maketrans({"\u0130": "i", "\u0131": "i", "\u017f": "s"})
+
+_EXCESS_NEWLINES = re.compile(r'\n\s*\n\s*\n+')
+# Same result as replacing every [ \t]+ run, without rewriting the single spaces
+_EXCESS_SPACES = re.compile(r'[ \t]{2,}|\t')
+
+# Common web elements, each with the lowercase literals it can't match without
+_WEBSITE_NOISE = [
+    (re.compile(r'© \d{4}.*?rights reserved.*?(?:\n|$)', _WEBSITE_FLAGS), ("© ", "rights reserved")),
+    (re.compile(r'Terms of Service.*?Privacy Policy.*?(?:\n|$)', _WEBSITE_FLAGS), ("terms of service", "privacy policy")),
+    (re.compile(r'We use cookies.*?Privacy Policy.*?(?:\n|$)', _WEBSITE_FLAGS), ("we use cookies", "privacy policy")),
+    (re.compile(r'Accept\s*$', _WEBSITE_FLAGS), ("accept",)),
+    (re.compile(r'Submit\s*$', _WEBSITE_FLAGS), ("submit",)),
+    (re.compile(r'click for next image.*?(?:\n|$)', _WEBSITE_FLAGS), ("click for next image",)),
+    (re.compile(r'Next\s*Cancel\s*(?:\n|$)', _WEBSITE_FLAGS), ("next", "cancel")),
+    (re.compile(r'Download count:.*?(?:\n|$)', _WEBSITE_FLAGS), ("download count:",)),
+    (re.compile(r'\(Click on any tool to see more information\)', _WEBSITE_FLAGS), ("(click on any tool to see more information)",)),
+    (re.compile(r'briefcase Created with Sketch.*?(?:\n|$)', _WEBSITE_FLAGS), ("briefcase created with sketch",)),
+    (re.compile(r'github \[#\d+\] Created with Sketch.*?(?:\n|$)', _WEBSITE_FLAGS), ("github [#", "] created with sketch")),
+    (re.compile(r'Contact Form\s*(?:\n|$)', _WEBSITE_FLAGS), ("contact form",)),
+    (re.compile(r'Terms of Service\s*(?:\n|$)', _WEBSITE_FLAGS), ("terms of service",)),
+    (re.compile(r'Privacy Policy\s*(?:\n|$)', _WEBSITE_FLAGS), ("privacy policy",)),
+    (re.compile(r'We use cookies.*?Privacy Policy\.', _WEBSITE_FLAGS), ("we use cookies", "privacy policy.")),
+    (re.compile(r'Contact:\s*\[email.*?protected\]\s*(?:\n|$)', _WEBSITE_FLAGS), ("contact:", "[email", "protected]")),
+    (re.compile(r'Download CV\s*(?:\n|$)', _WEBSITE_FLAGS), ("download cv",)),
+    (re.compile(r'CV\s*(?:\n|$)', _WEBSITE_FLAGS), ("cv",)),
+    (re.compile(r'Based In\s*(?:\n|$)', _WEBSITE_FLAGS), ("based in",)),
+]
+
+_FORM_FIELD_NAMES = ("First name", "Last name", "Email address", "Phone Number", "Message")
+_FORM_FIELDS = re.compile(r'(First name|Last name|Email address|Phone Number|Message)\s*(?:\n|$)')
+_YEARS_LINE = re.compile(r'^\d+\+?\s*Years?\s*$', re.MULTILINE)
+_YEAR_RANGE_LINE = re.compile(r'^\d{4}\s*-\s*\d{4}\s*$', re.MULTILINE)
+_BULLET_LINE = re.compile(r'^\s*[•\-\+]\s*$', re.MULTILINE)
+_SYMBOL_LINE = re.compile(r'^\s*[^\w\s]\s*$', re.MULTILINE)
+
+def _collapse_newlines(text: str) -> str:
+    """Collapse runs of blank lines into a single blank line."""
+    # The pattern needs at least three newlines to match
+    if text.count('\n') < 3:
+        return text
+    return _EXCESS_NEWLINES.sub('\n\n', text)
+
+def _lowered(text: str) -> str:
+    """Lowercase text the way IGNORECASE patterns see it, for literal checks."""
+    if '\u0130' in text or '\u0131' in text or '\u017f' in text:
+        text = text.translate(_CASE_FOLD)
+    return text.lower()
+
 def _clean_website_content(text: str) -> str:
-    """Clean up website content by removing noise and formatting."""
+    """
+    Clean up website content by removing noise and formatting.
+    Patterns are compiled once and applied in a fixed order; a pass only runs when the
+    literals its pattern needs are present, so most passes are a substring check.
+    The order matters (one removal can create a match for a later pattern), so merging
+    them into a single alternation would change the output.
+    """
     
     # Remove excessive whitespace and newlines
-    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)  # Multiple newlines to double
-    text = re.sub(r'[ \t]+', ' ', text)  # Multiple spaces to single
+    text = _collapse_newlines(text)  # Multiple newlines to double
+    text = _EXCESS_SPACES.sub(' ', text)  # Multiple spaces to single
     
     # Remove common web elements
-    patterns_to_remove = [
-        r'© \d{4}.*?rights reserved.*?(?:\n|$)',
-        r'Terms of Service.*?Privacy Policy.*?(?:\n|$)',
-        r'We use cookies.*?Privacy Policy.*?(?:\n|$)',
-        r'Accept\s*$',
-        r'Submit\s*$',
-        r'click for next image.*?(?:\n|$)',
-        r'Next\s*Cancel\s*(?:\n|$)',
-        r'Download count:.*?(?:\n|$)',
-        r'\(Click on any tool to see more information\)',
-        r'briefcase Created with Sketch.*?(?:\n|$)',
-        r'github \[#\d+\] Created with Sketch.*?(?:\n|$)',
-        r'Contact Form\s*(?:\n|$)',
-        r'Terms of Service\s*(?:\n|$)',
-        r'Privacy Policy\s*(?:\n|$)',
-        r'We use cookies.*?Privacy Policy\.',
-        r'Contact:\s*\[email.*?protected\]\s*(?:\n|$)',
-        r'Download CV\s*(?:\n|$)',
-        r'CV\s*(?:\n|$)',
-        r'Based In\s*(?:\n|$)',
-    ]
-    
-    for pattern in patterns_to_remove:
-        text = re.sub(pattern, '', text, flags=re.IGNORECASE | re.MULTILINE)
+    # A stale lowercase copy is good enough to run a pass, but not to skip one:
+    # a removal can join text into a new literal
+    lowered, stale = _lowered(text), False
+    for pattern, literals in _WEBSITE_NOISE:
+        if not all(literal in lowered for literal in literals):
+            if not stale:
+                continue
+            lowered, stale = _lowered(text), False
+            if not all(literal in lowered for literal in literals):
+                continue
+        text, count = pattern.subn('', text)
+        stale = stale or bool(count)
     
     # Remove form fields pattern
-    text = re.sub(r'(First name|Last name|Email address|Phone Number|Message)\s*(?:\n|$)', '', text)
+    if any(name in text for name in _FORM_FIELD_NAMES):
+        text = _FORM_FIELDS.sub('', text)
     
     # Clean up tool/year patterns (like "4+ Years", "2021 - 2024")
-    text = re.sub(r'^\d+\+?\s*Years?\s*$', '', text, flags=re.MULTILINE)
-    text = re.sub(r'^\d{4}\s*-\s*\d{4}\s*$', '', text, flags=re.MULTILINE)
+    if 'Year' in text:
+        text = _YEARS_LINE.sub('', text)
+    if '-' in text:
+        text = _YEAR_RANGE_LINE.sub('', text)
     
     # Remove standalone symbols and short fragments
-    text = re.sub(r'^\s*[•\-\+]\s*$', '', text, flags=re.MULTILINE)
-    text = re.sub(r'^\s*[^\w\s]\s*$', '', text, flags=re.MULTILINE)
+    if '•' in text or '-' in text or '+' in text:
+        text = _BULLET_LINE.sub('', text)
+    text = _SYMBOL_LINE.sub('', text)
     
     # Final cleanup
-    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)  # Multiple newlines again
+    text = _collapse_newlines(text)  # Multiple newlines again
     text = text.strip()
     
     return text
-    
+
 def filter_meaningful_content(documents: list) -> list:
     """Filter out documents with minimal meaningful content."""
     filtered_docs = []
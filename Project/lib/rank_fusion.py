@@ -0,0 +1,27 @@
+"""
+Rank fusion for merging several ranked result lists.
+"""
+from typing import Optional
+from langchain.schema import Document
+
+def reciprocal_rank_fusion(
+    result_lists: list[list[tuple[Document, float]]],
+    k: int = 60,
+    top_k: Optional[int] = None
+) -> list[tuple[Document, float]]:
+    """
+    Merge ranked (Document, distance) lists with reciprocal rank fusion.
+    Chunks are deduplicated by ID (or content when they have none), and each keeps its best
+    distance. Chunks found by several lists, or ranked high in them, come first.
+    """
+    fused_scores = {}
+    best = {}
+    for results in result_lists:
+        for rank, (doc, distance) in enumerate(results, start=1):
+            key = doc.id or doc.page_content
+            fused_scores[key] = fused_scores.get(key, 0.0) + 1 / (k + rank)
+            if key not in best or distance < best[key][1]:
+                best[key] = (doc, distance)
+
+    ranked = sorted(fused_scores, key=fused_scores.get, reverse=True)
+    return [best[key] for key in ranked[:top_k]]
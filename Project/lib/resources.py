@@ -0,0 +1,71 @@
+"""
+Process-wide registry of the clients shared by the database and the RAG services.
+"""
+import os
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.RLock()
+_resources: Dict[Hashable, Any] = {}
+
+def get_resource(key: Hashable, factory: Callable[[], Any]) -> Any:
+    """
+    Get the resource registered under key, created by factory() on first use.
+    Resources are created once per process, even when several threads ask at the same time.
+    """
+    resource = _resources.get(key)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(key)
+            if resource is None:
+                resource = factory()
+                _resources[key] = resource
+                logger.debug(f"Created the shared resource {key}")
+    return resource
+
+def clear_resources() -> None:
+    """Forget the resources, e.g. after the settings they were created with changed."""
+    with _lock:
+        _resources.clear()
+
+def get_http_client():
+    """
+    Get the HTTP client of the OpenAI requests, with the OpenAI SDK defaults. Its connection
+    pool keeps connections alive, so TLS handshakes are paid once, not once per client.
+    """
+    from openai import DefaultHttpxClient
+    return get_resource(("http_client",), DefaultHttpxClient)
+
+def get_async_http_client():
+    """
+    Get the HTTP client of the async OpenAI requests (arespond and the async embeddings), with
+    the OpenAI SDK defaults, pooled like the one of get_http_client. Connections are reused
+    within an event loop; a new loop (e.g. each asyncio.run) opens new ones.
+    """
+    from openai import DefaultAsyncHttpxClient
+    return get_resource(("async_http_client",), DefaultAsyncHttpxClient)
+
+def get_embeddings(model: str):
+    """Get the OpenAI embedding model."""
+    from langchain_openai import OpenAIEmbeddings
+    return get_resource(
+        ("embeddings", model),
+        lambda: OpenAIEmbeddings(model=model, http_client=get_http_client(), http_async_client=get_async_http_client()),
+    )
+
+def get_chat_model(model: str):
+    """Get the OpenAI chat model."""
+    from langchain_openai import ChatOpenAI
+    return get_resource(
+        ("chat_model", model),
+        lambda: ChatOpenAI(model=model, http_client=get_http_client(), http_async_client=get_async_http_client()),
+    )
+
+def get_chroma_client(path: str):
+    """Get the persistent Chroma client of a database directory."""
+    import chromadb
+    path = os.path.abspath(path)
+    return get_resource(("chroma_client", path), lambda: chromadb.PersistentClient(path=path))
@@ -0,0 +1,35 @@
+"""
+Token counting for embedding batches and prompts.
+"""
+import logging
+from functools import lru_cache
+from typing import Optional
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str = "cl100k_base") -> Optional[tiktoken.Encoding]:
+    """Load a tokenizer once, or get None if it can't be loaded (e.g. offline)."""
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        logger.warning(f"Could not load the {encoding_name} tokenizer, estimating token counts: {e}")
+        return None
+
+def count_tokens(text: str, encoding_name: str = "cl100k_base") -> int:
+    """Count the tokens of a text, estimating about 4 characters per token without a tokenizer."""
+    encoding = get_encoding(encoding_name)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def truncate_tokens(text: str, max_tokens: int, encoding_name: str = "cl100k_base") -> str:
+    """Cut a text down to at most max_tokens tokens."""
+    encoding = get_encoding(encoding_name)
+    if encoding is None:
+        return text[:max(max_tokens - 1, 0) * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
@@ -0,0 +1,253 @@
+"""
+Asynchronous website crawler with conditional-GET caching.
+"""
+import os
+import json
+import asyncio
+import logging
+import xml.etree.ElementTree as ElementTree
+from typing import Callable, Dict, Iterable, Optional
+from urllib.parse import urljoin, urldefrag, urlparse
+import httpx
+from bs4 import BeautifulSoup
+from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+_SKIPPED_EXTENSIONS = (
+    ".pdf", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".ico",
+    ".css", ".js", ".zip", ".mp4", ".mp3", ".xml", ".json",
+)
+
+class WebCrawler:
+    """
+    Crawls same-domain pages from a start URL and its sitemap.xml, within depth, page and
+    concurrency caps, over a pooled HTTP client. ETag/Last-Modified values are cached so
+    unchanged pages come back as 304 and are skipped. Pages that are gone (404/410, or no
+    longer reached by a complete crawl) are reported by removed_pages.
+    """
+
+    def __init__(
+        self,
+        start_url: str,
+        cache_path: str = "./crawl_cache.json",
+        max_depth: int = 2,
+        max_pages: int = 100,
+        max_concurrency: int = 8,
+        timeout: float = 10.0,
+        is_stored: Optional[Callable[[str], bool]] = None,
+    ) -> None:
+        """
+        Configure the crawl.
+        is_stored tells whether a page is already in the database; conditional requests are
+        only sent for stored pages, so a page that never made it in is downloaded again.
+        """
+        self.start_url = urldefrag(start_url)[0]
+        self.domain = urlparse(self.start_url).netloc
+        self.cache_path = cache_path
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.is_stored = is_stored or (lambda url: True)
+        self.cache = self._load_cache()
+        self.stats = {"fetched": 0, "not_modified": 0, "gone": 0, "failed": 0}
+        self.visited: set[str] = set()
+        self.reached: set[str] = set()  # Visited pages that came back 200 or 304
+        self.gone: set[str] = set()  # Visited pages that came back 404 or 410
+        self.complete = False  # Whether the last crawl reached every linked page, within no cap
+
+    def _load_cache(self) -> Dict[str, dict]:
+        """Load the validators and links of previously crawled pages."""
+        if not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable crawl cache {self.cache_path}: {e}")
+            return {}
+
+    def save_cache(self) -> None:
+        """Persist the crawl cache. Call it once the crawled pages are stored."""
+        with open(self.cache_path, "w") as f:
+            json.dump(self.cache, f)
+
+    def _normalize(self, url: str) -> Optional[str]:
+        """Get the crawlable form of a URL, or None if it is off-domain or not a page."""
+        url = urldefrag(url)[0]
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or parsed.netloc != self.domain:
+            return None
+        if parsed.path.lower().endswith(_SKIPPED_EXTENSIONS):
+            return None
+        return url
+
+    def _extract_links(self, url: str, soup: BeautifulSoup) -> list[str]:
+        """Get the same-domain links of a page."""
+        links = []
+        for anchor in soup.find_all("a", href=True):
+            link = self._normalize(urljoin(url, anchor["href"]))
+            if link and link not in links:
+                links.append(link)
+        return links
+
+    async def _fetch_sitemap(self, client: httpx.AsyncClient, sitemap_url: str, nested: bool = True) -> list[str]:
+        """Get the page URLs listed in a sitemap (following one level of sitemap index)."""
+        try:
+            response = await client.get(sitemap_url)
+            if response.status_code != 200:
+                return []
+            root = ElementTree.fromstring(response.content)
+        except (httpx.HTTPError, ElementTree.ParseError) as e:
+            logger.debug(f"No usable sitemap at {sitemap_url}: {e}")
+            return []
+
+        urls = []
+        for element in root.iter():
+            if not element.tag.endswith("loc") or not element.text:
+                continue
+            loc = element.text.strip()
+            if root.tag.endswith("sitemapindex"):
+                if nested:
+                    urls.extend(await self._fetch_sitemap(client, loc, nested=False))
+            elif self._normalize(loc):
+                urls.append(self._normalize(loc))
+        return urls
+
+    async def _fetch(self, client: httpx.AsyncClient, url: str) -> tuple[Optional[Document], list[str]]:
+        """Fetch a page, returning its document (None when unchanged or failed) and its links."""
+        cached = self.cache.get(url, {})
+        headers = {}
+        has_validators = cached.get("etag") or cached.get("last_modified")
+        if has_validators and await asyncio.to_thread(self.is_stored, url):
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        try:
+            response = await client.get(url, headers=headers)
+        except httpx.HTTPError as e:
+            logger.warning(f"Error fetching {url}: {e}")
+            self.stats["failed"] += 1
+            self.complete = False
+            return None, []
+
+        if response.status_code == 304:
+            self.stats["not_modified"] += 1
+            self.reached.add(url)
+            return None, cached.get("links", [])
+
+        if response.status_code in (404, 410):
+            logger.info(f"Page gone: {url} (HTTP {response.status_code})")
+            self.stats["gone"] += 1
+            self.gone.add(url)
+            self.cache.pop(url, None)
+            return None, []
+
+        if response.status_code != 200 or "html" not in response.headers.get("content-type", ""):
+            if response.status_code != 200:
+                logger.warning(f"Error fetching {url}: HTTP {response.status_code}")
+                self.stats["failed"] += 1
+                self.complete = False
+            return None, []
+
+        self.reached.add(url)
+        soup = BeautifulSoup(response.text, "html.parser")
+        links = self._extract_links(url, soup)
+        self.cache[url] = {
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "links": links,
+        }
+        self.stats["fetched"] += 1
+
+        # Same metadata as WebBaseLoader
+        metadata = {"source": url}
+        if soup.title and soup.title.string:
+            metadata["title"] = soup.title.string.strip()
+        description = soup.find("meta", attrs={"name": "description"})
+        if description and description.get("content"):
+            metadata["description"] = description["content"]
+        if soup.html and soup.html.get("lang"):
+            metadata["language"] = soup.html["lang"]
+
+        return Document(page_content=soup.get_text(), metadata=metadata), links
+
+    async def acrawl(self) -> list[Document]:
+        """Crawl the site, returning the documents of new or changed pages."""
+        pages = []
+        visited = self.visited = set()
+        self.reached, self.gone = set(), set()
+        self.complete = True
+        queue: asyncio.Queue = asyncio.Queue()
+
+        limits = httpx.Limits(
+            max_connections=self.max_concurrency,
+            max_keepalive_connections=self.max_concurrency,
+        )
+        async with httpx.AsyncClient(timeout=self.timeout, limits=limits, follow_redirects=True) as client:
+            start = urlparse(self.start_url)
+            seeds = [self.start_url]
+            seeds += await self._fetch_sitemap(client, f"{start.scheme}://{start.netloc}/sitemap.xml")
+
+            def enqueue(url: str, depth: int) -> None:
+                if url in visited:
+                    return
+                if len(visited) >= self.max_pages:
+                    # Which pages make it under the cap depends on the fetch order
+                    self.complete = False
+                    return
+                visited.add(url)
+                queue.put_nowait((url, depth))
+
+            for url in seeds:
+                enqueue(url, 0)
+
+            async def worker() -> None:
+                while True:
+                    url, depth = await queue.get()
+                    try:
+                        document, links = await self._fetch(client, url)
+                        if document is not None:
+                            pages.append(document)
+                        if depth < self.max_depth:
+                            for link in links:
+                                enqueue(link, depth + 1)
+                        elif any(link not in visited for link in links):
+                            self.complete = False
+                    finally:
+                        queue.task_done()
+
+            workers = [asyncio.create_task(worker()) for _ in range(self.max_concurrency)]
+            await queue.join()
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        logger.info(
+            f"Crawled {len(visited)} pages from {self.start_url}"
+            f"{'' if self.complete else ' (incomplete)'}: {self.stats}"
+        )
+        return pages
+
+    def removed_pages(self, stored: Iterable[str]) -> list[str]:
+        """
+        Get the stored pages that are gone since the last crawl: those answering 404/410, and
+        those no longer linked, but only if the crawl was complete (no page failed, e.g. on a
+        timeout, and no link was left out by the page or depth cap), as otherwise which pages
+        were visited depends on the caps and the fetch order. Nothing is reported when the
+        start page itself could not be fetched, so an outage doesn't empty the collection.
+        """
+        if self.start_url not in self.reached:
+            logger.warning(f"Not removing any page, as {self.start_url} could not be fetched")
+            return []
+        if not self.complete:
+            logger.info("Only removing pages that answered 404/410, as the crawl was incomplete")
+            return sorted(url for url in stored if url in self.gone)
+        return sorted(url for url in stored if url not in self.visited or url in self.gone)
+
+    def crawl(self) -> list[Document]:
+        """Crawl the site from synchronous code."""
+        return asyncio.run(self.acrawl())
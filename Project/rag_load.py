@@ -4,11 +4,16 @@ RAG Service for handling predict part.
 import os
 import re
 import logging
-from langchain_community.document_loaders import PyPDFLoader, WebBaseLoader
+from typing import Iterator, Optional, Union
+from langchain.schema import Document
+from langchain_community.document_loaders import PyPDFLoader
 from langchain_community.document_loaders import UnstructuredMarkdownLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from db import DocumentDatabase
 from lib.rag_load_helper import filter_meaningful_content, filter_notion_content
+from lib.ingest_pipeline import IngestPipeline
+from lib.dedup import ChunkDeduplicator
+from lib.web_crawler import WebCrawler
 
 logger = logging.getLogger(__name__)
 
@@ -17,17 +22,43 @@ class RAGLoad:
     RAG Service for handling predict part.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        max_workers: int = 3,
+        batch_size: int = 128,
+        dedup_threshold: Optional[float] = 0.8,
+        db: Optional[DocumentDatabase] = None,
+        cv_path: str = "./data/cv.pdf",
+        notion_files: Optional[list[str]] = None,
+        website_url: str = "https://joaoestima.com",
+    ):
         """
-        Initialize the RAGPredict service.
+        Initialize the RAGLoad service.
+        Sources are streamed concurrently by up to max_workers threads, batch_size chunks at a time.
+        Chunks whose estimated Jaccard similarity to a kept chunk reaches dedup_threshold are
+        dropped before embedding (None disables deduplication).
+        The database and the source locations can be overridden, e.g. by the benchmarks.
         """
-        self.db = DocumentDatabase()
+        self.db = db or DocumentDatabase()
+        self.cv_path = cv_path
+        self.notion_files = notion_files or ["./data/notion_2025.md", "./data/notion_old.md"]
+        self.website_url = website_url
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.dedup_threshold = dedup_threshold
+
+    def _load_cv_documents(self) -> Iterator[Union[Document, str]]:
+        """
+        Load the CV document, one page at a time.
+        A missing or empty CV is yielded as a removed seed source, so its stored chunks are deleted.
+        """
+        cv_path = self.cv_path
+        if not os.path.exists(cv_path):
+            logger.warning(f"CV not found: {cv_path}, removing its chunks")
+            yield cv_path
+            return
 
-    def _load_cv_documents(self) -> None:
-        """Load the CV document."""
-        cv_path = "./data/cv.pdf"
         loader = PyPDFLoader(cv_path)
-        documents = loader.load()
 
         # # Create text splitter to handle newlines
         text_splitter = RecursiveCharacterTextSplitter(
@@ -35,21 +66,44 @@ class RAGLoad:
             chunk_size=500, # 500 or 1000 and adapt 100 upwards
             chunk_overlap=100, # 0.15 - 0.3 only for structure data
         )
-        split_docs = text_splitter.split_documents(documents)
-
-        # Add metadata
-        for doc in split_docs:
-            doc.metadata["document_type"] = "cv"
-            doc.metadata["loader"] = "pdf"
-
-        self.db.add_documents(split_docs)
-
-    def _load_website_documents(self, website_url: str = "https://joaoestima.com") -> None:
-        """Load the website documents."""
-        # https://python.langchain.com/docs/integrations/document_loaders/web_base/
 
-        loader = WebBaseLoader(website_url)
-        documents = loader.load()
+        chunk_count = 0
+        for page in loader.lazy_load():
+            # Add metadata
+            for doc in text_splitter.split_documents([page]):
+                doc.metadata["document_type"] = "cv"
+                doc.metadata["loader"] = "pdf"
+                doc.metadata["seed_source"] = cv_path
+                chunk_count += 1
+                yield doc
+
+        if not chunk_count:
+            logger.warning(f"No chunks in CV: {cv_path}, removing its chunks")
+            yield cv_path
+
+    def _load_website_documents(
+        self,
+        website_url: Optional[str] = None,
+        max_depth: int = 2,
+        max_pages: int = 100,
+        max_concurrency: int = 8
+    ) -> Iterator[Union[Document, str]]:
+        """
+        Crawl the website and load its pages.
+        Pages that come back unchanged (HTTP 304) are skipped, so their stored chunks are kept.
+        Stored pages that are gone (HTTP 404/410, or no longer linked, if the crawl was complete)
+        are yielded as removed seed sources once the crawl is done, so their chunks are deleted.
+        """
+        crawler = WebCrawler(
+            website_url or self.website_url,
+            cache_path=os.path.join(os.path.dirname(self.db.db_path) or ".", "crawl_cache.json"),
+            max_depth=max_depth,
+            max_pages=max_pages,
+            max_concurrency=max_concurrency,
+            is_stored=lambda url: bool(self.db.get_content_hashes(url)),
+        )
+        # In a fixed order, so deduplication keeps the same copies whatever the fetch order
+        pages = sorted(crawler.crawl(), key=lambda page: page.metadata["source"])
 
         # Use the same text splitter as PDF documents
         text_splitter = RecursiveCharacterTextSplitter(
@@ -57,94 +111,126 @@ class RAGLoad:
             chunk_size=1000,  # Slightly larger for web content
             chunk_overlap=100,
         )
-        split_docs = text_splitter.split_documents(documents)
 
-        logger.info(f"Split into {len(split_docs)} initial chunks")
-        
-        # Clean and filter content
-        cleaned_docs = filter_meaningful_content(split_docs)
-        
-        logger.info(f"After cleaning: {len(cleaned_docs)} meaningful chunks")
-        
-        # Add metadata to identify source
-        for doc in cleaned_docs:
-            doc.metadata["document_type"] = "website"
-            doc.metadata["loader"] = "web"
-            doc.metadata["source"] = website_url
-        
-        self.db.add_documents(cleaned_docs)
+        split_count, cleaned_count = 0, 0
+        for page in pages:
+            page_url = page.metadata["source"]
+
+            # Clean the chunks, which is faster than cleaning the whole page (see benchmarks/clean_text.py)
+            split_docs = text_splitter.split_documents([page])
+            cleaned_docs = filter_meaningful_content(split_docs)
+            split_count += len(split_docs)
+            cleaned_count += len(cleaned_docs)
+
+            if not cleaned_docs:
+                # Nothing meaningful left on the page, so its stored chunks go
+                yield page_url
+                continue
+
+            # Add metadata to identify source
+            for doc in cleaned_docs:
+                doc.metadata["document_type"] = "website"
+                doc.metadata["loader"] = "web"
+                doc.metadata["seed_source"] = page_url
+                yield doc
+
+        removed_pages = crawler.removed_pages(self.db.get_seed_sources("website"))
+        yield from removed_pages
+
+        logger.info(
+            f"Website: {len(pages)} changed pages, {split_count} initial chunks → "
+            f"{cleaned_count} meaningful chunks after cleaning, {len(removed_pages)} pages removed"
+        )
+        crawler.save_cache()
 
-    def _load_notion_documents(self):
-        """Load the Notion documents."""
+    def _load_notion_documents(self) -> Iterator[Union[Document, str]]:
+        """
+        Load the Notion documents, one file at a time.
+        Missing files, and files with no chunks left after filtering, are yielded as removed seed
+        sources, so their stored chunks are deleted.
+        """
         # https://python.langchain.com/docs/integrations/document_loaders/notion/
 
-        files = [
-            "./data/notion_2025.md",
-            "./data/notion_old.md",
-        ]
-        
-        all_filtered_docs = []
-        
+        files = self.notion_files
+
+        # Use smaller chunks for to-do lists
+        text_splitter = RecursiveCharacterTextSplitter(
+            separators=["\n\n", "\n", ".", " "],
+            chunk_size=300,
+            chunk_overlap=50,
+        )
+
+        loaded_files = 0
         for file_path in files:
             logger.info(f"Loading Notion file: {file_path}")
             
             # Check if file exists
             if not os.path.exists(file_path):
-                logger.warning(f"File not found: {file_path}, skipping...")
+                logger.warning(f"File not found: {file_path}, removing its chunks")
+                yield file_path
                 continue
             
             loader = UnstructuredMarkdownLoader(file_path=file_path)
-            documents = loader.load()
-
-            # Use smaller chunks for to-do lists
-            text_splitter = RecursiveCharacterTextSplitter(
-                separators=["\n\n", "\n", ".", " "],
-                chunk_size=300,
-                chunk_overlap=50,
-            )
-
-            split_docs = text_splitter.split_documents(documents)
-            
-            # Filter meaningful content (same function works for all notion files!)
-            filtered_docs = filter_notion_content(split_docs)
-            
-            # Add metadata
-            for doc in filtered_docs:
-                doc.metadata["document_type"] = "notion"
-                doc.metadata["loader"] = "markdown"
-                doc.metadata["source_file"] = file_path  # Track which file it came from
-            
-            all_filtered_docs.extend(filtered_docs)
-            logger.info(f"File {file_path}: {len(split_docs)} → {len(filtered_docs)} chunks after filtering")
+            loaded_files += 1
+
+            split_count, filtered_count = 0, 0
+            for document in loader.lazy_load():
+                split_docs = text_splitter.split_documents([document])
+                
+                # Filter meaningful content (same function works for all notion files!)
+                filtered_docs = filter_notion_content(split_docs)
+                split_count += len(split_docs)
+                filtered_count += len(filtered_docs)
+                
+                # Add metadata
+                for doc in filtered_docs:
+                    doc.metadata["document_type"] = "notion"
+                    doc.metadata["loader"] = "markdown"
+                    doc.metadata["source_file"] = file_path  # Track which file it came from
+                    doc.metadata["seed_source"] = file_path
+                    yield doc
+
+            logger.info(f"File {file_path}: {split_count} → {filtered_count} chunks after filtering")
+            if not filtered_count:
+                yield file_path
         
-        # Add all filtered documents to database
-        if all_filtered_docs:
-            self.db.add_documents(all_filtered_docs)
-            logger.info(f"Total Notion documents added: {len(all_filtered_docs)}")
-        else:
+        if not loaded_files:
             logger.warning("No Notion documents were loaded")
-    
-    def load_documents(self):
+
+    def load_documents(self) -> dict:
         """
-        Load the documents from the database.
+        Load the documents into the database.
+        Sources are streamed concurrently through load → split → filter → embed → write and
+        succeed or fail independently. Every seed source is synced incrementally, so a reseed
+        only embeds new or changed chunks. The keyword index and the collection statistics are
+        written along with the vectors (and rebuilt first if they are missing chunks, e.g. of a
+        collection seeded before they existed).
         """
-        try:
-            self._load_cv_documents()
-        except Exception as e:
-            logger.error(f"Error loading documents from cv: {e}")
-            raise e
-
-        try:
-            self._load_website_documents()
-        except Exception as e:
-            logger.error(f"Error loading documents from website: {e}")
-            raise e
-
-        try:
-            self._load_notion_documents()
-        except Exception as e:
-            logger.error(f"Error loading documents from notion: {e}")
-            raise e
+        self.db.sync_keyword_index()
+        self.db.sync_collection_stats()
+
+        # In priority order: of two duplicate chunks, the one of the first loader is kept
+        loaders = {
+            "cv": self._load_cv_documents,
+            "website": self._load_website_documents,
+            "notion": self._load_notion_documents,
+        }
+
+        deduplicator = ChunkDeduplicator(self.dedup_threshold) if self.dedup_threshold is not None else None
+        pipeline = IngestPipeline(
+            self.db,
+            batch_size=self.batch_size,
+            max_workers=self.max_workers,
+            deduplicator=deduplicator,
+        )
+        summary = pipeline.run(loaders)
+        logger.info(f"Seed summary: {summary}")
+
+        failed = [name for name, result in summary["sources"].items() if result["status"] == "failed"]
+        if failed:
+            logger.warning(f"Sources failed to load: {', '.join(failed)}")
 
+        self.db.record_seed()
         info = self.db.get_collection_info()
-        logger.info(f"Database seeded successfully. Collection info: {info}")
\ No newline at end of file
+        logger.info(f"Database seeded successfully. Collection info: {info}")
+        return summary
@@ -2,11 +2,22 @@
 RAG Service for handling predict part.
 """
 import os
+import json
+import time
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
 from langchain.schema import Document
 from langchain.schema import HumanMessage, SystemMessage, AIMessage
-from langchain_openai import ChatOpenAI
 from db import DocumentDatabase
+from lib.rank_fusion import reciprocal_rank_fusion
+from lib.answer_cache import SemanticAnswerCache
+from lib.query_cache import QueryCache
+from lib.context_formatter import ContextFormatter
+from lib.chat_history import ChatHistoryManager
+from lib.bm25_index import tokenize
+from lib.resources import get_chat_model
 
 logger = logging.getLogger(__name__)
 
@@ -15,17 +26,70 @@ class RAGPredict:
     RAG Service for handling predict part.
     """
     similarity_threshold = 1.4
+    keyword_min_score = 1.0  # BM25 score of the best chunk for a keyword query to skip the vectors
+    retrieval_k = 4  # Chunks retrieved per query variant
+    context_top_k = 6  # Chunks kept after fusing the variants
+    context_max_tokens = 2000  # Token budget of the context in the prompt
+    history_max_turns = 6  # Turns kept verbatim, older ones are summarized
+    history_summary_max_tokens = 500
+    rrf_k = 60
+    multi_query_count = 3
+    hybrid_search = True  # Fuse the keyword index results with the vector search ones
+    # Words that route a query to the chunks of one document type (when only one type matches)
+    partition_keywords = {
+        "cv": ("cv", "resume", "education", "degree", "university", "certification", "certifications"),
+        "website": ("website", "site", "blog", "article", "articles", "post", "posts"),
+        "notion": ("notion", "notes", "note", "journal"),
+    }
+    no_context_response = "I'm sorry, I don't have any information about that."
+    max_concurrent_requests = 32  # In-flight LLM and embedding requests of the async API
+    answer_cache_similarity = 0.95  # Cosine similarity for a query to reuse a cached answer
+    answer_cache_ttl = 3600.0
+    answer_cache_size = 1000
+    query_cache_size = 1000
 
-    def __init__(self):
+    def __init__(
+        self,
+        fast_path: bool = True,
+        db: Optional[DocumentDatabase] = None,
+        llm=None,
+        answer_cache: Optional[SemanticAnswerCache] = None,
+        query_cache: Optional[QueryCache] = None
+    ):
         """
         Initialize the RAGPredict service.
+        In fast-path mode, query repair and multi-query expansion take one LLM call per turn
+        instead of two. The database and LLM can be overridden, e.g. by the benchmarks.
+        An answer cache can be passed in to share it between instances (e.g. chat sessions).
+        Query rewrites are memoized, by default in query_cache.sqlite3 next to the database.
         """
-        self.db = DocumentDatabase()
-        self.llm = self._setup_llm()
+        self.fast_path = fast_path
+        self.db = db or DocumentDatabase()
+        self.llm = llm or self._setup_llm()
+        self.answer_cache = answer_cache or SemanticAnswerCache(
+            similarity_threshold=self.answer_cache_similarity,
+            ttl_seconds=self.answer_cache_ttl,
+            max_entries=self.answer_cache_size,
+        )
+        self.query_cache = query_cache or QueryCache(
+            max_entries=self.query_cache_size,
+            cache_path=os.path.join(os.path.dirname(self.db.db_path) or ".", "query_cache.sqlite3"),
+        )
+        self.context_formatter = ContextFormatter(max_tokens=self.context_max_tokens)
+        self._request_semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        self.history = ChatHistoryManager(
+            self.llm,
+            max_turns=self.history_max_turns,
+            summary_max_tokens=self.history_summary_max_tokens,
+            request_semaphore=self._request_semaphore,
+        )
+        self.context_tokens = []
+        self.turn_latencies = {"cached": [], "keyword": [], "fast": [], "standard": []}
+        self.first_token_latencies = {"cached": [], "keyword": [], "fast": [], "standard": []}
 
     def _setup_llm(self):
         """
-        Setup the LLM.
+        Setup the LLM, shared by the services of the process.
         """
         openai_key = os.getenv("OPENAI_API_KEY")
         if not openai_key:
@@ -34,7 +98,7 @@ class RAGPredict:
                 "Please add it to your .env file: OPENAI_API_KEY=your_key_here"
             )
 
-        return ChatOpenAI(model="gpt-4o-mini")
+        return get_chat_model("gpt-4o-mini")
 
     def _get_system_prompt(self) -> str:
         """ The main system prompt for the LLM. """
@@ -46,47 +110,102 @@ class RAGPredict:
         """
 
     def _format_chat_history(self, chat_history: list[dict]) -> list[dict]:
-        """ Build the chat history for the LLM. """
-        # Convert each message to appropriate LangChain message type
-        formatted_history = []
-        for msg in chat_history:
-            if msg["role"] == "user":
-                formatted_history.append(HumanMessage(content=msg["content"]))
-            elif msg["role"] == "assistant":
-                formatted_history.append(AIMessage(content=msg["content"]))
-                
-        return formatted_history
-
-    def _get_context(self, user_query: str) -> list[tuple[Document, float]]:
-        """ Get the context from the database. """
+        """ Build the chat history for the LLM: a summary of older turns, then the recent ones. """
+        return self.history.format(chat_history)
+
+    def _get_context(self, user_query: str, queries: Optional[list[str]] = None) -> list[tuple[Document, float]]:
+        """
+        Get the context from the database, for the given query variants or generated ones.
+        Raises ValueError if there is no valid context.
+        """
+        if self.db.is_keyword_query(user_query):
+            context = self._get_keyword_context(user_query)
+            if context is not None:
+                return context
 
         # Implement multi-query search
-        multi_query = self._get_multi_queries(user_query)
+        multi_query = queries or self._get_multi_queries(user_query)
+
+        # One embedding request and one vector query for all the variants
+        where = self._route_query(user_query)
+        context = self._fuse_context(self._search(multi_query, where))
+        if where and not self._is_valid_context(context):
+            logger.info(f"No valid context in the {where} partition, searching the whole collection")
+            context = self._fuse_context(self._search(multi_query))
+        if not self._is_valid_context(context):
+            raise ValueError(f"No valid context found for the query: {user_query}")
+        return context
+
+    def _search(self, queries: list[str], where: Optional[dict] = None) -> list[list[tuple[Document, float]]]:
+        """ Search the query variants, in a partition of the collection if given. """
+        if self.hybrid_search:
+            return self.db.get_hybrid_search_with_score_batch(queries, k=self.retrieval_k, rrf_k=self.rrf_k, where=where)
+        return self.db.get_similarity_search_with_score_batch(queries, k=self.retrieval_k, where=where)
 
-        context = []
-        for query in multi_query:
-            context.extend(self.db.get_similarity_search_with_score(query))
+    def _route_query(self, user_query: str) -> Optional[dict]:
+        """
+        Pick the partition a query is about from its words: the chunks of a document type when
+        the query names only that one (e.g. "what degree is on the CV?"), else None.
+        """
+        words = set(tokenize(user_query))
+        document_types = [
+            document_type for document_type, keywords in self.partition_keywords.items()
+            if words.intersection(keywords)
+        ]
+        if len(document_types) != 1:
+            return None
+        logger.info(f"Query routed to the {document_types[0]} chunks")
+        return self.db.partition(document_type=document_types[0])
 
+    def _get_keyword_context(self, user_query: str) -> Optional[list[tuple[Document, float]]]:
+        """
+        Get the context of a keyword-heavy query from the keyword index, without embedding it:
+        the chunks containing every term, with their BM25 score, if the best one scores at least
+        keyword_min_score. Otherwise None, and the query is searched like any other.
+        """
+        hits = self.db.get_keyword_search_with_score(user_query, k=self.context_top_k, match_all=True)
+        if not hits or hits[0][1] < self.keyword_min_score:
+            best = f"{hits[0][1]:.2f}" if hits else "none"
+            logger.info(f"Keyword query: best BM25 score {best} < {self.keyword_min_score}, searching the vectors")
+            return None
+        logger.info(f"Keyword query: {len(hits)} chunks from the keyword index (best BM25 score {hits[0][1]:.2f})")
+        return hits
+
+    def _fuse_context(self, results: list[list[tuple[Document, float]]]) -> list[tuple[Document, float]]:
+        """ Merge the results of the query variants. """
+        # A chunk found by several variants is kept once, ranked by reciprocal rank fusion
+        context = reciprocal_rank_fusion(results, k=self.rrf_k, top_k=self.context_top_k)
+        logger.info(f"Fused {sum(len(r) for r in results)} hits from {len(results)} queries into {len(context)} chunks")
         return context
     
     def _get_multi_queries(self, user_query: str) -> list[str]:
         """ Get the multi-queries from the user query. """
-        n = 3
+        kind = f"multi_queries:{self.multi_query_count}"
+        queries = self.query_cache.get(kind, user_query)
+        if queries is None:
+            response = self.llm.invoke(self._multi_query_messages(user_query))
+            queries = self._parse_multi_queries(response.content)
+            self.query_cache.put(kind, user_query, queries)
+        return queries
+
+    def _multi_query_messages(self, user_query: str) -> list:
+        """ Build the prompt asking for alternative phrasings of the user query. """
+        n = self.multi_query_count
         system_prompt = (
             f"You are a helpful assistant. Given the user's question, generate {n} alternative phrasings "
             "that could help retrieve relevant information from a document database. "
             "Return only the alternative queries, one per line."
         )
 
-        messages = [
+        return [
             SystemMessage(content=system_prompt),
             HumanMessage(content=user_query)
         ]
 
-        response = self.llm.invoke(messages)
-
+    def _parse_multi_queries(self, content: str) -> list[str]:
+        """ Get the multi-queries from the LLM response. """
         # Split the response into separate queries
-        queries = [q.strip() for q in response.content.strip().split('\n') if q.strip()]
+        queries = [q.strip() for q in content.strip().split('\n') if q.strip()]
         
         logger.info(f"Multi-queries: {queries}")
         return queries
@@ -99,17 +218,79 @@ class RAGPredict:
             return False
         
         # Second check: Is the best result good enough?
-        best_score = context[0][1]  # First result should be best (lowest distance)
+        best_score = min(score for _, score in context)  # Lowest distance, whatever its fused rank
         if best_score > self.similarity_threshold:
             logger.warning(f"Best similarity score too high: {best_score:.3f} > {self.similarity_threshold}")
             return False
         
         return True
     
-    def _build_prompt(self, user_query: str, chat_history: list[dict]) -> list[dict]:
+    def _rewrite_query(self, user_query: str) -> tuple[str, list[str]]:
+        """
+        Repair the query and generate its alternative phrasings in one JSON LLM call.
+        Returns the improved query and the query variants to search (the improved query first).
+        """
+        kind = f"rewrite:{self.multi_query_count}"
+        cached = self.query_cache.get(kind, user_query)
+        if cached is not None:
+            better_query, queries = cached
+            return better_query, queries
+
+        llm = self.llm.bind(response_format={"type": "json_object"})
+        response = llm.invoke(self._rewrite_query_messages(user_query))
+        better_query, queries = self._parse_rewritten_query(user_query, response.content)
+        self.query_cache.put(kind, user_query, [better_query, queries])
+        return better_query, queries
+
+    def _rewrite_query_messages(self, user_query: str) -> list:
+        """ Build the prompt asking for the improved query and its alternatives as JSON. """
+        n = self.multi_query_count
+        system_prompt = f"""
+        You are a query improvement assistant for searching a document database. Given the user's question:
+            1. Improve it: fix spelling and grammatical errors, clarify ambiguous terms, expand abbreviations
+               and remove informal language like 'lol', 'lmao', etc., keeping the original intent.
+            2. Generate {n} alternative phrasings that could help retrieve relevant information.
+        Respond only with a JSON object: {{"query": "<improved query>", "alternatives": ["<alternative>", ...]}}
+        When you cannot improve the query, return it unchanged as the query.
+        """
+
+        return [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=user_query)
+        ]
+
+    def _parse_rewritten_query(self, user_query: str, content: str) -> tuple[str, list[str]]:
+        """ Get the improved query and the query variants from the JSON LLM response. """
+        n = self.multi_query_count
+        try:
+            data = json.loads(content)
+            better_query = str(data.get("query") or "").strip() or user_query
+            alternatives = [str(q).strip() for q in data.get("alternatives") or [] if str(q).strip()]
+        except (ValueError, AttributeError, TypeError) as e:
+            logger.warning(f"Could not parse the rewritten query, using the original: {e}")
+            return user_query, [user_query]
+
+        queries = list(dict.fromkeys([better_query, *alternatives[:n]]))
+        logger.info(f"User query: {user_query} -> Better query: {better_query}, multi-queries: {queries}")
+        return better_query, queries
+
+    def _build_prompt(
+        self,
+        user_query: str,
+        chat_history: list[dict],
+        queries: Optional[list[str]] = None
+    ) -> list[dict]:
         """ Build the prompt for the LLM. """
-        chat_history = self._format_chat_history(chat_history)
+        context = self._get_context(user_query, queries)
+        return self._prompt_with_context(user_query, self._format_chat_history(chat_history), context)
 
+    def _prompt_with_context(
+        self,
+        user_query: str,
+        chat_history: list,
+        context: list[tuple[Document, float]]
+    ) -> list[dict]:
+        """ Build the prompt for the LLM from the formatted chat history and the retrieved context. """
         system_prompt = self._get_system_prompt()
         messages = [
             SystemMessage(content=system_prompt),
@@ -118,30 +299,36 @@ class RAGPredict:
         if chat_history:
             messages.extend(chat_history)
 
-        context = self._get_context(user_query)
-        logger.info(f"Context: {context}")
-        if not self._is_valid_context(context):
-            raise ValueError(f"No valid context found for the query: {user_query}")
+        # Only the chunk texts under short source tags, within the token budget
+        context_text, context_tokens = self.context_formatter.format(context)
+        self.context_tokens.append(context_tokens)
+        logger.info(f"Context: {len(context)} chunks, {context_tokens} tokens")
 
         messages.append(
-            SystemMessage(content=f"Context: {context}")
+            SystemMessage(content=f"Context:\n{context_text}")
         )
         
         messages.append(HumanMessage(content=user_query))
 
         return messages
 
-    def generate_response(self, user_query: str, chat_history: list[dict]) -> str:
+    def generate_response(
+        self,
+        user_query: str,
+        chat_history: list[dict],
+        queries: Optional[list[str]] = None
+    ) -> str:
         """
         Generate a response from the LLM.
+        Unless the query variants to search are given, they are generated from the query.
         """
         try:
-            messages = self._build_prompt(user_query, chat_history)
+            messages = self._build_prompt(user_query, chat_history, queries)
             response = self.llm.invoke(messages)
         
         except ValueError as e:
             logger.error(f"Error generating response: {e}")
-            return "I'm sorry, I don't have any information about that."
+            return self.no_context_response
         
         except Exception as e:
             logger.error(f"Error generating response: {e}")
@@ -154,6 +341,15 @@ class RAGPredict:
         Generate a better query by fixing typos, improving clarity, and ensuring the query makes sense.
         Returns an improved version of the user's query that will work better for database searches.
         """
+        better_query = self.query_cache.get("better_query", user_query)
+        if better_query is None:
+            response = self.llm.invoke(self._better_query_messages(user_query))
+            better_query = self._parse_better_query(user_query, response.content)
+            self.query_cache.put("better_query", user_query, better_query)
+        return better_query
+
+    def _better_query_messages(self, user_query: str) -> list:
+        """ Build the prompt asking for the improved query. """
         system_prompt = """
         You are a query improvement assistant. Your task is to:
             1. Fix any spelling or grammatical errors
@@ -167,16 +363,297 @@ class RAGPredict:
         When you cannot improve the query, return "The original query is not provided. Please provide a specific query for improvement."
         """
 
-        messages = [
+        return [
             SystemMessage(content=system_prompt),
             HumanMessage(content=f"Improve this query: {user_query}")
         ]
-        
-        response = self.llm.invoke(messages)
 
-        content = response.content.strip()
+    def _parse_better_query(self, user_query: str, content: str) -> str:
+        """ Get the improved query from the LLM response, or the original one. """
+        content = content.strip()
         if content == "The original query is not provided. Please provide a specific query for improvement.":
             return user_query
         
         logger.info(f"User query: {user_query} -> Better query: {content}")
-        return content
\ No newline at end of file
+        return content
+
+    def _prepare_turn(self, user_query: str) -> tuple[str, list[str], str]:
+        """
+        Improve the query and expand it into the variants to search.
+        The fast path gets both from one LLM call. Otherwise they come from two calls that
+        run concurrently, as the variants are generated from the original query.
+        Keyword-heavy queries (a few exact terms) are searched as they are, with no LLM call.
+        Returns the improved query, the variants and the mode.
+        """
+        if self.db.is_keyword_query(user_query):
+            return user_query, [user_query], "keyword"
+
+        if self.fast_path:
+            better_query, queries = self._rewrite_query(user_query)
+            return better_query, queries, "fast"
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            better_query_future = executor.submit(self.generate_better_query, user_query)
+            multi_queries_future = executor.submit(self._get_multi_queries, user_query)
+            better_query = better_query_future.result()
+            queries = list(dict.fromkeys([better_query, *multi_queries_future.result()]))
+        return better_query, queries, "standard"
+
+    def _cache_hit(self, answer: Optional[str], start: float) -> bool:
+        """ Record a turn answered from the answer cache. """
+        if answer is None:
+            return False
+        latency = time.perf_counter() - start
+        self.turn_latencies["cached"].append(latency)
+        self.first_token_latencies["cached"].append(latency)
+        logger.info(f"Turn answered from cache in {latency * 1000:.0f}ms")
+        return True
+
+    def _conversation_key(self, user_query: str, chat_history: list[dict]) -> Optional[str]:
+        """ Get the context of the cached answers: the conversation before the query (None for a first turn). """
+        # The chat UI passes the history with the query as its last message
+        if chat_history and chat_history[-1]["role"] == "user" and chat_history[-1]["content"] == user_query:
+            chat_history = chat_history[:-1]
+        return self.history.key(chat_history)
+
+    def _cached_answer(self, vector: Optional[list[float]], version: str, context: Optional[str]) -> Optional[str]:
+        """ Get the cached answer of a query vector in its conversation context, if any. """
+        if vector is None:
+            return None
+        return self.answer_cache.get(vector, version, context)
+
+    def _cache_answer(self, vector: Optional[list[float]], answer: str, version: str, context: Optional[str]) -> None:
+        """ Cache an answer in its conversation context, unless it is the one for a missing context. """
+        if vector is not None and answer != self.no_context_response:
+            self.answer_cache.put(vector, answer, version, context)
+
+    def _answer_cache_vector(self, user_query: str) -> Optional[list[float]]:
+        """
+        Embed a query for the answer cache. Keyword-heavy queries skip the cache (None): they are
+        answered from the keyword index, and embedding them would cost more than it saves.
+        """
+        if self.db.is_keyword_query(user_query):
+            return None
+        return self.db.embeddings.embed_query(user_query)
+
+    def respond(self, user_query: str, chat_history: list[dict]) -> str:
+        """
+        Answer a chat turn: improve the query, expand it into variants, retrieve and generate.
+        A query similar enough to a previous one in the same conversation context gets its
+        cached answer.
+        """
+        start = time.perf_counter()
+        version = self.db.get_collection_version()
+        context = self._conversation_key(user_query, chat_history)
+        vector = self._answer_cache_vector(user_query)
+        cached = self._cached_answer(vector, version, context)
+        if self._cache_hit(cached, start):
+            return cached
+
+        better_query, queries, mode = self._prepare_turn(user_query)
+        response = self.generate_response(better_query, chat_history, queries)
+        self._cache_answer(vector, response, version, context)
+
+        latency = time.perf_counter() - start
+        self.turn_latencies[mode].append(latency)
+        logger.info(f"Turn answered in {latency:.2f}s ({mode} mode)")
+        return response
+
+    def stream_response(self, user_query: str, chat_history: list[dict]) -> Iterator[str]:
+        """
+        Answer a chat turn like respond, yielding the answer tokens as the LLM streams them.
+        The time to the first token is logged, as it is the latency the user feels.
+        """
+        start = time.perf_counter()
+        version = self.db.get_collection_version()
+        context = self._conversation_key(user_query, chat_history)
+        vector = self._answer_cache_vector(user_query)
+        cached = self._cached_answer(vector, version, context)
+        if self._cache_hit(cached, start):
+            yield cached
+            return
+
+        better_query, queries, mode = self._prepare_turn(user_query)
+
+        try:
+            messages = self._build_prompt(better_query, chat_history, queries)
+        except ValueError as e:
+            logger.error(f"Error generating response: {e}")
+            yield self.no_context_response
+            return
+
+        first_token = None
+        tokens = []
+        for chunk in self.llm.stream(messages):
+            if not chunk.content:
+                continue
+            if first_token is None:
+                first_token = time.perf_counter() - start
+                self.first_token_latencies[mode].append(first_token)
+                logger.info(f"First token after {first_token:.2f}s ({mode} mode)")
+            tokens.append(chunk.content)
+            yield chunk.content
+
+        self._cache_answer(vector, "".join(tokens), version, context)
+
+        latency = time.perf_counter() - start
+        self.turn_latencies[mode].append(latency)
+        logger.info(f"Turn streamed in {latency:.2f}s ({mode} mode)")
+
+    def get_cache_stats(self) -> dict:
+        """Get the hit/miss counters and size of the answer and query rewrite caches."""
+        return {"answers": self.answer_cache.stats(), "query_rewrites": self.query_cache.stats()}
+
+    def get_context_stats(self) -> dict:
+        """Get the number of prompts and the mean and max context tokens in them."""
+        return {
+            "prompts": len(self.context_tokens),
+            "mean_tokens": round(sum(self.context_tokens) / len(self.context_tokens), 1) if self.context_tokens else None,
+            "max_tokens": max(self.context_tokens, default=None),
+        }
+
+    def get_latency_stats(self) -> dict:
+        """Get the number of turns, their mean latency and time to first token in seconds, per mode."""
+        def mean(latencies: list[float]) -> Optional[float]:
+            return round(sum(latencies) / len(latencies), 3) if latencies else None
+
+        return {
+            mode: {
+                "turns": len(latencies),
+                "mean_seconds": mean(latencies),
+                "mean_first_token_seconds": mean(self.first_token_latencies[mode]),
+            }
+            for mode, latencies in self.turn_latencies.items()
+        }
+
+    async def _ainvoke(self, messages: list, **kwargs) -> AIMessage:
+        """ Call the LLM asynchronously, within the bound on concurrent requests. """
+        async with self._request_semaphore:
+            return await self.llm.bind(**kwargs).ainvoke(messages)
+
+    async def _aget_multi_queries(self, user_query: str) -> list[str]:
+        """ Async counterpart of _get_multi_queries. """
+        kind = f"multi_queries:{self.multi_query_count}"
+        queries = await asyncio.to_thread(self.query_cache.get, kind, user_query)
+        if queries is None:
+            response = await self._ainvoke(self._multi_query_messages(user_query))
+            queries = self._parse_multi_queries(response.content)
+            await asyncio.to_thread(self.query_cache.put, kind, user_query, queries)
+        return queries
+
+    async def _arewrite_query(self, user_query: str) -> tuple[str, list[str]]:
+        """ Async counterpart of _rewrite_query. """
+        kind = f"rewrite:{self.multi_query_count}"
+        cached = await asyncio.to_thread(self.query_cache.get, kind, user_query)
+        if cached is not None:
+            better_query, queries = cached
+            return better_query, queries
+
+        response = await self._ainvoke(self._rewrite_query_messages(user_query), response_format={"type": "json_object"})
+        better_query, queries = self._parse_rewritten_query(user_query, response.content)
+        await asyncio.to_thread(self.query_cache.put, kind, user_query, [better_query, queries])
+        return better_query, queries
+
+    async def _aget_context(self, user_query: str, queries: Optional[list[str]] = None) -> list[tuple[Document, float]]:
+        """ Async counterpart of _get_context. The index and store reads run in threads, off the event loop. """
+        if await asyncio.to_thread(self.db.is_keyword_query, user_query):
+            context = await asyncio.to_thread(self._get_keyword_context, user_query)
+            if context is not None:
+                return context
+
+        multi_query = queries or await self._aget_multi_queries(user_query)
+        where = self._route_query(user_query)
+        context = self._fuse_context(await self._asearch(multi_query, where))
+        if where and not self._is_valid_context(context):
+            logger.info(f"No valid context in the {where} partition, searching the whole collection")
+            context = self._fuse_context(await self._asearch(multi_query))
+        if not self._is_valid_context(context):
+            raise ValueError(f"No valid context found for the query: {user_query}")
+        return context
+
+    async def _asearch(self, queries: list[str], where: Optional[dict] = None) -> list[list[tuple[Document, float]]]:
+        """ Async counterpart of _search. """
+        async with self._request_semaphore:
+            if self.hybrid_search:
+                return await self.db.aget_hybrid_search_with_score_batch(
+                    queries, k=self.retrieval_k, rrf_k=self.rrf_k, where=where
+                )
+            return await self.db.aget_similarity_search_with_score_batch(queries, k=self.retrieval_k, where=where)
+
+    async def agenerate_better_query(self, user_query: str) -> str:
+        """
+        Async counterpart of generate_better_query.
+        """
+        better_query = await asyncio.to_thread(self.query_cache.get, "better_query", user_query)
+        if better_query is None:
+            response = await self._ainvoke(self._better_query_messages(user_query))
+            better_query = self._parse_better_query(user_query, response.content)
+            await asyncio.to_thread(self.query_cache.put, "better_query", user_query, better_query)
+        return better_query
+
+    async def agenerate_response(
+        self,
+        user_query: str,
+        chat_history: list[dict],
+        queries: Optional[list[str]] = None
+    ) -> str:
+        """
+        Async counterpart of generate_response.
+        """
+        try:
+            context, history = await asyncio.gather(
+                self._aget_context(user_query, queries),
+                self.history.aformat(chat_history),
+            )
+            messages = self._prompt_with_context(user_query, history, context)
+            response = await self._ainvoke(messages)
+
+        except ValueError as e:
+            logger.error(f"Error generating response: {e}")
+            return self.no_context_response
+
+        except Exception as e:
+            logger.error(f"Error generating response: {e}")
+            raise e
+
+        return response.content
+
+    async def arespond(self, user_query: str, chat_history: list[dict]) -> str:
+        """
+        Async counterpart of respond. Many conversations can be served from one event loop;
+        the LLM and embedding requests in flight are bounded by max_concurrent_requests.
+        """
+        start = time.perf_counter()
+        version = self.db.get_collection_version()
+        context = self._conversation_key(user_query, chat_history)
+        keyword = await asyncio.to_thread(self.db.is_keyword_query, user_query)
+        vector = None
+        if not keyword:
+            # Keyword-heavy queries skip the answer cache, as in respond
+            async with self._request_semaphore:
+                vector = await self.db.embeddings.aembed_query(user_query)
+        cached = self._cached_answer(vector, version, context)
+        if self._cache_hit(cached, start):
+            return cached
+
+        if keyword:
+            mode = "keyword"
+            better_query, queries = user_query, [user_query]
+        elif self.fast_path:
+            mode = "fast"
+            better_query, queries = await self._arewrite_query(user_query)
+        else:
+            mode = "standard"
+            better_query, multi_queries = await asyncio.gather(
+                self.agenerate_better_query(user_query),
+                self._aget_multi_queries(user_query),
+            )
+            queries = list(dict.fromkeys([better_query, *multi_queries]))
+
+        response = await self.agenerate_response(better_query, chat_history, queries)
+        self._cache_answer(vector, response, version, context)
+
+        latency = time.perf_counter() - start
+        self.turn_latencies[mode].append(latency)
+        logger.info(f"Turn answered in {latency:.2f}s ({mode} mode)")
+        return response
@@ -6,12 +6,25 @@ import streamlit as st
 import logging
 from datetime import datetime
 from rag_predict import RAGPredict
+from lib.answer_cache import SemanticAnswerCache
 from lib.logger import setup_logging
 
 # Create logger for this module
 setup_logging()
 logger = logging.getLogger(__name__)
 
+@st.cache_resource
+def get_answer_cache() -> SemanticAnswerCache:
+    """
+    Get the answer cache shared by all chat sessions. Answers are scoped by conversation, so
+    only those given without history are served to other sessions.
+    """
+    return SemanticAnswerCache(
+        similarity_threshold=RAGPredict.answer_cache_similarity,
+        ttl_seconds=RAGPredict.answer_cache_ttl,
+        max_entries=RAGPredict.answer_cache_size,
+    )
+
 class StreamlitApp:
     """Simple Streamlit chat application."""
     
@@ -24,7 +37,7 @@ class StreamlitApp:
     def _setup_rag_predict(self):
         """Setup the RAG predict service."""
         if 'rag_predict' not in st.session_state:
-            st.session_state.rag_predict = RAGPredict()
+            st.session_state.rag_predict = RAGPredict(answer_cache=get_answer_cache())
         return st.session_state.rag_predict
     
     def _setup_page(self):
@@ -53,9 +66,14 @@ class StreamlitApp:
         
         if user_input:
             self._add_message(role="user", content=user_input)
+            with st.chat_message("user"):
+                st.write(user_input)
 
-            better_query = self.rag_predict.generate_better_query(user_input)
-            assistant_response = self.rag_predict.generate_response(better_query, st.session_state.messages)
+            # Show the answer as it streams in
+            with st.chat_message("assistant"):
+                assistant_response = st.write_stream(
+                    self.rag_predict.stream_response(user_input, st.session_state.messages)
+                )
             self._add_message(role="assistant", content=assistant_response)
 
             # Rerun to show the new messages